@@ -2,396 +2,397 @@
 TruDiagnostic SOW Generator - Web Application
 """
 
+import csv
+import hmac
+import os
 import streamlit as st
+import uuid
+import zipfile
 from datetime import datetime, date
-from io import BytesIO
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
+from io import BytesIO, TextIOWrapper
+from sow_catalog import get_catalog, get_watcher, use_catalog
+from sow_document import MIME_TYPES, sow_filename
+from sow_pdf import PdfTextError, check_pdf_text, render_sow_pdf, unsupported_chars
+from sow_rules import ERROR
+from sow_state import WizardState
+from sow_template import SowTemplate
+from sow_cache import get_cache
+from sow_jobs import CANCELLED, DONE, FAILED, QUEUED, QueueFull, get_queue, report_progress
+from sow_metrics import export_metrics, get_metrics
+from sow_store import get_store
 
-CONFIG = {
-    "company_info": {"name": "Tru Diagnostic, Inc", "short_name": "TruDiagnostic"},
-    "processing_types": {
-        "epigenetic": {
-            "name": "Epigenetic Processing",
-            "sample_types": ["Blood Spot", "Whole Blood", "Buccal Swab"],
-            "array_type": "MSA",
-            "report_options": {
-                "truage_truhealth": {"name": "Epigenetic + TruAge + TruHealth", "price": 300},
-                "truage_only": {"name": "Epigenetic + TruAge Only", "price": 250},
-                "truhealth_only": {"name": "Epigenetic + TruHealth Only", "price": 250}
-            }
-        },
-        "genomic": {
-            "name": "Genomic Processing",
-            "sample_types": ["Blood Spot", "Whole Blood", "Buccal Swab"],
-            "array_type": "GSAv3",
-            "report_options": {
-                "genomic_standard": {"name": "Genomic Processing (GSAv4ePgX)", "price": 100}
-            }
-        }
-    },
-    "report_only_options": {
-        "truage_truhealth": {"name": "TruAge + TruHealth Report Only", "price": 95},
-        "truhealth_only": {"name": "TruHealth Report Only", "price": 50},
-        "truage_only": {"name": "TruAge Report Only", "price": 50}
-    },
-    "operational_services": {
-        "kitting": {"name": "Kitting Services", "price": 5, "unit": "kit"},
-        "3pl": {"name": "3PL/Fulfillment Services", "price": 15, "unit": "kit"},
-        "customer_support": {"name": "Customer Support Services", "price": None, "unit": None, "included": True}
-    },
-    "bioinformatic_services": {
-        "irb_tier1": {"name": "IRB Submission - Tier 1 (Partner drafts)", "price": 5000},
-        "irb_tier2": {"name": "IRB Submission - Tier 2 (TruDiagnostic drafts)", "price": 10000},
-        "publication_drafting": {"name": "Publication Drafting", "price": "Custom"},
-        "publication_submission": {"name": "Publication Submission", "price": "Custom"},
-        "interventional_trial": {"name": "Interventional Trial Analysis", "price": "Custom"},
-        "algorithm_creation": {"name": "Custom Algorithm Development", "price": "Custom"},
-        "algorithm_validation": {"name": "Algorithm Validation", "price": "Custom"}
-    },
-    "data_delivery_options": ["IDAT Files", "VCF Files", "CSV Files", "PDF Reports"]
-}
-
-st.set_page_config(page_title="TruDiagnostic SOW Generator", page_icon="🧬", layout="wide")
-
-st.markdown("""
+PAGE_STYLE = """
 <style>
     .main-header {font-size: 2.5rem; font-weight: bold; color: #1E3A5F; margin-bottom: 0.5rem;}
     .sub-header {font-size: 1.2rem; color: #666; margin-bottom: 2rem;}
 .step-header {background-color: #f0f7ff; padding: 1rem; border-radius: 0.5rem; margin-bottom: 1rem; border-left: 4px solid #1E3A5F; color: #1E3A5F;}
 .summary-box {background-color: #f8f9fa; padding: 1.5rem; border-radius: 0.5rem; border: 1px solid #dee2e6;}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.set_page_config(page_title="TruDiagnostic SOW Generator", page_icon="🧬", layout="wide")
+
+st.markdown(PAGE_STYLE, unsafe_allow_html=True)
+
+@st.cache_resource(show_spinner=False)
+def document_engine():
+    """Compiled SOW template, shared by every session; python-docx is first imported here."""
+    return SowTemplate()
+
+def admin_view():
+    st.markdown("---")
+    st.header("Admin")
+    stats = get_cache().stats()
+    st.subheader("Document cache")
+    col_a, col_b, col_c = st.columns(3)
+    col_a.metric("Hits", stats['hits'] + stats['disk_hits'])
+    col_b.metric("Misses", stats['misses'])
+    col_c.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+    disk = f"{stats['directory']} ({stats['disk_bytes'] / 2 ** 20:,.1f} of {stats['max_disk_bytes'] / 2 ** 20:,.0f} MB)" if stats['directory'] else 'off'
+    st.caption(f"{stats['entries']} entries, {stats['bytes'] / 1024:,.0f} KB in memory, {stats['disk_hits']} disk hits. Catalog version {stats['catalog_version']}. Disk tier: {disk}")
+    fragments = document_engine().fragment_stats()
+    st.caption(f"Section fragments: {fragments['entries']} cached, {fragments['hit_rate']:.0%} reused ({fragments['hits']} hits, {fragments['misses']} rendered).")
+    if st.button("Clear memory cache"):
+        get_cache().clear()
+        document_engine().fragments.clear()
+        st.rerun()
+    catalog, watcher = get_catalog(), get_watcher()
+    st.subheader("Pricing catalog")
+    st.caption(f"Version {catalog.version} ({catalog.digest}). " + (f"Watching {watcher.path}: {watcher.swaps} version(s) swapped in since start." if watcher else "File watching is off (SOW_CATALOG_INTERVAL=0)."))
+    if watcher and watcher.error:
+        st.error(f"Catalog file rejected, still serving {catalog.version}: {watcher.error}")
+    jobs = get_queue().stats()
+    st.subheader("Generation jobs")
+    col_a, col_b, col_c = st.columns(3)
+    col_a.metric("Queued", jobs['queued'])
+    col_b.metric("Running", jobs['running'])
+    col_c.metric("Rejected", jobs['rejected'])
+    st.caption(f"{jobs['workers']} workers, queue limit {jobs['max_pending']} ({jobs['per_owner']} per session). {jobs['done']} done, {jobs['failed']} failed, {jobs['cancelled']} cancelled.")
+    store = get_store()
+    if store is not None:
+        archive = store.stats()
+        st.subheader("SOW archive")
+        st.caption(f"{archive['sows']:,} SOWs, {archive['files']:,} files: {archive['stored_bytes'] / 1e6:,.1f} MB stored for {archive['raw_bytes'] / 1e6:,.1f} MB of documents. {archive['path']}")
+        partner_view()
+        if st.button("Audit stored prices"):
+            from sow_diff import audit_prices
+            flagged = list(audit_prices(store))
+            st.caption(f"{len(flagged)} of {archive['sows']:,} stored SOWs differ from the current catalog.")
+            if flagged:
+                st.dataframe({"SOW": [sow.id for sow, _ in flagged], "Partner": [sow.partner_name for sow, _ in flagged], "Catalog": [sow.catalog_version for sow, _ in flagged], "Changes": ["; ".join(str(c) for c in changes) for _, changes in flagged]}, hide_index=True)
 
-def generate_sow_document(data):
-    doc = Document()
-    style = doc.styles['Normal']
-    style.font.name = 'Arial'
-    style.font.size = Pt(11)
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = p.add_run("STATEMENT OF WORK")
-    run.bold = True
-    run.font.size = Pt(14)
-    doc.add_paragraph()
-    effective_date = data['effective_date'].strftime('%B %d, %Y') if data['effective_date'] else "[Effective Date]"
-    intro = doc.add_paragraph()
-    intro.add_run(f'This Statement of Work (this "SOW") is entered into as of {effective_date} ')
-    intro.add_run(f'(the "Effective Date") by and between Tru Diagnostic, Inc ("Company") and ')
-    intro.add_run(f'{data["partner_name"]} ("Partner"). This SOW is issued under and made part of the ')
-    intro.add_run('Master Services Agreement (the "Agreement") between the Parties.')
-    doc.add_paragraph("The specific Services to be provided, together with applicable fees, timelines, and other deal-specific details, are identified in Exhibit A (Services Engaged). Company shall have no obligation to perform any Service not expressly designated in Exhibit A.")
-    p = doc.add_paragraph()
-    p.add_run("1. Purpose. ").bold = True
-    p.add_run("The purpose of this SOW is to define the scope of services that Company may provide to Partner, establish responsibilities of each Party, and set forth the commercial and operational framework under which the services will be delivered.")
-    p = doc.add_paragraph()
-    p.add_run("2. Term. ").bold = True
-    p.add_run("This SOW will commence on the Effective Date and remain in effect until terminated in accordance with the MSA or this SOW.")
-    p = doc.add_paragraph()
-    p.add_run("3. Services Offered. ").bold = True
-    p.add_run('Company offers the following categories of services. "Services" means the specific services selected by Partner and set forth in Exhibit A (Services Engaged).')
-    section_num = 1
-    if data['track'] == 'processing' and data['operational_services']:
-        p = doc.add_paragraph()
-        p.add_run(f"3.{section_num} Operational Services. ").bold = True
-        p.add_run("If identified in Exhibit A, the Company shall provide operational services as described in Appendix 1.")
-        section_num += 1
-    if data['track'] == 'processing':
-        p = doc.add_paragraph()
-        p.add_run(f"3.{section_num} Laboratory Processing Services. ").bold = True
-        p.add_run("If identified in Exhibit A, the Company shall provide the following services:")
-        lab_services = ["Sample Receipt & Accessioning – Intake, verification, and LIMS entry of biological samples.", "Quality Control (QC) – Comprehensive assessment of DNA quality, quantity, and integrity prior to analysis.", "DNA Extraction & Quantification – Extraction from approved sample types with concentration/purity normalization."]
-        if data['processing_type'] == 'epigenetic':
-            lab_services.append("Epigenetic Processing – DNA methylation analysis using Array Manufacturer or Company-developed arrays.")
+def partner_view():
+    from sow_partners import get_directory
+    directory = get_directory()
+    st.subheader("Partner directory")
+    stats = directory.stats()
+    st.caption(f"{stats['partners']:,} legal names, {stats['trigrams']:,} trigrams indexed in {stats['build_seconds']:.2f} s.")
+    token = os.environ.get('SOW_ADMIN_TOKEN')
+    if not token:
+        st.caption("Imports are off: set SOW_ADMIN_TOKEN to enable them.")
+        return
+    if not st.session_state.get('admin_ok'):
+        entered = st.text_input("Admin token", type="password", key="admin_token")
+        if not (entered and hmac.compare_digest(entered.encode(), token.encode())):
+            if entered:
+                st.error("Wrong admin token.")
+            return
+        st.session_state.admin_ok = True
+    upload = st.file_uploader("Import partners (CSV with a partner_name, legal_name or name column)", type=['csv'], key="partner_csv")
+    if upload is not None and st.button("Import"):
+        try:
+            added, read = directory.import_csv(TextIOWrapper(upload, encoding='utf-8-sig', newline=''))
+        except (ValueError, csv.Error) as exc:
+            st.error(f"Could not read {upload.name}: {exc}")
         else:
-            lab_services.append("Genetic Processing – SNP and CNV detection using Array Manufacturer or custom genotyping arrays.")
-        lab_services.append("Sample & Data Storage – Secure retention of residual materials and associated data.")
-        for svc in lab_services:
-            doc.add_paragraph(svc, style='List Bullet')
-        section_num += 1
-    p = doc.add_paragraph()
-    p.add_run(f"3.{section_num} Bioinformatic Services. ").bold = True
-    p.add_run("If identified in Exhibit A, the Company shall provide the following services:")
-    bio_services = ["Data Processing – Conversion of raw array output into normalized and quality-controlled data sets.", "Algorithmic Analysis – Application of Company's proprietary algorithms.", "QC Reporting – Documentation of batch- and sample-level QC outputs."]
-    if data['bioinformatic_services']:
-        if any('irb' in svc for svc in data['bioinformatic_services']):
-            bio_services.append("IRB Submission – Coordination of ethics review activities as specified in Exhibit A.")
-        if 'publication_drafting' in data['bioinformatic_services']:
-            bio_services.append("Publication Drafting – Manuscript preparation for peer-reviewed journals.")
-        if 'publication_submission' in data['bioinformatic_services']:
-            bio_services.append("Publication Submission – Journal submission support and coordination.")
-        if 'interventional_trial' in data['bioinformatic_services']:
-            bio_services.append("Interventional Trial Analysis – Statistical analysis of interventional study designs.")
-        if 'algorithm_creation' in data['bioinformatic_services']:
-            bio_services.append("Custom Algorithm Development – Development of tailored computational models.")
-        if 'algorithm_validation' in data['bioinformatic_services']:
-            bio_services.append("Algorithm Validation – Independent performance evaluation of algorithms.")
-    for svc in bio_services:
-        doc.add_paragraph(svc, style='List Bullet')
-    section_num += 1
-    p = doc.add_paragraph()
-    p.add_run(f"3.{section_num} Reporting Services. ").bold = True
-    p.add_run("If identified in Exhibit A, the Company shall provide the following services:")
-    report_services = [f"Data Delivery – Secure transmission of data ({', '.join(data['data_delivery'])})."]
-    if data['portal_access']:
-        report_services.append("Technology Integration – Portal access and customized data delivery formats.")
-    report_services.append("Data Security – Encryption, HIPAA compliance, and adherence to Company's technical safeguards.")
-    for svc in report_services:
-        doc.add_paragraph(svc, style='List Bullet')
-    p = doc.add_paragraph()
-    p.add_run("4. Dependencies. ").bold = True
-    if data['track'] == 'processing':
-        p.add_run("Partner acknowledges that certain services require timely provision of samples, manifests, metadata, and other inputs by Partner.")
-    else:
-        p.add_run("Partner acknowledges that Report Only services require timely provision of properly formatted .idat files and associated metadata.")
-    p = doc.add_paragraph()
-    p.add_run("5. Fees and Payment. ").bold = True
-    p.add_run("Partner shall pay fees as set forth in Exhibit B.")
-    p = doc.add_paragraph()
-    p.add_run("6. Responsibilities.").bold = True
-    doc.add_paragraph("Company Responsibilities:", style='List Bullet')
-    for r in ["Perform services in accordance with validated SOPs and applicable regulations.", "Maintain regulatory certifications (e.g., CLIA) where required.", "Provide timely communication regarding QC failures, delays, or issues."]:
-        p = doc.add_paragraph(r, style='List Bullet')
-        p.paragraph_format.left_indent = Inches(0.5)
-    doc.add_paragraph("Partner Responsibilities:", style='List Bullet')
-    if data['track'] == 'processing':
-        partner_resp = ["Ensure proper collection, de-identification, packaging, and shipping of samples.", "Retain all necessary patient consents and authorizations.", "Provide accurate manifests and metadata with each shipment."]
+            st.success(f"{read:,} names read, {added:,} added to the directory.")
+
+def latency_view():
+    metrics = get_metrics()
+    rows = metrics.summary()
+    with st.expander("📈 Latency breakdown", expanded=True):
+        st.caption(f"Recent-window percentiles, sampling {metrics.sample_rate:.0%} of renders and reruns, allocation tracing on {metrics.alloc_rate:.0%} of sampled renders.")
+        names = sorted({r['name'] for r in rows})
+        if not names:
+            st.info("No samples yet. Generate a document to populate the breakdown.")
+            return
+        name = st.selectbox("Metric", names, index=names.index('sow_section_seconds') if 'sow_section_seconds' in names else 0)
+        scale, unit = (1 / 1024, "KB") if name.endswith('_bytes') else (1000, "ms")
+        rows = [r for r in rows if r['name'] == name]
+        table = {"Variant": [" / ".join(v for v in (r['labels'].get('track'), r['labels'].get('processing')) if v and v != 'none') or "-" for r in rows]}
+        for label in sorted({k for r in rows for k in r['labels']} - {'track', 'processing'}):
+            table[label.title()] = [str(r['labels'].get(label, "")) for r in rows]
+        table["Count"] = [r['count'] for r in rows]
+        for q in ('p50', 'p95', 'p99'):
+            table[f"{q} {unit}"] = [round(r[q] * scale, 2) for r in rows]
+        st.dataframe(table, hide_index=True)
+        col_a, col_b, col_c = st.columns(3)
+        col_a.download_button("Prometheus", data=metrics.prometheus(), file_name="sow_metrics.prom", mime="text/plain", on_click="ignore")
+        col_b.download_button("JSON", data=metrics.to_json(), file_name="sow_metrics.json", mime="application/json", on_click="ignore")
+        if col_c.button("Reset"):
+            metrics.reset()
+            st.rerun()
+
+def wizard():
+    """The session's WizardState, resumed from the ?draft= or ?s= link on a fresh session."""
+    if 'wizard' not in st.session_state:
+        store, token = get_store(), st.query_params.get('s')
+        if st.query_params.get('draft') and store is not None:
+            token = store.draft(st.query_params['draft']) or token
+        try:
+            st.session_state.wizard = WizardState.decode(token) if token else WizardState()
+        except ValueError:
+            st.session_state.wizard = WizardState()
+            st.toast("That draft link is invalid, starting a new SOW.")
+    return st.session_state.wizard
+
+def option_index(options, value):
+    options = list(options)
+    return options.index(value) if value in options else 0
+
+def go(step):
+    """Move the wizard to `step` and keep the page URL pointing at the current draft."""
+    state = wizard()
+    state.step = step
+    st.query_params['s'] = state.encode()
+    st.query_params.pop('draft', None)
+    st.rerun()
+
+def partner_suggestions(state, partner_name):
+    """Check the typed name against the partner directory and offer close matches; returns the cleaned name."""
+    if not partner_name:
+        return partner_name
+    from sow_partners import clean_name, get_directory, name_key
+    partner_name = clean_name(partner_name)
+    directory = get_directory()
+    if directory is None or not len(directory.index()):
+        return partner_name
+    suggestions = directory.suggest(partner_name)
+    if suggestions and name_key(suggestions[0][0].name) == name_key(partner_name):
+        st.caption(f"✓ {suggestions[0][0].name} is in the partner directory.")
+        return suggestions[0][0].name
+    if not suggestions:
+        st.caption("Not in the partner directory. Check the spelling against the contract.")
+        return partner_name
+    st.caption("Not in the partner directory. Did you mean:")
+    for partner, score in suggestions:
+        if st.button(partner.name, key=f"partner_{partner.id}"):
+            state.update(partner_name=partner.name)
+            st.rerun()
+    return partner_name
+
+def rule_feedback(data):
+    """Show the catalog rules that `data` breaks, errors first; returns True when one blocks generation."""
+    issues = sorted(get_catalog().rules.check(data), key=lambda issue: issue.level != ERROR)
+    for issue in issues:
+        (st.error if issue.level == ERROR else st.warning)(issue.message, icon="⛔" if issue.level == ERROR else "⚠️")
+    return any(issue.level == ERROR for issue in issues)
+
+def draft_view(state):
+    st.caption("This page's link resumes the current draft. Bookmark it or share it.")
+    store = get_store()
+    if store is not None and state.partner_name and st.button("💾 Save short link"):
+        st.session_state.draft_id = store.save_draft(state.encode(), state.partner_name, st.session_state.get('draft_id'))
+    if st.session_state.get('draft_id'):
+        st.code(f"?draft={st.session_state.draft_id}", language=None)
+
+def pricing_comparison():
+    state = wizard()
+    catalog = get_catalog()
+    from sow_quote import AUTO, format_money, sweep
+    with st.expander("📊 Pricing Comparison"):
+        tiers = "; ".join(t.label for t in catalog.volume_tiers)
+        st.caption("Every report package for this track at several volumes, with the selected add-ons." + (f" Volume tiers: {tiers}." if tiers else " No volume-tier discounts are configured."))
+        default_volumes = sorted({100, 1000, 5000, 10000} | ({state.estimated_volume} if state.estimated_volume else set()))
+        col_v, col_d = st.columns([3, 1])
+        with col_v:
+            volumes = st.multiselect("Volumes", options=sorted(set(default_volumes) | {250, 500, 2500, 20000}), default=default_volumes)
+        with col_d:
+            discount = st.selectbox("Discount", options=[AUTO, 0, 5, 10, 15, 20], format_func=lambda d: "Volume tier" if d == AUTO else f"{d}%")
+        if not volumes:
+            return
+        ops = [k for k in state.operational_services if catalog.operational[k].billable]
+        result = sweep(state.track, state.processing_type, volumes=sorted(volumes), operational=[ops], bioinformatic=[state.bioinformatic_services], discounts=[discount], catalog=catalog)
+        reports = catalog.reports(state.track, state.processing_type)
+        rows = [result.scenario(i) for i in range(len(result))]
+        rows.sort(key=lambda r: (r['report_choice'] != state.report_choice, r['volume']))
+        st.dataframe({
+            "Package": [reports[r['report_choice']].name for r in rows],
+            "Volume": [f"{r['volume']:,}" for r in rows],
+            "Reports": [format_money(r['report']) for r in rows],
+            "Kits": [format_money(r['kits']) for r in rows],
+            "Flat Fees": [format_money(r['flat']) for r in rows],
+            "Discount": [f"{format_money(-r['discount'])} ({r['discount_pct']}%)" for r in rows],
+            "Total": [format_money(r['total']) + (" + TBD" if r['tbd'] else "") for r in rows],
+            "Per Sample": [format_money(r['total'] // r['volume']) for r in rows],
+        }, hide_index=True)
+
+def session_owner():
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def renderer(kind):
+    return render_sow_pdf if kind == 'pdf' else document_engine().render_bytes
+
+def render_job(data, render, kind):
+    """Runs on a JobQueue worker: renders into the shared document cache, records it in the SOW store and returns the size."""
+    report_progress(0.2, f"Rendering {kind.upper()}")
+    with use_catalog() as catalog:
+        payload = get_cache().get_or_render(data, render, kind)
+        store = get_store()
+        if store is not None:
+            report_progress(0.8, "Saving to the SOW archive")
+            store.save(data, payload, kind, catalog.version)
+    return len(payload)
+
+def archive_view():
+    store = get_store()
+    if store is None:
+        return
+    with st.expander("🗄️ Past SOWs"):
+        text = st.text_input("Search", placeholder="Partner, service, any wording…", key="archive_text")
+        catalog = get_catalog()
+        track = st.selectbox("Track", [None, 'processing', 'report_only'], format_func=lambda t: {None: "Any", 'processing': "Sample Processing", 'report_only': "Report Only"}[t], key="archive_track")
+        services = {**{k: s.name for k, s in catalog.operational.items()}, **{k: s.name for k, s in catalog.bioinformatic.items()}}
+        service = st.selectbox("Includes service", [None, *services], format_func=lambda k: services.get(k, "Any"), key="archive_service")
+        results = store.search(text=text, track=track, service=service, limit=20)
+        if not results:
+            st.caption("No matching SOWs.")
+        for sow in results:
+            st.markdown(f"**{sow.partner_name}**  \n{sow.report_name} · effective {sow.effective_date or 'n/a'} · {datetime.fromtimestamp(sow.created):%Y-%m-%d}")
+            columns = st.columns(len(sow.kinds) + 1)
+            for col, kind in zip(columns, sow.kinds):
+                with col:
+                    st.download_button(f"📥 .{kind}", data=lambda sow_id=sow.id, kind=kind: store.document(sow_id, kind), file_name=sow_filename(sow.partner_name, datetime.fromtimestamp(sow.created), kind), mime=MIME_TYPES[kind], on_click="ignore", key=f"archive_{sow.id}_{kind}")
+            if columns[-1].button("✏️ Edit", key=f"archive_{sow.id}_edit", help="Start a new SOW from these inputs"):
+                st.session_state.wizard = WizardState.from_data(store.data(sow.id))
+                go(st.session_state.wizard.step)
+        if len(results) > 1:
+            labels = {sow.id: f"#{sow.id} {sow.partner_name} ({sow.effective_date or 'n/a'})" for sow in results}
+            picked = st.multiselect("Compare", list(labels), format_func=labels.get, max_selections=2, key="archive_compare", help="Pick the older SOW first.")
+            if len(picked) == 2:
+                from sow_diff import diff_sows, redline_bytes
+                old, new = store.data(picked[0]), store.data(picked[1])
+                result = diff_sows(old, new)
+                st.code('\n'.join(result.summary()) or "No differences.", language=None)
+                if result.changed:
+                    st.download_button("📥 Redline .docx", data=lambda: redline_bytes(old, new), file_name=sow_filename(f"{new['partner_name']} redline", datetime.now()), mime=MIME_TYPES['docx'], on_click="ignore", key="archive_redline")
+
+@st.fragment(run_every=0.5)
+def job_progress():
+    jobs = [get_queue().get(job_id) for job_id in st.session_state.job_ids]
+    failed = [job for job in jobs if job is not None and job.status == FAILED]
+    if failed:
+        del st.session_state['job_ids']
+        st.error(f"Document generation failed: {failed[0].error}")
+    elif any(job is None or job.status == CANCELLED for job in jobs):
+        del st.session_state['job_ids']
+        st.rerun()
+    elif all(job.status == DONE for job in jobs):
+        del st.session_state['job_ids']
+        st.session_state.doc_ready = True
+        st.rerun()
+    elif all(job.status == QUEUED for job in jobs):
+        ahead = min(get_queue().position(job.id) or 0 for job in jobs)
+        st.progress(0.0, text=f"Queued, {ahead} job{'s' if ahead != 1 else ''} ahead…")
     else:
-        partner_resp = ["Ensure proper formatting and quality of uploaded .idat files.", "Retain all necessary patient consents and authorizations.", "Provide accurate metadata files with each data submission."]
-    for r in partner_resp:
-        p = doc.add_paragraph(r, style='List Bullet')
-        p.paragraph_format.left_indent = Inches(0.5)
-    for num, (title, text) in enumerate([("Deliverables", "Deliverables may include raw and processed data files, QC reports, dashboards, or other outputs depending on services selected."), ("Confidentiality", "All Confidential Information exchanged will be handled in accordance with the MSA."), ("Intellectual Property", "Company retains ownership of its IP, methodologies, and algorithms. Partner retains ownership of samples and patient data."), ("Compliance", "Both Parties will comply with applicable laws including HIPAA, GDPR (if applicable), and FDA/CLIA/CAP requirements."), ("Termination", "This SOW may be terminated as provided in the MSA. Confidentiality and IP obligations survive termination."), ("Miscellaneous", "All other terms are governed by the MSA. This SOW may only be amended by written agreement.")], 7):
-        p = doc.add_paragraph()
-        p.add_run(f"{num}. {title}. ").bold = True
-        p.add_run(text)
-    doc.add_paragraph()
-    doc.add_paragraph("IN WITNESS WHEREOF, the Parties have executed this Agreement as of the Effective Date.")
-    doc.add_paragraph()
-    table = doc.add_table(rows=5, cols=2)
-    table.cell(0, 0).text = "TRU DIAGNOSTIC, INC."
-    table.cell(0, 0).paragraphs[0].runs[0].bold = True
-    table.cell(0, 1).text = data['partner_name'].upper()
-    table.cell(0, 1).paragraphs[0].runs[0].bold = True
-    for i, label in enumerate(["Signature: ________________", "Name: ________________", "Title: ________________", "Date: ________________"], 1):
-        table.cell(i, 0).text = label
-        table.cell(i, 1).text = label
-    doc.add_page_break()
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = p.add_run("EXHIBIT A - SERVICES ENGAGED")
-    run.bold = True
-    run.font.size = Pt(14)
-    doc.add_paragraph()
-    doc.add_paragraph(f'Services engaged by {data["partner_name"]}:')
-    doc.add_paragraph()
-    table = doc.add_table(rows=1, cols=3)
-    table.style = 'Table Grid'
-    hdr = table.rows[0].cells
-    hdr[0].text = "Category"
-    hdr[1].text = "Service"
-    hdr[2].text = "Details"
-    for cell in hdr:
-        cell.paragraphs[0].runs[0].bold = True
-    if data['track'] == 'processing':
-        for op_key in data.get('operational_services', []):
-            op = CONFIG['operational_services'].get(op_key, {})
-            row = table.add_row().cells
-            row[0].text = "Operational"
-            row[1].text = f"[X] {op.get('name', op_key)}"
-            row[2].text = f"${op.get('price', 'N/A')}/{op.get('unit', 'unit')}" if op.get('price') else "Included"
-        proc = CONFIG['processing_types'].get(data['processing_type'], {})
-        row = table.add_row().cells
-        row[0].text = "Lab Processing"
-        row[1].text = f"[X] {proc.get('name', 'Processing')}"
-        row[2].text = f"Sample: {data.get('sample_type', 'N/A')}, Array: {proc.get('array_type', 'N/A')}"
-    row = table.add_row().cells
-    row[0].text = "Bioinformatics"
-    row[1].text = "[X] Standard Bioinformatics"
-    row[2].text = "Included"
-    for bio_key in data.get('bioinformatic_services', []):
-        bio = CONFIG['bioinformatic_services'].get(bio_key, {})
-        row = table.add_row().cells
-        row[0].text = ""
-        row[1].text = f"[X] {bio.get('name', bio_key)}"
-        price = bio.get('price', 'Custom')
-        row[2].text = f"${price:,}" if isinstance(price, int) else str(price)
-    row = table.add_row().cells
-    row[0].text = "Reporting"
-    row[1].text = f"[X] {data.get('report_name', 'Reports')}"
-    row[2].text = f"${data.get('report_price', 0)}/sample"
-    if data.get('portal_access'):
-        row = table.add_row().cells
-        row[0].text = ""
-        row[1].text = "[X] Portal Access"
-        row[2].text = "TruDiagnostic Provider Portal"
-    if data['track'] == 'processing' and data.get('operational_services'):
-        doc.add_page_break()
-        p = doc.add_paragraph()
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        run = p.add_run("APPENDIX 1 - SERVICE DESCRIPTIONS")
-        run.bold = True
-        run.font.size = Pt(14)
-        doc.add_paragraph()
-        if 'kitting' in data['operational_services']:
-            p = doc.add_paragraph()
-            p.add_run("Kitting Services").bold = True
-            doc.add_paragraph("Custom Kitting Services, including design, assembly, and delivery of sample collection kits in accordance with specifications mutually agreed by the Parties.")
-            for detail in ["Customized Kit Design - collaboration on packaging, branding, and labeling.", "Bill of Materials Documentation.", "Kit Identification - barcodes and Kit IDs.", "Quality Control Checks using statistical sampling.", "Kit Storage pending shipment."]:
-                doc.add_paragraph(detail, style='List Bullet')
-            doc.add_paragraph()
-        if '3pl' in data['operational_services']:
-            p = doc.add_paragraph()
-            p.add_run("Third-Party Logistics (3PL) Services").bold = True
-            doc.add_paragraph("Warehousing, order receipt, and order fulfillment services as designated by Partner.")
-            for detail in ["Warehousing & Inventory Management. Partner remains sole owner of inventory.", "Order Receipt & Fulfillment through mutually agreed systems.", "Shipment tendering to Partner's preferred carriers."]:
-                doc.add_paragraph(detail, style='List Bullet')
-            doc.add_paragraph()
-        p = doc.add_paragraph()
-        p.add_run("Laboratory Processing Services").bold = True
-        doc.add_paragraph("Laboratory processing to enable generation of high-quality molecular data from Partner-provided samples.")
-        lab_details = ["Sample Inspection and accession into LIMS within one (1) business day.", "Quality Control Checks including DNA concentration, purity ratios, and volume sufficiency.", "Reruns for Failed Analysis: One (1) rerun using residual sample material if initial analysis fails."]
-        if data['processing_type'] == 'epigenetic':
-            lab_details.extend(["DNA Extraction & Quantification from validated sample matrices.", "DNA Methylation Analysis using Illumina arrays with validated workflows."])
-        else:
-            lab_details.extend(["DNA Extraction & Normalization to array manufacturer specifications.", "Array-Based Genotyping using custom or commercial arrays."])
-        for detail in lab_details:
-            doc.add_paragraph(detail, style='List Bullet')
-    doc.add_page_break()
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = p.add_run("EXHIBIT B - PRICING AND PAYMENT TERMS")
-    run.bold = True
-    run.font.size = Pt(14)
-    doc.add_paragraph()
-    doc.add_paragraph("All fees are exclusive of applicable taxes, which shall be borne by Partner.")
-    doc.add_paragraph()
-    p = doc.add_paragraph()
-    p.add_run("1. Service Fees").bold = True
-    doc.add_paragraph()
-    table = doc.add_table(rows=1, cols=3)
-    table.style = 'Table Grid'
-    hdr = table.rows[0].cells
-    hdr[0].text = "Service"
-    hdr[1].text = "Unit"
-    hdr[2].text = "Price (USD)"
-    for cell in hdr:
-        cell.paragraphs[0].runs[0].bold = True
-    row = table.add_row().cells
-    row[0].text = data.get('report_name', 'Report Services')
-    row[1].text = "Per Sample"
-    row[2].text = f"${data.get('report_price', 0)}"
-    if data['track'] == 'processing':
-        for op_key in data.get('operational_services', []):
-            op = CONFIG['operational_services'].get(op_key, {})
-            if op.get('price'):
-                row = table.add_row().cells
-                row[0].text = op.get('name', op_key)
-                row[1].text = f"Per {op.get('unit', 'unit').title()}"
-                row[2].text = f"${op['price']}"
-    for bio_key in data.get('bioinformatic_services', []):
-        bio = CONFIG['bioinformatic_services'].get(bio_key, {})
-        row = table.add_row().cells
-        row[0].text = bio.get('name', bio_key)
-        row[1].text = "Flat Fee"
-        price = bio.get('price', 'Custom')
-        row[2].text = f"${price:,}" if isinstance(price, int) else "[To be determined]"
-    doc.add_paragraph()
-    if data.get('estimated_volume', 0) > 0:
-        p = doc.add_paragraph()
-        p.add_run("Estimated Volume: ").bold = True
-        p.add_run(f"{data['estimated_volume']:,} samples")
-        base_total = data.get('report_price', 0) * data['estimated_volume']
-        p = doc.add_paragraph()
-        p.add_run("Estimated Base Total: ").bold = True
-        p.add_run(f"${base_total:,}")
-        doc.add_paragraph()
-    p = doc.add_paragraph()
-    p.add_run("2. Payment Terms").bold = True
-    for term in ["Payment Terms: Net 30 days from invoice date.", "Invoicing: Upon completion of Services or monthly for ongoing Services.", "Late Payments: Past due amounts may accrue interest as specified in the Agreement.", "Taxes: All fees are exclusive of applicable taxes."]:
-        doc.add_paragraph(term, style='List Bullet')
-    doc.add_paragraph()
-    p = doc.add_paragraph()
-    p.add_run("3. Delinquency Policy").bold = True
-    doc.add_paragraph("Account Delinquent (1-30 Days): Lab processing restricted for samples linked to unpaid invoices.")
-    doc.add_paragraph("Account Suspended (31+ Days): All lab processing blocked until balance resolved.")
-    return doc
+        running = [job for job in jobs if job.status != DONE]
+        st.progress(sum(job.progress for job in jobs) / len(jobs), text=running[0].message if running else "Finishing")
+
+def render_bundle(data):
+    """ZIP of the .docx and .pdf; both are already compressed, so entries are stored."""
+    when = datetime.now()
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for kind in ('docx', 'pdf'):
+            archive.writestr(sow_filename(data['partner_name'], when, kind), get_cache().get_or_render(data, renderer(kind), kind))
+    return buffer.getvalue()
+
+def document_source(data, kind):
+    """Deferred download payload, served from the document cache the generation jobs filled."""
+    if kind == 'zip':
+        return lambda: render_bundle(data)
+    return lambda: get_cache().get_or_render(data, renderer(kind), kind)
+
+def mark_downloaded():
+    st.session_state.doc_downloaded = True
 
 def main():
     st.markdown('<p class="main-header">🧬 TruDiagnostic SOW Generator</p>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Generate customized Statements of Work for your clients</p>', unsafe_allow_html=True)
-    if 'step' not in st.session_state:
-        st.session_state.step = 1
+    get_watcher()
+    export_metrics()
+    catalog = get_catalog()
+    state = wizard()
     with st.sidebar:
         st.header("Progress")
         steps = ["Partner Info", "Service Type", "Service Details", "Add-on Services", "Review & Generate"]
         for i, step_name in enumerate(steps, 1):
-            if i < st.session_state.step:
+            if i < state.step:
                 st.success(f"✓ {step_name}")
-            elif i == st.session_state.step:
+            elif i == state.step:
                 st.info(f"→ {step_name}")
             else:
                 st.text(f"○ {step_name}")
+        if state.step > 1:
+            draft_view(state)
+        archive_view()
+        if st.query_params.get('admin'):
+            admin_view()
+    if st.query_params.get('admin'):
+        latency_view()
     col1, col2 = st.columns([2, 1])
     with col1:
-        if st.session_state.step == 1:
+        if state.step == 1:
             st.markdown('<div class="step-header"><h3>Step 1: Partner Information</h3></div>', unsafe_allow_html=True)
-            partner_name = st.text_input("Partner Legal Name *", placeholder="e.g., Acme Health Labs, Inc.")
-            effective_date = st.date_input("Effective Date", value=date.today())
+            partner_name = st.text_input("Partner Legal Name *", value=state.partner_name, placeholder="e.g., Acme Health Labs, Inc.")
+            partner_name = partner_suggestions(state, partner_name)
+            if partner_name and unsupported_chars(partner_name):
+                st.warning(f"The PDF fonts cannot show {unsupported_chars(partner_name)!r}, so the PDF will not be generated for this name. The Word document is unaffected.")
+            effective_date = st.date_input("Effective Date", value=state.effective_date or date.today())
             st.markdown("---")
             if st.button("Next →", type="primary", disabled=not partner_name):
-                st.session_state.partner_name = partner_name
-                st.session_state.effective_date = effective_date
-                st.session_state.step = 2
-                st.rerun()
-        elif st.session_state.step == 2:
+                state.update(partner_name=partner_name, effective_date=effective_date)
+                go(2)
+        elif state.step == 2:
             st.markdown('<div class="step-header"><h3>Step 2: Service Type</h3></div>', unsafe_allow_html=True)
             st.write("Will TruDiagnostic be processing biological samples, or will the partner upload pre-processed data?")
-            track = st.radio("Select service type:", options=["processing", "report_only"], format_func=lambda x: "🧪 **Sample Processing** - We process samples and provide reports" if x == "processing" else "📊 **Report Only** - Partner uploads .idat files, we provide reports only", label_visibility="collapsed")
+            track = st.radio("Select service type:", options=["processing", "report_only"], index=option_index(["processing", "report_only"], state.track), format_func=lambda x: "🧪 **Sample Processing** - We process samples and provide reports" if x == "processing" else "📊 **Report Only** - Partner uploads .idat files, we provide reports only", label_visibility="collapsed")
             st.markdown("---")
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("← Back"):
-                    st.session_state.step = 1
-                    st.rerun()
+                    go(1)
             with col_b:
                 if st.button("Next →", type="primary"):
-                    st.session_state.track = track
-                    st.session_state.step = 3
-                    st.rerun()
-        elif st.session_state.step == 3:
+                    state.update(track=track)
+                    go(3)
+        elif state.step == 3:
             st.markdown('<div class="step-header"><h3>Step 3: Service Configuration</h3></div>', unsafe_allow_html=True)
-            if st.session_state.track == 'processing':
+            if state.track == 'processing':
                 st.subheader("Processing Type")
-                processing_type = st.radio("What type of processing?", options=["epigenetic", "genomic"], format_func=lambda x: f"🧬 {CONFIG['processing_types'][x]['name']}")
+                processing_type = st.radio("What type of processing?", options=list(catalog.processing), index=option_index(catalog.processing, state.processing_type), format_func=lambda x: f"🧬 {catalog.processing[x].name}")
                 st.subheader("Sample Type")
-                sample_types = CONFIG['processing_types'][processing_type]['sample_types']
-                sample_type = st.selectbox("Sample type:", sample_types)
+                sample_type = st.selectbox("Sample type:", catalog.processing[processing_type].sample_types, index=option_index(catalog.processing[processing_type].sample_types, state.sample_type))
                 st.subheader("Report Package")
-                report_options = CONFIG['processing_types'][processing_type]['report_options']
-                report_choice = st.radio("Select report package:", options=list(report_options.keys()), format_func=lambda x: f"{report_options[x]['name']} - **${report_options[x]['price']}/sample**")
-                report_name = report_options[report_choice]['name']
-                report_price = report_options[report_choice]['price']
+                report_options = catalog.reports('processing', processing_type)
+                report_choice = st.radio("Select report package:", options=list(report_options), index=option_index(report_options, state.report_choice), format_func=lambda x: report_options[x].option_label)
                 st.subheader("Operational Services")
                 operational_services = []
-                col_ops1, col_ops2 = st.columns(2)
-                with col_ops1:
-                    if st.checkbox(f"Kitting Services (${CONFIG['operational_services']['kitting']['price']}/kit)"):
-                        operational_services.append('kitting')
-                with col_ops2:
-                    if st.checkbox(f"3PL/Fulfillment (${CONFIG['operational_services']['3pl']['price']}/kit)"):
-                        operational_services.append('3pl')
-                if st.checkbox("Customer Support Services (Included)"):
-                    operational_services.append('customer_support')
+                billable = [svc for svc in catalog.operational.values() if svc.billable]
+                for column, svc in zip(st.columns(len(billable)), billable):
+                    with column:
+                        if st.checkbox(svc.option_label, value=svc.key in state.operational_services):
+                            operational_services.append(svc.key)
+                for svc in catalog.operational.values():
+                    if not svc.billable and st.checkbox(svc.option_label, value=svc.key in state.operational_services):
+                        operational_services.append(svc.key)
             else:
                 st.subheader("Report Package")
                 st.info("Partner will upload .idat files. Select the report package needed:")
-                report_options = CONFIG['report_only_options']
-                report_choice = st.radio("Select report package:", options=list(report_options.keys()), format_func=lambda x: f"{report_options[x]['name']} - **${report_options[x]['price']}/sample**")
-                report_name = report_options[report_choice]['name']
-                report_price = report_options[report_choice]['price']
+                report_options = catalog.reports('report_only')
+                report_choice = st.radio("Select report package:", options=list(report_options), index=option_index(report_options, state.report_choice), format_func=lambda x: report_options[x].option_label)
                 processing_type = None
                 sample_type = None
                 operational_services = []
@@ -399,126 +400,132 @@ def main():
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("← Back"):
-                    st.session_state.step = 2
-                    st.rerun()
+                    go(2)
             with col_b:
                 if st.button("Next →", type="primary"):
-                    st.session_state.processing_type = processing_type
-                    st.session_state.sample_type = sample_type
-                    st.session_state.report_choice = report_choice
-                    st.session_state.report_name = report_name
-                    st.session_state.report_price = report_price
-                    st.session_state.operational_services = operational_services
-                    st.session_state.step = 4
-                    st.rerun()
-        elif st.session_state.step == 4:
+                    state.update(processing_type=processing_type, sample_type=sample_type, report_choice=report_choice, operational_services=operational_services)
+                    go(4)
+        elif state.step == 4:
             st.markdown('<div class="step-header"><h3>Step 4: Additional Services</h3></div>', unsafe_allow_html=True)
             st.subheader("Bioinformatic Services")
             st.write("Standard bioinformatics (data processing, QC, algorithms) is included. Select any additional services:")
             bioinformatic_services = []
-            col_bio1, col_bio2 = st.columns(2)
-            with col_bio1:
-                if st.checkbox("IRB Submission - Tier 1 ($5,000)"):
-                    bioinformatic_services.append('irb_tier1')
-                if st.checkbox("IRB Submission - Tier 2 ($10,000)"):
-                    bioinformatic_services.append('irb_tier2')
-                if st.checkbox("Publication Drafting (Custom)"):
-                    bioinformatic_services.append('publication_drafting')
-                if st.checkbox("Publication Submission (Custom)"):
-                    bioinformatic_services.append('publication_submission')
-            with col_bio2:
-                if st.checkbox("Interventional Trial Analysis (Custom)"):
-                    bioinformatic_services.append('interventional_trial')
-                if st.checkbox("Custom Algorithm Development (Custom)"):
-                    bioinformatic_services.append('algorithm_creation')
-                if st.checkbox("Algorithm Validation (Custom)"):
-                    bioinformatic_services.append('algorithm_validation')
+            add_ons = list(catalog.bioinformatic.values())
+            half = (len(add_ons) + 1) // 2
+            for column, group in zip(st.columns(2), (add_ons[:half], add_ons[half:])):
+                with column:
+                    for svc in group:
+                        if st.checkbox(svc.option_label, value=svc.key in state.bioinformatic_services):
+                            bioinformatic_services.append(svc.key)
             st.subheader("Data Delivery")
-            data_delivery = st.multiselect("Select data formats needed:", options=CONFIG['data_delivery_options'], default=["PDF Reports"])
-            portal_access = st.checkbox("TruDiagnostic Portal Access")
+            data_delivery = st.multiselect("Select data formats needed:", options=catalog.data_delivery_options, default=list(state.data_delivery))
+            portal_access = st.checkbox("TruDiagnostic Portal Access", value=state.portal_access)
             st.subheader("Estimated Volume")
-            estimated_volume = st.number_input("Estimated number of samples/reports:", min_value=0, step=100)
+            estimated_volume = st.number_input("Estimated number of samples/reports:", min_value=0, value=state.estimated_volume, step=100)
+            blocked = rule_feedback({**state.data(), 'bioinformatic_services': bioinformatic_services, 'estimated_volume': estimated_volume})
             st.markdown("---")
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("← Back"):
-                    st.session_state.step = 3
-                    st.rerun()
+                    go(3)
             with col_b:
-                if st.button("Next →", type="primary"):
-                    st.session_state.bioinformatic_services = bioinformatic_services
-                    st.session_state.data_delivery = data_delivery if data_delivery else ["PDF Reports"]
-                    st.session_state.portal_access = portal_access
-                    st.session_state.estimated_volume = estimated_volume
-                    st.session_state.step = 5
-                    st.rerun()
-        elif st.session_state.step == 5:
+                if st.button("Next →", type="primary", disabled=blocked):
+                    state.update(bioinformatic_services=bioinformatic_services, data_delivery=data_delivery if data_delivery else ["PDF Reports"], portal_access=portal_access, estimated_volume=estimated_volume)
+                    go(5)
+        elif state.step == 5:
             st.markdown('<div class="step-header"><h3>Step 5: Review & Generate</h3></div>', unsafe_allow_html=True)
             st.markdown('<div class="summary-box">', unsafe_allow_html=True)
             st.subheader("📋 SOW Summary")
             col_sum1, col_sum2 = st.columns(2)
             with col_sum1:
-                st.write(f"**Partner:** {st.session_state.partner_name}")
-                st.write(f"**Effective Date:** {st.session_state.effective_date}")
-                st.write(f"**Track:** {'Sample Processing' if st.session_state.track == 'processing' else 'Report Only'}")
-                if st.session_state.track == 'processing':
-                    proc_name = CONFIG['processing_types'].get(st.session_state.processing_type, {}).get('name', 'N/A')
+                st.write(f"**Partner:** {state.partner_name}")
+                st.write(f"**Effective Date:** {state.effective_date}")
+                st.write(f"**Track:** {'Sample Processing' if state.track == 'processing' else 'Report Only'}")
+                if state.track == 'processing':
+                    proc_name = catalog.processing[state.processing_type].name
                     st.write(f"**Processing:** {proc_name}")
-                    st.write(f"**Sample Type:** {st.session_state.sample_type}")
-                st.write(f"**Report Package:** {st.session_state.report_name}")
+                    st.write(f"**Sample Type:** {state.sample_type}")
+                st.write(f"**Report Package:** {state.report.name}")
             with col_sum2:
-                st.write(f"**Base Price:** ${st.session_state.report_price}/sample")
-                if st.session_state.operational_services:
-                    ops = [CONFIG['operational_services'][k]['name'] for k in st.session_state.operational_services]
+                st.write(f"**Base Price:** ${state.report.price}/sample")
+                if state.operational_services:
+                    ops = [catalog.operational[k].name for k in state.operational_services]
                     st.write(f"**Operational:** {', '.join(ops)}")
-                if st.session_state.bioinformatic_services:
-                    bio = [CONFIG['bioinformatic_services'][k]['name'] for k in st.session_state.bioinformatic_services]
+                if state.bioinformatic_services:
+                    bio = [catalog.bioinformatic[k].name for k in state.bioinformatic_services]
                     st.write(f"**Add-ons:** {', '.join(bio)}")
-                if st.session_state.estimated_volume:
-                    base_total = st.session_state.report_price * st.session_state.estimated_volume
-                    st.write(f"**Volume:** {st.session_state.estimated_volume:,} samples")
-                    st.write(f"**Est. Base Total:** ${base_total:,}")
+                if state.estimated_volume:
+                    from sow_quote import format_money, quote_data
+                    quote = quote_data(state.data())
+                    st.write(f"**Volume:** {quote.volume:,} samples")
+                    st.write(f"**Est. Base Total:** {format_money(quote.report)}")
+                    st.write(f"**Est. Total:** {format_money(quote.total)}" + (f" (incl. {quote.discount_pct}% volume discount)" if quote.discount else "") + (" + TBD services" if quote.tbd else ""))
             st.markdown('</div>', unsafe_allow_html=True)
+            blocked = rule_feedback(state.data())
+            pricing_comparison()
             st.markdown("---")
             col_a, col_b, col_c = st.columns([1, 2, 1])
             with col_a:
                 if st.button("← Back"):
-                    st.session_state.step = 4
-                    st.rerun()
+                    go(4)
             with col_b:
-                if st.button("🔄 Generate SOW Document", type="primary", use_container_width=True):
-                    with st.spinner("Generating document..."):
-                        data = {'partner_name': st.session_state.partner_name, 'effective_date': st.session_state.effective_date, 'track': st.session_state.track, 'processing_type': st.session_state.processing_type, 'sample_type': st.session_state.sample_type, 'report_choice': st.session_state.report_choice, 'report_name': st.session_state.report_name, 'report_price': st.session_state.report_price, 'operational_services': st.session_state.operational_services, 'bioinformatic_services': st.session_state.bioinformatic_services, 'data_delivery': st.session_state.data_delivery, 'portal_access': st.session_state.portal_access, 'estimated_volume': st.session_state.estimated_volume}
-                        doc = generate_sow_document(data)
-                        buffer = BytesIO()
-                        doc.save(buffer)
-                        buffer.seek(0)
-                        st.session_state.doc_buffer = buffer
-                        st.session_state.doc_ready = True
+                if st.button("🔄 Generate SOW Document", type="primary", use_container_width=True, disabled=blocked or 'job_ids' in st.session_state):
+                    data = state.data()
+                    try:
+                        check_pdf_text(data)
+                        kinds = ('docx', 'pdf')
+                    except PdfTextError:
+                        kinds = ('docx',)
+                    jobs = []
+                    try:
+                        for kind in kinds:
+                            jobs.append(get_queue().submit(session_owner(), render_job, data, renderer(kind), kind, label=f"{state.partner_name} ({kind})"))
+                    except QueueFull:
+                        for job in jobs:
+                            get_queue().cancel(job.id)
+                        st.warning("⏳ The generator is busy right now. Please try again in a few seconds.")
+                    else:
+                        st.session_state.job_ids = [job.id for job in jobs]
+                        st.session_state.doc_data = data
+                        st.session_state.doc_kinds = kinds
+                        st.session_state.doc_ready = False
+                        st.session_state.doc_downloaded = False
                         st.rerun()
-            if st.session_state.get('doc_ready'):
-                st.success("✅ Document generated successfully!")
-                filename = f"SOW_{st.session_state.partner_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.docx"
-                st.download_button(label="📥 Download SOW Document", data=st.session_state.doc_buffer, file_name=filename, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
+            if 'job_ids' in st.session_state:
+                job_progress()
+            elif st.session_state.get('doc_ready'):
+                st.success("✅ Document ready to download!")
+                downloads = [(kind, label) for kind, label in (('docx', "📥 Word (.docx)"), ('pdf', "📥 PDF"), ('zip', "📦 Both (.zip)")) if kind == 'docx' or 'pdf' in st.session_state.get('doc_kinds', ('pdf',))]
+                for col, (kind, label) in zip(st.columns(3), downloads):
+                    with col:
+                        st.download_button(label=label, data=document_source(st.session_state.doc_data, kind), file_name=sow_filename(state.partner_name, datetime.now(), kind), mime=MIME_TYPES[kind], on_click=mark_downloaded, key=f"download_{kind}", use_container_width=True)
+                if len(downloads) == 1:
+                    st.caption(f"No PDF: its fonts cannot show {unsupported_chars(state.partner_name)!r} in the partner name.")
+                if st.session_state.get('doc_downloaded'):
+                    st.info("📥 Downloaded. The other formats stay available until you start a new SOW.")
+            if st.session_state.get('doc_ready') or st.session_state.get('doc_downloaded'):
                 if st.button("🔄 Start New SOW"):
                     for key in list(st.session_state.keys()):
                         del st.session_state[key]
+                    st.query_params.pop('s', None)
+                    st.query_params.pop('draft', None)
                     st.rerun()
     with col2:
         st.markdown("### 💡 Quick Tips")
-        if st.session_state.step == 1:
+        if state.step == 1:
             st.info("Enter the exact legal name as it should appear on the contract.")
-        elif st.session_state.step == 2:
+        elif state.step == 2:
             st.info("**Sample Processing**: Client sends samples to TruDiagnostic.\n\n**Report Only**: Client uploads .idat files.")
-        elif st.session_state.step == 3:
-            if st.session_state.track == 'processing':
+        elif state.step == 3:
+            if state.track == 'processing':
                 st.info("**Epigenetic** = DNA methylation.\n\n**Genomic** = SNP/CNV detection.\n\nCannot combine in one SOW.")
             else:
                 st.info("Report-only pricing is lower since no lab processing is required.")
-        elif st.session_state.step == 4:
+        elif state.step == 4:
             st.info("Standard bioinformatics is always included. Additional services are optional add-ons.")
-        elif st.session_state.step == 5:
+        elif state.step == 5:
             st.info("Review all details carefully before generating.")
 
 if __name__ == "__main__":
-    main()
+    with get_metrics().span('sow_rerun_seconds', step=st.session_state.wizard.step if 'wizard' in st.session_state else 1):
+        main()
@@ -0,0 +1,54 @@
+"""
+Per-format build time: .docx (precompiled template) vs. .pdf, and both together.
+
+Usage: python benchmarks/bench_formats.py [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_template import SAMPLE
+from sow_pdf import render_sow_pdf
+from sow_template import get_template
+
+def render(kind):
+    return render_sow_pdf(SAMPLE) if kind == 'pdf' else get_template().render_bytes(SAMPLE)
+
+def measure(fn, n):
+    fn()
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', type=int, default=50, help="iterations per mode (default: 50)")
+    args = parser.parse_args(argv)
+    get_template()
+    sizes = {kind: len(render(kind)) for kind in ('docx', 'pdf')}
+    with ThreadPoolExecutor(2) as threads, ProcessPoolExecutor(2, initializer=get_template) as processes:
+        list(processes.map(render, ('docx', 'pdf')))
+        rows = [
+            ("docx", measure(lambda: render('docx'), args.n)),
+            ("pdf", measure(lambda: render('pdf'), args.n)),
+            ("both, sequential", measure(lambda: [render('docx'), render('pdf')], args.n)),
+            ("both, 2 threads", measure(lambda: list(threads.map(render, ('docx', 'pdf'))), args.n)),
+            ("both, 2 processes", measure(lambda: list(processes.map(render, ('docx', 'pdf'))), args.n)),
+        ]
+    print(f"output size: docx {sizes['docx']:,} bytes, pdf {sizes['pdf']:,} bytes")
+    print(f"{'mode':<22}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, (mean, p50, p95) in rows:
+        print(f"{name:<22}{mean:>10.2f}{p50:>10.2f}{p95:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Regeneration after a one-field edit: cold section fragments vs. the fragment cache.
+
+Usage: python benchmarks/bench_incremental.py [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_template import SAMPLE
+from sow_document import SECTIONS
+from sow_template import SowTemplate
+
+EDITS = [
+    ("toggle a bioinformatics add-on", 'bioinformatic_services', ['irb_tier1']),
+    ("change estimated volume", 'estimated_volume', 5000),
+    ("rename the partner", 'partner_name', 'Acme Health Labs, LLC'),
+    ("toggle portal access", 'portal_access', False),
+]
+
+def measure(template, edited, n, cold):
+    """Mean ms to render `edited`, from an empty fragment cache or one primed with SAMPLE."""
+    total = 0.0
+    for _ in range(n):
+        template.fragments.clear()
+        if not cold:
+            template.render_bytes(SAMPLE)
+        start = time.perf_counter()
+        template.render_bytes(edited)
+        total += time.perf_counter() - start
+    return total / n * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', type=int, default=200, help="iterations per edit (default: 200)")
+    args = parser.parse_args(argv)
+    template = SowTemplate()
+    print(f"{'edit':<32}{'dirty':>7}{'full ms':>10}{'incremental ms':>16}")
+    for name, key, value in EDITS:
+        edited = {**SAMPLE, key: value}
+        dirty = sum(1 for s in SECTIONS if key in s.deps)
+        cold = measure(template, edited, args.n, cold=True)
+        warm = measure(template, edited, args.n, cold=False)
+        print(f"{name:<32}{dirty:>7}{cold:>10.3f}{warm:>16.3f}")
+
+if __name__ == "__main__":
+    main()
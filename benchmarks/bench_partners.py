@@ -0,0 +1,94 @@
+"""
+Partner directory: CSV import, trigram index build, and suggestion latency and recall for typo'd names.
+
+Generates a CSV of synthetic legal names, imports it into a fresh store, then
+looks up mistyped (one dropped, swapped or replaced letter) and half-typed
+names the way the step-1 input does, and reports how often the intended
+partner is the first suggestion or in the top five.
+
+Usage: python benchmarks/bench_partners.py [-n PARTNERS] [-q QUERIES]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sow_partners import PartnerDirectory
+from sow_store import SowStore
+
+FIRST = ['Acme', 'Genome', 'Helix', 'Vital', 'Nova', 'Longevity', 'Apex', 'Summit', 'Cedar', 'Harbor', 'Meridian', 'Pioneer', 'Northstar', 'Blue Ridge', 'Evergreen', 'Sterling', 'Beacon', 'Keystone', 'Lakeside', 'Redwood', 'Müller', "O'Connor", 'São Paulo', 'Zürich']
+MIDDLE = ['Health', 'Bio', 'Research', 'Wellness', 'Diagnostics', 'Genomics', 'Clinical', 'Medical', 'Longevity', 'Precision', 'Integrative', 'Family', 'Sports', 'Aging']
+LAST = ['Labs', 'Clinic', 'Institute', 'Partners', 'Group', 'Center', 'Associates', 'Sciences', 'Medicine', 'Therapeutics']
+SUFFIXES = ['Inc.', 'LLC', 'Ltd.', 'Corp.', 'GmbH', 'PLLC', '']
+
+def synthetic_names(n, rng):
+    names = set()
+    while len(names) < n:
+        name = f"{rng.choice(FIRST)} {rng.choice(MIDDLE)} {rng.choice(LAST)}"
+        if rng.random() < 0.7:
+            name += f" {rng.choice(['of', 'at'])} {rng.choice(FIRST)}" if rng.random() < 0.3 else f" {rng.randrange(1, 999)}"
+        suffix = rng.choice(SUFFIXES)
+        names.add(f"{name}, {suffix}" if suffix else name)
+    return sorted(names)
+
+def typo(name, rng):
+    letters = [i for i, c in enumerate(name) if c.isalpha()]
+    i = rng.choice(letters)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1 and i + 1 < len(name):
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + rng.choice('aeioulnrst') + name[i + 1:]
+
+def run(directory, queries):
+    latencies, first, top5 = [], 0, 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        suggestions = directory.suggest(query)
+        latencies.append(time.perf_counter() - start)
+        names = [partner.name for partner, _ in suggestions]
+        first += bool(names) and names[0] == expected
+        top5 += expected in names
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    return pct(0.5), pct(0.99), latencies[-1] * 1000, first / len(queries), top5 / len(queries)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--partners', type=int, default=50000, help="directory size (default: 50000)")
+    parser.add_argument('-q', '--queries', type=int, default=2000, help="lookups per query kind (default: 2000)")
+    args = parser.parse_args(argv)
+    rng = random.Random(7)
+    names = synthetic_names(args.partners, rng)
+    csv_text = "partner_name,city\n" + ''.join(f'"{name}",Anytown\n' for name in names)
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = PartnerDirectory(SowStore(os.path.join(tmp, 'partners.db')))
+        start = time.perf_counter()
+        added, read = directory.import_csv(io.StringIO(csv_text))
+        imported = time.perf_counter() - start
+        start = time.perf_counter()
+        index = directory.index()
+        built = time.perf_counter() - start
+        print(f"{read:,} names imported in {imported:.2f} s ({added:,} new); index of {len(index.vocab):,} trigrams built in {built:.2f} s")
+        print(f"re-import: {directory.import_csv(io.StringIO(csv_text))[0]:,} new")
+        picked = rng.sample(names, min(args.queries, len(names)))
+        kinds = {
+            "exact": [(name, name) for name in picked],
+            "one typo": [(typo(name, rng), name) for name in picked],
+            "lower case, no punctuation": [(name.lower().replace(',', '').replace('.', ''), name) for name in picked],
+            "typed up to the suffix": [(name.split(',')[0], name) for name in picked],
+        }
+        print(f"{'query':<28}{'p50 ms':>8}{'p99 ms':>8}{'max ms':>8}{'top-1':>8}{'top-5':>8}")
+        for label, queries in kinds.items():
+            p50, p99, worst, first, top5 = run(directory, queries)
+            print(f"{label:<28}{p50:>8.2f}{p99:>8.2f}{worst:>8.2f}{first:>8.1%}{top5:>8.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Scenario sweep throughput for sow_quote.
+
+Usage: python benchmarks/bench_quote.py [-n REPEATS]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sow_quote import AUTO, sweep
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--repeats', type=int, default=5, help="timed repeats per grid (default: 5)")
+    args = parser.parse_args(argv)
+    grids = [
+        ("epigenetic, 4 volumes x 3 packages x 4 ops x 128 add-ons x 5 discounts", dict(track='processing', processing_type='epigenetic', volumes=(100, 1000, 5000, 10000), discounts=(AUTO, 0, 5, 10, 15))),
+        ("epigenetic, 50 volumes x 3 packages x 4 ops x 128 add-ons x 4 discounts", dict(track='processing', processing_type='epigenetic', volumes=range(100, 5100, 100), discounts=(AUTO, 0, 5, 10))),
+        ("report only, 200 volumes x 3 packages x 128 add-ons x 4 discounts", dict(track='report_only', volumes=range(50, 10050, 50), discounts=(AUTO, 0, 5, 10))),
+    ]
+    for label, kwargs in grids:
+        sweep(**kwargs)
+        best = float('inf')
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            result = sweep(**kwargs)
+            best = min(best, time.perf_counter() - start)
+        print(f"{len(result):>9,} scenarios {best * 1000:8.1f} ms {len(result) / best / 1e6:6.1f} M scenarios/s  {label}")
+
+if __name__ == "__main__":
+    main()
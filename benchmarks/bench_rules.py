@@ -0,0 +1,50 @@
+"""
+Catalog rule checks: compile time and per-SOW check latency over random service selections.
+
+Usage: python benchmarks/bench_rules.py [-n SELECTIONS] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_template import SAMPLE
+from sow_catalog import get_catalog
+from sow_rules import ERROR, RuleSet
+
+def selections(n, rng):
+    catalog = get_catalog()
+    operational, bioinformatic = list(catalog.operational), list(catalog.bioinformatic)
+    return [{**SAMPLE, 'operational_services': rng.sample(operational, rng.randrange(len(operational) + 1)), 'bioinformatic_services': rng.sample(bioinformatic, rng.randrange(len(bioinformatic) + 1)), 'estimated_volume': rng.choice((0, 100, 1000))} for _ in range(n)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--selections', type=int, default=10000, help="random selections to check (default: 10000)")
+    parser.add_argument('--repeat', type=int, default=5, help="passes over the selections (default: 5)")
+    args = parser.parse_args(argv)
+    catalog = get_catalog()
+    start = time.perf_counter()
+    for _ in range(100):
+        RuleSet(catalog.config.get('rules', ()), {**catalog.operational, **catalog.bioinformatic})
+    compile_us = (time.perf_counter() - start) / 100 * 1e6
+    data = selections(args.selections, random.Random(7))
+    rules = catalog.rules
+    best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for row in data:
+            rules.check(row)
+        best = min(best, time.perf_counter() - start)
+    issues = [rules.check(row) for row in data]
+    blocked = sum(1 for found in issues if any(i.level == ERROR for i in found))
+    clean = sum(1 for found in issues if not found)
+    print(f"{len(rules)} rules over {len(rules.services)} services, compiled in {compile_us:.0f} us")
+    print(f"{len(data):,} checks: {best / len(data) * 1e6:.2f} us per SOW (best of {args.repeat})")
+    print(f"{blocked:,} blocked by an error, {len(data) - blocked - clean:,} with warnings only, {clean:,} clean")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+HTTP service load test: requests/sec and tail latency with many concurrent keep-alive clients.
+
+Starts sow_service.py on a free local port (or targets --url) and runs
+--clients concurrent clients, each reusing one HTTP/1.1 connection, until
+--requests documents have been fetched. Every request carries unique partner
+data, so the document cache cannot answer it; --repeat sends the same data
+every time to measure the cached path instead.
+
+Usage: python benchmarks/bench_service.py [-c CLIENTS] [-n REQUESTS] [-j WORKERS] [--url URL]
+                                          [--repeat] [--no-keepalive] [--batch SIZE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_template import SAMPLE
+
+def payload(i, repeat, batch):
+    rows = [{**SAMPLE, 'effective_date': SAMPLE['effective_date'].isoformat(), 'partner_name': SAMPLE['partner_name'] if repeat else f"Load Test Partner {i}-{j}"} for j in range(batch or 1)]
+    return json.dumps(rows if batch else rows[0]).encode()
+
+class Client:
+    """One HTTP/1.1 connection; reconnects when the server closes it or keep-alive is off."""
+
+    def __init__(self, host, port, keepalive):
+        self.host, self.port, self.keepalive = host, port, keepalive
+        self.reader = self.writer = None
+
+    async def request(self, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nX-Tenant: load-test\r\nConnection: {'keep-alive' if self.keepalive else 'close'}\r\n\r\n"
+        self.writer.write(head.encode() + body)
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        size = int(headers.get('content-length', 0))
+        await self.reader.readexactly(size)
+        if not self.keepalive or headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, size
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+async def run(host, port, args):
+    path = '/sow/batch' if args.batch else '/sow'
+    latencies, statuses, sizes = [], {}, 0
+    counter = iter(range(args.requests))
+
+    async def client():
+        nonlocal sizes
+        conn = Client(host, port, not args.no_keepalive)
+        for i in counter:
+            body = payload(i, args.repeat, args.batch)
+            start = time.perf_counter()
+            status, size = await conn.request(path, body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            sizes += size
+        conn.close()
+
+    for _ in range(min(args.clients, 8)):
+        await Client(host, port, False).request(path, payload(-1, True, args.batch))
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    return time.perf_counter() - start, sorted(latencies), statuses, sizes
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"service exited with status {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("service did not start")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-c', '--clients', type=int, default=64, help="concurrent clients (default: 64)")
+    parser.add_argument('-n', '--requests', type=int, default=5000, help="total requests (default: 5000)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="service render workers when started here (default: CPU count)")
+    parser.add_argument('--url', help="benchmark a running service instead of starting one, e.g. http://127.0.0.1:8700")
+    parser.add_argument('--repeat', action='store_true', help="send identical data (document cache hits)")
+    parser.add_argument('--no-keepalive', action='store_true', help="open a new connection per request")
+    parser.add_argument('--batch', type=int, default=0, help="documents per request via /sow/batch (default: single /sow)")
+    args = parser.parse_args(argv)
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        command = [sys.executable, os.path.join(ROOT, 'sow_service.py'), '--port', str(port), '--per-tenant', str(max(args.clients, 16)), '--max-pending', str(max(args.clients * 2, 256))]
+        if args.workers:
+            command += ['-j', str(args.workers)]
+        process = subprocess.Popen(command, env={**os.environ, 'SOW_STORE': ''})
+        started = time.perf_counter()
+        wait_ready(port, process)
+        print(f"service ready in {time.perf_counter() - started:.1f} s (workers warmed)")
+    try:
+        elapsed, latencies, statuses, sizes = asyncio.run(run(host, port, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    done = len(latencies)
+    documents = done * (args.batch or 1)
+    pct = lambda q: latencies[min(done - 1, int(q * done))] * 1000
+    print(f"{args.clients} clients, {'keep-alive' if not args.no_keepalive else 'new connection per request'}, {'repeated' if args.repeat else 'unique'} data{f', batches of {args.batch}' if args.batch else ''}")
+    print(f"{done:,} requests in {elapsed:.2f} s: {done / elapsed:,.0f} req/s, {documents / elapsed:,.0f} docs/s, {sizes / elapsed / 1e6:,.1f} MB/s")
+    print(f"latency ms: p50 {pct(0.5):.1f}  p95 {pct(0.95):.1f}  p99 {pct(0.99):.1f}  max {latencies[-1] * 1000:.1f}")
+    print(f"status codes: {', '.join(f'{code}: {count:,}' for code, count in sorted(statuses.items()))}")
+    return 0 if set(statuses) == {200} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Per-session memory held for a finished SOW: buffered BytesIO vs. deferred rendering.
+
+Before: step 5 kept the saved document in st.session_state.doc_buffer until the
+session ended. After: the session keeps only the `data` dict and the document
+is rendered into the download when it is requested.
+
+The wizard inputs themselves are measured too: a dozen loose session_state
+keys vs. one WizardState vs. its encoded URL token.
+
+Usage: python benchmarks/bench_session_memory.py [-s SESSIONS]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import date
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sow_state import WizardState
+from sow_template import get_template
+
+def sample(i):
+    return {'partner_name': f'Partner {i} Health, Inc.', 'effective_date': date(2026, 1, 15), 'track': 'processing', 'processing_type': 'epigenetic', 'sample_type': 'Blood Spot', 'report_choice': 'truage_truhealth', 'report_name': 'Epigenetic + TruAge + TruHealth', 'report_price': 300, 'operational_services': ['kitting', '3pl'], 'bioinformatic_services': ['irb_tier1'], 'data_delivery': ['IDAT Files', 'PDF Reports'], 'portal_access': True, 'estimated_volume': 100 + i}
+
+def buffered(i):
+    return {'doc_buffer': BytesIO(get_template().render_bytes(sample(i))), 'doc_ready': True}
+
+def deferred(i):
+    return {'doc_data': sample(i), 'doc_ready': True}
+
+def loose_keys(i):
+    return {'step': 5, **sample(i)}
+
+def wizard_state(i):
+    return {'wizard': WizardState.from_data(sample(i))}
+
+def wizard_token(i):
+    return {'s': WizardState.from_data(sample(i)).encode()}
+
+def measure(make, sessions):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = [make(i) for i in range(sessions)]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del states
+    return held / sessions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-s', '--sessions', type=int, default=200, help="simulated sessions (default: 200)")
+    args = parser.parse_args(argv)
+    get_template()
+    old, new = measure(buffered, args.sessions), measure(deferred, args.sessions)
+    print(f"buffered BytesIO in session state: {old / 1024:8.1f} KB/session")
+    print(f"deferred render (data dict only):  {new / 1024:8.1f} KB/session")
+    print(f"reduction: {old / new:.0f}x")
+    loose, state, token = (measure(make, args.sessions) for make in (loose_keys, wizard_state, wizard_token))
+    print(f"wizard inputs as loose keys:        {loose:8.0f} B/session")
+    print(f"wizard inputs as one WizardState:   {state:8.0f} B/session")
+    print(f"wizard inputs as URL token:         {token:8.0f} B/session ({len(WizardState.from_data(sample(0)).encode())} chars)")
+
+if __name__ == "__main__":
+    main()
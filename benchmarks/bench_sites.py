@@ -0,0 +1,76 @@
+"""
+Multi-site SOWs: build time and peak memory as the per-site Exhibit tables grow.
+
+Writes each SOW through the template into a byte-counting sink, the way the
+service and batch paths stream it, and reports time per site row and the
+tracemalloc peak above the data itself. Time should grow linearly with the
+sites and memory should stay flat. The python-docx renderer is timed for the
+smaller sizes, streamed row chunks and cell-by-cell object model side by side.
+
+Usage: python benchmarks/bench_sites.py [--sites 100,1000,10000,50000] [--docx-max 5000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_template import SAMPLE
+from sow_catalog import use_catalog
+from sow_document import SECTIONS, StreamTable, Table, _add_block, generate_sow_document, new_document
+from sow_template import SowTemplate
+
+class Sink:
+    """Counts what is written and keeps none of it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+def site_data(n):
+    return {**SAMPLE, 'sites': [{'name': f"Clinic {i:05d} - {('North', 'South', 'East', 'West')[i % 4]} Campus", 'volume': 20 + i * 37 % 480} for i in range(n)]}
+
+def object_model(data):
+    """python-docx with every StreamTable materialized and filled cell by cell."""
+    doc = new_document()
+    with use_catalog():
+        for section in SECTIONS:
+            for block in section.build(data):
+                _add_block(doc, Table(block.rows, block.style, bold_footer=block.bold_footer) if isinstance(block, StreamTable) else block)
+    doc.save(BytesIO())
+
+def streamed(data):
+    generate_sow_document(data).save(BytesIO())
+
+def timed(fn, data):
+    start = time.perf_counter()
+    fn(data)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sites', default='100,1000,10000,50000', help="comma-separated site counts (default: 100,1000,10000,50000)")
+    parser.add_argument('--docx-max', type=int, default=5000, help="largest site count to time with python-docx (default: 5000)")
+    args = parser.parse_args(argv)
+    template = SowTemplate()
+    print(f"{'sites':>8}{'template ms':>13}{'us/site':>9}{'peak KiB':>10}{'docx KiB':>10}{'stream ms':>11}{'cells ms':>10}")
+    for n in (int(v) for v in args.sites.split(',')):
+        data = site_data(n)
+        sink = Sink()
+        template.write(data, sink)
+        seconds = timed(lambda d: template.write(d, Sink()), data)
+        tracemalloc.start()
+        template.write(data, Sink())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        docx = f"{timed(streamed, data) * 1000:>11.1f}{timed(object_model, data) * 1000:>10.1f}" if n <= args.docx_max else f"{'-':>11}{'-':>10}"
+        print(f"{n:>8,}{seconds * 1000:>13.1f}{seconds / n * 1e6:>9.1f}{peak / 1024:>10.0f}{sink.size / 1024:>10.0f}{docx}")
+
+if __name__ == "__main__":
+    main()
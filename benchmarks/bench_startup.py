@@ -0,0 +1,82 @@
+"""
+Cold-start and per-rerun cost of app.py.
+
+- import: wall time of `import app` in a fresh interpreter (streamlit itself
+  is imported first and excluded), median of several runs, plus which heavy
+  modules that import pulled in.
+- rerun: wall time of one script run under streamlit's AppTest harness on
+  each wizard step, median over repeated reruns.
+
+Usage: python benchmarks/bench_startup.py [-n RUNS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('docx', 'lxml', 'numpy')
+IMPORT_PROBE = """
+import sys, time, logging
+import streamlit
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+import app
+print(round((time.perf_counter() - start) * 1000, 2), ','.join(m for m in %r if m in sys.modules))
+""" % (HEAVY,)
+
+# WizardState fields filled in by the time each step is shown; cumulative.
+STEP_STATE = {
+    1: {},
+    2: {'partner_name': 'Acme Health Labs, Inc.', 'effective_date': date(2026, 1, 15)},
+    3: {'track': 'processing'},
+    4: {'processing_type': 'epigenetic', 'sample_type': 'Blood Spot', 'report_choice': 'truage_truhealth', 'operational_services': ('kitting',)},
+    5: {'bioinformatic_services': ('irb_tier1',), 'data_delivery': ('PDF Reports',), 'portal_access': True, 'estimated_volume': 1000},
+}
+
+def measure_import(runs):
+    times, heavy = [], ''
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        heavy = out[1] if len(out) > 1 else ''
+    return statistics.median(times), heavy or 'none'
+
+def measure_reruns(runs):
+    sys.path.insert(0, ROOT)
+    from streamlit.testing.v1 import AppTest
+    from sow_state import WizardState
+    results = {}
+    state = {}
+    for step in sorted(STEP_STATE):
+        state.update(STEP_STATE[step])
+        at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=60)
+        at.session_state['wizard'] = WizardState(step=step, **state)
+        at.run()
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            at.run()
+            samples.append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            raise RuntimeError(f"step {step}: {at.exception}")
+        if at.session_state['wizard'].step != step:
+            raise RuntimeError(f"step {step}: the app rendered step {at.session_state['wizard'].step}")
+        results[step] = statistics.median(samples)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=5, help="runs per measurement (default: 5)")
+    args = parser.parse_args(argv)
+    import_ms, heavy = measure_import(args.runs)
+    print(f"import app: {import_ms:.1f} ms (heavy modules loaded: {heavy})")
+    for step, ms in measure_reruns(args.runs * 4).items():
+        print(f"rerun step {step}: {ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+SOW store lookups over a large archive: index and full-text search latency.
+
+Usage: python benchmarks/bench_store.py [-n RECORDS] [--db PATH]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_template import SAMPLE
+from sow_catalog import get_catalog
+from sow_store import SowStore
+from sow_template import get_template
+
+WORDS = ['Acme', 'Genome', 'Helix', 'Vital', 'Nova', 'Longevity', 'Clinic', 'Labs', 'Health', 'Bio', 'Research', 'Partners', 'Wellness', 'Institute']
+
+def synthetic(i, rng):
+    track = 'processing' if i % 4 else 'report_only'
+    processing = rng.choice(list(get_catalog().processing)) if track == 'processing' else None
+    reports = get_catalog().reports(track, processing)
+    choice = rng.choice(list(reports))
+    return {**SAMPLE, 'partner_name': f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}", 'effective_date': date(2024, 1, 1) + timedelta(days=rng.randrange(1000)), 'track': track, 'processing_type': processing, 'sample_type': get_catalog().processing[processing].sample_types[0] if processing else None, 'report_choice': choice, 'report_name': reports[choice].name, 'report_price': reports[choice].price, 'operational_services': rng.sample(list(get_catalog().operational), 2) if processing else [], 'bioinformatic_services': rng.sample(list(get_catalog().bioinformatic), 2), 'estimated_volume': rng.randrange(0, 20000, 100)}
+
+def measure(fn, n=50):
+    fn()
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', type=int, default=20000, help="records to insert (default: 20000)")
+    parser.add_argument('--db', help="database path (default: a temporary file)")
+    args = parser.parse_args(argv)
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    store = SowStore(path)
+    rng = random.Random(7)
+    payload = get_template().render_bytes(SAMPLE)
+    start = time.perf_counter()
+    for i in range(args.n):
+        store.save(synthetic(i, rng), payload)
+    elapsed = time.perf_counter() - start
+    stats = store.stats()
+    print(f"inserted {stats['sows']:,} SOWs in {elapsed:.1f} s ({elapsed / args.n * 1000:.2f} ms each), {os.path.getsize(path) / 1e6:.1f} MB")
+    target = args.n // 2
+    queries = [
+        ("partner prefix", lambda: store.search(partner="Helix Nova")),
+        ("full text", lambda: store.search(text="publication drafting")),
+        ("full text, typing", lambda: store.search(text="helix no")),
+        ("full text + partner", lambda: store.search(text="algorithm", partner="Acme")),
+        ("service", lambda: store.search(service='irb_tier2', limit=20)),
+        ("track + processing", lambda: store.search(track='processing', processing_type='genomic', limit=20)),
+        ("effective date range", lambda: store.search(effective_from=date(2025, 3, 1), effective_to=date(2025, 3, 31))),
+        ("fetch + decompress", lambda: store.document(target)),
+    ]
+    print(f"{'query':<24}{'mean ms':>10}{'p95 ms':>10}")
+    for name, fn in queries:
+        mean, p95 = measure(fn)
+        print(f"{name:<24}{mean:>10.2f}{p95:>10.2f}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
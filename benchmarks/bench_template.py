@@ -0,0 +1,52 @@
+"""
+Per-document latency: python-docx object model vs. the precompiled template.
+
+Usage: python benchmarks/bench_template.py [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sow_document import generate_sow_document, save_document
+from sow_template import SowTemplate
+
+SAMPLE = {'partner_name': 'Acme Health Labs, Inc.', 'effective_date': date(2026, 1, 15), 'track': 'processing', 'processing_type': 'epigenetic', 'sample_type': 'Blood Spot', 'report_choice': 'truage_truhealth', 'report_name': 'Epigenetic + TruAge + TruHealth', 'report_price': 300, 'operational_services': ['kitting', '3pl', 'customer_support'], 'bioinformatic_services': ['irb_tier1', 'publication_drafting'], 'data_delivery': ['IDAT Files', 'PDF Reports'], 'portal_access': True, 'estimated_volume': 1200}
+
+def plain(data):
+    buffer = BytesIO()
+    save_document(generate_sow_document(data), buffer, data)
+    return buffer.getvalue()
+
+def measure(fn, n):
+    fn(SAMPLE)
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn(SAMPLE)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', type=int, default=50, help="iterations per mode (default: 50)")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    template = SowTemplate()
+    compile_ms = (time.perf_counter() - start) * 1000
+    rows = [("python-docx build + save", measure(plain, args.n)), ("precompiled template", measure(template.render_bytes, args.n))]
+    print(f"template compile (once): {compile_ms:.1f} ms")
+    print(f"{'mode':<28}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, (mean, p50, p95) in rows:
+        print(f"{name:<28}{mean:>10.2f}{p50:>10.2f}{p95:>10.2f}")
+    print(f"speedup (mean): {rows[0][1][0] / rows[1][1][0]:.1f}x")
+
+if __name__ == "__main__":
+    main()
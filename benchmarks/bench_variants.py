@@ -0,0 +1,182 @@
+"""
+Throughput over every valid SOW input combination, per variant, checked against a stored baseline.
+
+A variant is one track / processing type / report package. Within a variant
+the remaining inputs (sample type, operational services, bioinformatic
+add-ons, data delivery formats, portal access) are enumerated with --all or
+sampled with a fixed seed, and each combination is built and saved.
+Combinations that break an error-level catalog rule are skipped, since
+generation refuses them (see sow_rules); they are counted as "blocked". Every
+variant runs in a fresh process, so its peak RSS is its own. Documents/sec is
+the fastest of --repeat passes over the variant's combinations, so one noisy
+pass does not read as a regression. Documents/sec, peak RSS and mean output
+size are compared with the baseline file. Peak RSS or output size more than
+--tolerance worse than its baseline, throughput more than the wider
+--throughput-tolerance worse (it also moves with the host's load), or any
+combination that fails to render, fails the run with exit status 1.
+
+Usage: python benchmarks/bench_variants.py [-k PER_VARIANT | --all] [--repeat N] [--renderer docx|template|pdf]
+                                           [--baseline PATH] [--save-baseline] [--tolerance FRACTION]
+                                           [--throughput-tolerance FRACTION]
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from datetime import date
+from io import BytesIO
+from itertools import combinations
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sow_catalog import get_catalog
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_variants.json')
+VOLUMES = (0, 500, 1000, 5000, 10000)
+CHECKS = (('docs_per_sec', -1, "throughput"), ('peak_rss_mb', 1, "peak RSS"), ('mean_size', 1, "output size"))
+
+def render_docx(data):
+    from sow_document import generate_sow_document
+    buffer = BytesIO()
+    generate_sow_document(data).save(buffer)
+    return buffer.getvalue()
+
+def render_template(data):
+    from sow_template import get_template
+    return get_template().render_bytes(data)
+
+def render_pdf(data):
+    from sow_pdf import render_sow_pdf
+    return render_sow_pdf(data)
+
+RENDERERS = {'docx': render_docx, 'template': render_template, 'pdf': render_pdf}
+
+def subsets(items):
+    return [list(c) for r in range(len(items) + 1) for c in combinations(items, r)]
+
+def variants():
+    """(name, track, processing_type, report_choice) for every report package on every track."""
+    out = [(f"processing/{key}/{choice}", 'processing', key, choice) for key in get_catalog().processing for choice in get_catalog().reports('processing', key)]
+    return out + [(f"report_only/{choice}", 'report_only', None, choice) for choice in get_catalog().report_only]
+
+def dimensions(track, processing_type):
+    """The independent choices left within a variant, in mixed-radix order."""
+    return [
+        get_catalog().processing[processing_type].sample_types if track == 'processing' else (None,),
+        subsets(list(get_catalog().operational)) if track == 'processing' else [[]],
+        subsets(list(get_catalog().bioinformatic)),
+        subsets(list(get_catalog().data_delivery_options))[1:],
+        (False, True),
+    ]
+
+def combination(track, processing_type, report_choice, dims, index):
+    """The `index`-th data dict of a variant; the estimated volume rotates through VOLUMES."""
+    picked, rest = [], index
+    for options in reversed(dims):
+        rest, i = divmod(rest, len(options))
+        picked.append(options[i])
+    portal, delivery, bioinformatic, operational, sample_type = picked
+    report = get_catalog().reports(track, processing_type)[report_choice]
+    return {'partner_name': f"Variant Partner {index}, Inc.", 'effective_date': date(2026, 1, 15), 'track': track, 'processing_type': processing_type, 'sample_type': sample_type, 'report_choice': report_choice, 'report_name': report.name, 'report_price': report.price, 'operational_services': operational, 'bioinformatic_services': bioinformatic, 'data_delivery': delivery, 'portal_access': portal, 'estimated_volume': VOLUMES[index % len(VOLUMES)]}
+
+def run_variant(task):
+    """Render one variant's combinations in this (fresh) process and report its numbers."""
+    (name, track, processing_type, report_choice), per_variant, renderer, seed, repeat = task
+    render = RENDERERS[renderer]
+    dims = dimensions(track, processing_type)
+    total = math.prod(len(d) for d in dims)
+    rules = get_catalog().rules
+    valid = [index for index in range(total) if not rules.errors(combination(track, processing_type, report_choice, dims, index))]
+    indexes = valid if per_variant is None or per_variant >= len(valid) else sorted(random.Random(f"{seed}:{name}").sample(valid, per_variant))
+    render(combination(track, processing_type, report_choice, dims, indexes[0]))
+    passes = []
+    for _ in range(repeat):
+        count = size = 0
+        errors = []
+        start = time.perf_counter()
+        for index in indexes:
+            try:
+                size += len(render(combination(track, processing_type, report_choice, dims, index)))
+                count += 1
+            except Exception as exc:
+                errors.append(f"#{index}: {type(exc).__name__}: {exc}")
+        passes.append(time.perf_counter() - start)
+    elapsed = min(passes)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'variant': name, 'combinations': len(valid), 'blocked': total - len(valid), 'documents': count, 'docs_per_sec': count / elapsed if elapsed else 0.0, 'peak_rss_mb': rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 'mean_size': size / count if count else 0.0, 'errors': errors}
+
+def compare(results, baseline, tolerances, check_size):
+    """Lines describing every metric more than its `tolerances` entry worse than its baseline."""
+    failures = []
+    for row in results:
+        base = baseline.get(row['variant'])
+        if not base:
+            continue
+        for key, sign, label in CHECKS:
+            if key == 'mean_size' and not check_size or not base.get(key):
+                continue
+            change = (row[key] - base[key]) / base[key] * sign
+            if change > tolerances[key]:
+                failures.append(f"{row['variant']}: {label} {base[key]:,.1f} -> {row[key]:,.1f} ({change:.0%} worse)")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-k', type=int, default=40, help="combinations sampled per variant (default: 40)")
+    parser.add_argument('--all', action='store_true', help="enumerate every combination instead of sampling")
+    parser.add_argument('--repeat', type=int, default=3, help="passes per variant; throughput is the fastest (default: 3)")
+    parser.add_argument('--renderer', choices=sorted(RENDERERS), default='docx', help="docx: generate_sow_document + doc.save (default); template; pdf")
+    parser.add_argument('--seed', type=int, default=7, help="sampling seed (default: 7)")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline file (default: benchmarks/baseline_variants.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="record this run as the baseline for its renderer")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="allowed fraction worse than baseline for peak RSS and output size (default: 0.3)")
+    parser.add_argument('--throughput-tolerance', type=float, default=0.5, help="allowed fraction worse than baseline for docs/s (default: 0.5)")
+    args = parser.parse_args(argv)
+    per_variant = None if args.all else args.k
+    settings = {'per_variant': per_variant, 'seed': args.seed}
+    tasks = [(variant, per_variant, args.renderer, args.seed, max(args.repeat, 1)) for variant in variants()]
+    print(f"{len(tasks)} variants, {'all' if args.all else args.k} combinations each, best of {max(args.repeat, 1)}, renderer {args.renderer}")
+    print(f"{'variant':<40}{'docs':>8}{'blocked':>9}{'docs/s':>10}{'RSS MB':>9}{'mean KB':>10}")
+    results = []
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for row in pool.imap(run_variant, tasks):
+            results.append(row)
+            print(f"{row['variant']:<40}{row['documents']:>8,}{row['blocked']:>9,}{row['docs_per_sec']:>10.1f}{row['peak_rss_mb']:>9.1f}{row['mean_size'] / 1024:>10.1f}")
+    documents = sum(r['documents'] for r in results)
+    seconds = sum(r['documents'] / r['docs_per_sec'] for r in results if r['docs_per_sec'])
+    print(f"{'total':<40}{documents:>8,}{sum(r['blocked'] for r in results):>9,}{documents / seconds if seconds else 0:>10.1f}{max(r['peak_rss_mb'] for r in results):>9.1f}")
+    failures = [f"{r['variant']}: {len(r['errors'])} combination(s) failed, first {r['errors'][0]}" for r in results if r['errors']]
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as fh:
+            stored = json.load(fh)
+    if args.save_baseline:
+        stored[args.renderer] = {'settings': settings, 'recorded': time.strftime('%Y-%m-%d'), 'variants': {r['variant']: {k: round(r[k], 2) for k, _, _ in CHECKS} for r in results}}
+        with open(args.baseline, 'w', encoding='utf-8') as fh:
+            json.dump(stored, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+        print(f"baseline for {args.renderer} saved to {args.baseline}")
+    elif args.renderer in stored:
+        base = stored[args.renderer]
+        same = base.get('settings') == settings
+        if not same:
+            print(f"note: baseline was recorded with {base.get('settings')}; output sizes are not compared")
+        failures += compare(results, base['variants'], {'docs_per_sec': args.throughput_tolerance, 'peak_rss_mb': args.tolerance, 'mean_size': args.tolerance}, same)
+        print(f"compared with the {base.get('recorded', '')} baseline, tolerance {args.throughput_tolerance:.0%} throughput, {args.tolerance:.0%} RSS and size")
+    else:
+        print(f"no {args.renderer} baseline in {args.baseline}; run with --save-baseline to record one")
+    if failures:
+        print(f"\nREGRESSION ({len(failures)}):")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
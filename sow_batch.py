@@ -0,0 +1,310 @@
+"""
+TruDiagnostic SOW Generator - Batch generation
+
+Usage: python sow_batch.py manifest.csv -o sows.zip [-j WORKERS] [--format docx,pdf]
+
+The manifest is a CSV or JSONL file of the same `data` dicts the wizard
+builds in step 5. CSV list columns (operational_services,
+bioinformatic_services, data_delivery) are separated by ';', and so are the
+sites of a multi-site SOW, written name=volume ("Boston=1200;Austin=800");
+a row with sites is quoted at their total volume. Each requested format is a
+separate pool task, so a row's .docx and .pdf build in parallel.
+Rows that break a catalog rule at error level fail before they are rendered;
+rule warnings are reported with the row's results. A row that cannot be
+parsed or normalized (a JSONL line that is not a JSON object, a missing
+partner name, an unknown option, a count above MAX_COUNT) fails on its own
+and the batch carries on; columns that are not SOW fields are ignored.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+from sow_catalog import get_catalog, reload_catalog, use_catalog
+from sow_document import sow_filename
+from sow_metrics import export_metrics
+from sow_pdf import render_sow_pdf
+from sow_rules import ERROR
+from sow_store import SowStore
+from sow_template import get_template
+
+FIELDS = ('partner_name', 'effective_date', 'track', 'processing_type', 'sample_type', 'report_choice', 'report_name', 'report_price', 'operational_services', 'bioinformatic_services', 'data_delivery', 'portal_access', 'estimated_volume', 'sites')
+LIST_FIELDS = ('operational_services', 'bioinformatic_services', 'data_delivery')
+MAX_COUNT = 10 ** 9
+TRACKS = ('processing', 'report_only')
+FORMATS = ('docx', 'pdf')
+
+class BatchResult:
+    __slots__ = ('index', 'partner_name', 'kind', 'filename', 'seconds', 'size', 'error', 'warnings')
+
+    def __init__(self, index, partner_name, kind=None, filename=None, seconds=0.0, size=0, error=None, warnings=()):
+        self.index = index
+        self.partner_name = partner_name
+        self.kind = kind
+        self.filename = filename
+        self.seconds = seconds
+        self.size = size
+        self.error = error
+        self.warnings = tuple(warnings)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'x')
+
+def _parse_list(value, name):
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        if not all(isinstance(v, str) for v in value):
+            raise ValueError(f"{name} must be a list of option names, not {value!r}")
+        return value
+    return [v.strip() for v in str(value).split(';') if v.strip()]
+
+def _parse_count(value, name):
+    """A whole number from 0 to MAX_COUNT, from an int or numeric text; None is 0."""
+    if value is None:
+        return 0
+    try:
+        count = -1 if isinstance(value, bool) or isinstance(value, float) and not value.is_integer() else int(value)
+    except (TypeError, ValueError, OverflowError):
+        count = -1
+    if not 0 <= count <= MAX_COUNT:
+        raise ValueError(f"{name} must be a whole number from 0 to {MAX_COUNT:,}, not {value!r}")
+    return count
+
+def _parse_sites(value):
+    """Sites as [{'name', 'volume'}] from a list of dicts or [name, volume] pairs, or "name=volume;..." text."""
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        value = [item.rpartition('=')[::2] for item in value.split(';') if item.strip()]
+    if not isinstance(value, list):
+        raise ValueError("sites must be a list or 'name=volume;...' text")
+    sites = []
+    for item in value:
+        if isinstance(item, dict):
+            name, volume = item.get('name'), item.get('volume')
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            name, volume = item
+        else:
+            name, volume = None, None
+        name = str(name or '').strip()
+        try:
+            volume = int(volume)
+        except (TypeError, ValueError, OverflowError):
+            volume = -1
+        if not name or not 0 <= volume <= MAX_COUNT:
+            raise ValueError(f"bad site {item!r}: needs a name and a volume from 0 to {MAX_COUNT:,}")
+        sites.append({'name': name, 'volume': volume})
+    return sites
+
+def normalize_row(raw):
+    """Coerce a manifest row into the `data` dict generate_sow_document expects; keys that are not FIELDS are dropped."""
+    if not isinstance(raw, dict):
+        raise ValueError(f"a row must be an object of SOW fields, not {type(raw).__name__}")
+    data = {k: (v if v != '' else None) for k, v in raw.items() if k in FIELDS}
+    name = data.get('partner_name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("partner_name is required and must be text")
+    for key in ('track', 'processing_type', 'sample_type', 'report_choice', 'report_name'):
+        if data.get(key) is not None and not isinstance(data[key], str):
+            raise ValueError(f"{key} must be text, not {data[key]!r}")
+    track = data.get('track') or 'processing'
+    if track not in TRACKS:
+        raise ValueError(f"track must be one of {', '.join(TRACKS)}, not {track!r}")
+    data['track'] = track
+    eff = data.get('effective_date')
+    if isinstance(eff, str):
+        data['effective_date'] = date.fromisoformat(eff)
+    elif isinstance(eff, datetime):
+        data['effective_date'] = eff.date()
+    elif not isinstance(eff, date):
+        data['effective_date'] = None
+    for key in LIST_FIELDS:
+        data[key] = _parse_list(data.get(key), key)
+    if not data['data_delivery']:
+        data['data_delivery'] = ["PDF Reports"]
+    data['portal_access'] = _parse_bool(data.get('portal_access') or False)
+    sites = _parse_sites(data.pop('sites', None))
+    if sites:
+        data['sites'] = sites
+    data['estimated_volume'] = _parse_count(sum(site['volume'] for site in sites), "the sites' total volume") if sites else _parse_count(data.get('estimated_volume'), 'estimated_volume')
+    catalog = get_catalog()
+    if track == 'processing':
+        data['processing_type'] = data.get('processing_type') or next(iter(catalog.processing))
+        if data['processing_type'] not in catalog.processing:
+            raise ValueError(f"unknown processing_type {data['processing_type']!r}")
+        sample_types = catalog.processing[data['processing_type']].sample_types
+        data['sample_type'] = data.get('sample_type') or sample_types[0]
+        if data['sample_type'] not in sample_types:
+            raise ValueError(f"sample_type {data['sample_type']!r} is not offered for {data['processing_type']} processing ({', '.join(sample_types)})")
+    else:
+        data['processing_type'] = None
+        data['sample_type'] = None
+        data['operational_services'] = []
+    for key, index in (('operational_services', catalog.operational), ('bioinformatic_services', catalog.bioinformatic)):
+        unknown = [k for k in data[key] if k not in index]
+        if unknown:
+            raise ValueError(f"unknown {key}: {', '.join(unknown)}")
+    unknown = [k for k in data['data_delivery'] if k not in catalog.data_delivery_options]
+    if unknown:
+        raise ValueError(f"unknown data_delivery: {', '.join(unknown)}")
+    report_options = catalog.reports(track, data['processing_type'])
+    choice = data.get('report_choice') or next(iter(report_options))
+    if choice not in report_options:
+        raise ValueError(f"unknown report_choice {choice!r} for track {track!r}")
+    data['report_choice'] = choice
+    data['report_name'] = data.get('report_name') or report_options[choice].name
+    data['report_price'] = _parse_count(data.get('report_price'), 'report_price') or report_options[choice].price
+    return data
+
+def load_manifest(path):
+    """Yield raw rows from a .csv or .jsonl manifest; a JSONL line that is not JSON is yielded as its ValueError."""
+    with open(path, newline='', encoding='utf-8') as fh:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for number, line in enumerate(fh, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as exc:
+                        yield ValueError(f"line {number} is not valid JSON: {exc}")
+        else:
+            yield from csv.DictReader(fh)
+
+def render_one(index, data, kind='docx', digest=None):
+    """Worker entry point: returns (index, document bytes, seconds, error).
+
+    `digest` is the catalog the caller normalized `data` against; a worker
+    still holding an older version reloads the file first.
+    """
+    start = time.perf_counter()
+    try:
+        if digest is not None and digest != get_catalog().digest:
+            reload_catalog()
+        payload = render_sow_pdf(data) if kind == 'pdf' else get_template().render_bytes(data)
+        return index, payload, time.perf_counter() - start, None
+    except Exception as exc:
+        return index, None, time.perf_counter() - start, f"{type(exc).__name__}: {exc}"
+
+def _unique_name(name, taken):
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{stem}_{n}{ext}"
+    taken.add(candidate)
+    return candidate
+
+def run_batch(rows, out_path, workers=None, when=None, on_result=None, formats=('docx',), store=None):
+    """Render every row across a process pool, streaming documents into one ZIP.
+
+    At most ``workers * 2`` rows are in flight, so memory stays bounded
+    regardless of manifest size. Returns the list of BatchResult in manifest
+    order, one per row and format. With a SowStore, every document is also
+    recorded in it.
+    """
+    workers = workers or os.cpu_count() or 1
+    when = when or datetime.now()
+    results, taken, pending = [], set(), {}
+    rows = iter(enumerate(rows))
+
+    def record(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    with zipfile.ZipFile(out_path, 'w', zipfile.ZIP_STORED) as archive, ProcessPoolExecutor(max_workers=workers, initializer=get_template) as pool:
+        def submit_next():
+            for index, raw in rows:
+                try:
+                    if isinstance(raw, Exception):
+                        raise raw
+                    with use_catalog() as catalog:
+                        data, digest = normalize_row(raw), catalog.digest
+                        issues = catalog.rules.check(data)
+                except Exception as exc:
+                    name = raw.get('partner_name') if isinstance(raw, dict) else None
+                    record(BatchResult(index, name if isinstance(name, str) else None, error=f"{type(exc).__name__}: {exc}"))
+                    continue
+                errors = [issue.message for issue in issues if issue.level == ERROR]
+                if errors:
+                    record(BatchResult(index, data['partner_name'], error=f"RuleError: {'; '.join(errors)}"))
+                    continue
+                warnings = [issue.message for issue in issues]
+                for kind in formats:
+                    pending[pool.submit(render_one, index, data, kind, digest)] = (data, kind, warnings)
+                return True
+            return False
+
+        while len(pending) < workers * 2 * len(formats) and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                data, kind, warnings = pending.pop(future)
+                index, payload, seconds, error = future.result()
+                result = BatchResult(index, data['partner_name'], kind, seconds=seconds, error=error, warnings=warnings)
+                if payload is not None:
+                    result.filename = _unique_name(sow_filename(data['partner_name'], when, kind), taken)
+                    result.size = len(payload)
+                    archive.writestr(result.filename, payload)
+                    if store is not None:
+                        store.save(data, payload, kind)
+                record(result)
+                if len(pending) < workers * 2 * len(formats):
+                    submit_next()
+    return sorted(results, key=lambda r: (r.index, FORMATS.index(r.kind) if r.kind else -1))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate SOW documents in bulk from a CSV/JSONL manifest.")
+    parser.add_argument('manifest', help="CSV or JSONL file of SOW data rows")
+    parser.add_argument('-o', '--output', default='sows.zip', help="ZIP file to write (default: sows.zip)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--format', default='docx', help="comma-separated output formats: docx, pdf (default: docx)")
+    parser.add_argument('--store', help="also record every document in this SOW store (SQLite) file")
+    parser.add_argument('--report', help="also write per-document results as JSON to this path")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print the summary and failures")
+    args = parser.parse_args(argv)
+    formats = tuple(f.strip() for f in args.format.split(',') if f.strip())
+    if not formats or any(f not in FORMATS for f in formats):
+        parser.error(f"--format must be a comma-separated subset of {', '.join(FORMATS)}")
+    export_metrics()
+
+    def on_result(r):
+        if not r.ok:
+            print(f"FAIL  #{r.index} {r.partner_name}: {r.error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"ok    #{r.index} {r.filename} {r.seconds * 1000:.1f} ms {r.size:,} bytes")
+            if r.kind == formats[0]:
+                for warning in r.warnings:
+                    print(f"warn  #{r.index} {r.partner_name}: {warning}", file=sys.stderr)
+
+    store = SowStore(args.store) if args.store else None
+    start = time.perf_counter()
+    results = run_batch(load_manifest(args.manifest), args.output, workers=args.workers, on_result=on_result, formats=formats, store=store)
+    wall = time.perf_counter() - start
+    ok = [r for r in results if r.ok]
+    failed = len(results) - len(ok)
+    rate = len(ok) / wall if wall else 0.0
+    mean = sum(r.seconds for r in ok) / len(ok) * 1000 if ok else 0.0
+    print(f"{len(ok)} documents, {failed} failed, {wall:.2f} s wall, {rate:.1f} docs/s, {mean:.1f} ms mean build -> {args.output}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as fh:
+            json.dump([r.as_dict() for r in results], fh, indent=2)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+TruDiagnostic SOW Generator - Content-addressed document cache
+
+Rendered documents are keyed on a canonical hash of the `data` dict plus the
+catalog fingerprint of the records it uses, so the same inputs never pay for
+a second build and a new catalog version only misses where its prices did. Entries
+live in a bounded in-memory LRU with an optional on-disk tier
+(SOW_CACHE_DIR) that survives restarts and is shared across processes. The
+disk tier is capped at SOW_CACHE_DISK_MB (default 1024) and evicts the files
+least recently written or read, by mtime.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+from sow_catalog import get_catalog
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"cannot hash {type(value).__name__} in SOW data")
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=_json_default)
+
+def cache_key(data, kind='docx', version=None):
+    payload = canonical_json({'version': version or get_catalog().fingerprint(data), 'kind': kind, 'data': data})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class DocumentCache:
+    """Thread-safe LRU of rendered document bytes with an optional disk tier."""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, directory=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _disk_files(self):
+        """(mtime, path, size) of every disk entry, whichever process wrote it."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        return files
+
+    def _trim_disk(self):
+        """Delete the oldest files until the disk tier is under 90% of its cap, so the next trim is some writes away."""
+        files = sorted(self._disk_files())
+        total = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+    def _remember(self, key, payload):
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key))
+        self._entries[key] = payload
+        self._bytes += len(payload)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+        if self.directory:
+            try:
+                with open(self._path(key), 'rb') as fh:
+                    payload = fh.read()
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, payload)
+                return payload
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, payload):
+        with self._lock:
+            self._remember(key, payload)
+        if self.directory:
+            tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as fh:
+                fh.write(payload)
+            os.replace(tmp, self._path(key))
+            with self._lock:
+                self._disk_bytes += len(payload)
+                trim = self._disk_bytes > self.max_disk_bytes
+            if trim:
+                total = self._trim_disk()
+                with self._lock:
+                    self._disk_bytes = total
+
+    def get_or_render(self, data, render, kind='docx'):
+        key = cache_key(data, kind)
+        payload = self.get(key)
+        if payload is None:
+            payload = render(data)
+            self.put(key, payload)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0, 'catalog_version': get_catalog().version, 'directory': self.directory, 'disk_bytes': self._disk_bytes, 'max_disk_bytes': self.max_disk_bytes}
+
+@lru_cache(maxsize=None)
+def get_cache():
+    return DocumentCache(max_entries=int(os.environ.get('SOW_CACHE_ENTRIES', 256)), directory=os.environ.get('SOW_CACHE_DIR') or None, max_disk_bytes=int(os.environ.get('SOW_CACHE_DISK_MB', 1024)) * 1024 * 1024)
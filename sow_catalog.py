@@ -0,0 +1,341 @@
+"""
+TruDiagnostic SOW Generator - Pricing catalog
+
+Usage: python sow_catalog.py [catalog.json]    (validate a catalog file)
+
+Services and prices live in an external, versioned JSON file (SOW_CATALOG,
+default catalog.json next to this module). A file is validated and compiled
+once into a Catalog: immutable, indexed records with their price strings and
+unit labels already formatted, so rendering paths never re-walk the raw
+config or re-check whether a price is a number, None or "Custom".
+
+get_catalog() returns the current Catalog. reload_catalog() compiles the file
+again and swaps the new version in with a single reference assignment;
+get_watcher() polls the file and does so whenever it changes, so prices can
+change without a restart. Invalid files are reported and the running version
+is kept. A changed file must also change its "version", because every SOW
+records the version it was priced against.
+
+The file also carries the business rules (sow_rules) that a SOW is checked
+against before it is built; they are compiled into the Catalog's `rules`.
+
+A render pins one catalog for its thread (use_catalog), so a swap mid-render
+cannot mix two versions in one document. Caches key on fingerprint(data), the
+digests of just the records a SOW is built from, so a new version only
+invalidates cached documents and sections whose services actually changed.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+from sow_rules import RuleSet, rule_problems
+
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')
+_KEY = re.compile(r'[A-Za-z0-9_.-]+')
+
+class CatalogError(ValueError):
+    pass
+
+def catalog_path():
+    return os.environ.get('SOW_CATALOG') or CATALOG_FILE
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()[:12]
+
+class _Record:
+    __slots__ = ()
+
+    def _init(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.key!r})"
+
+class Service(_Record):
+    """An orderable line: an operational service, a bioinformatic add-on or a report package."""
+    __slots__ = ('key', 'category', 'name', 'price', 'custom', 'unit', 'included', 'price_text', 'unit_label', 'detail_text', 'fee_text', 'option_label', 'digest')
+
+    def __init__(self, key, category, name, price=None, unit=None, included=False, digest=None):
+        priced = isinstance(price, int)
+        if priced:
+            price_text = fee_text = f"${price:,}"
+        elif price is None:
+            price_text = fee_text = "Included"
+        else:
+            price_text, fee_text = str(price), "[To be determined]"
+        if category == 'report':
+            unit, unit_label, detail_text = 'sample', "Per Sample", f"{price_text}/sample"
+            option_label = f"{name} - **{detail_text}**"
+        else:
+            if category == 'bioinformatic':
+                unit_label, detail_text = "Flat Fee", price_text
+            else:
+                unit_label = f"Per {unit.title()}" if unit else None
+                detail_text = f"{price_text}/{unit}" if priced else "Included"
+            option_label = f"{name} ({detail_text})"
+        self._init(key=key, category=category, name=name, price=price if priced else None, custom=not priced and price is not None, unit=unit, included=included, price_text=price_text, unit_label=unit_label, detail_text=detail_text, fee_text=fee_text, option_label=option_label, digest=digest)
+
+    @property
+    def billable(self):
+        return self.price is not None
+
+class ProcessingType(_Record):
+    __slots__ = ('key', 'name', 'array_type', 'sample_types', 'reports', 'digest')
+
+    def __init__(self, key, name, array_type, sample_types, reports, digest=None):
+        self._init(key=key, name=name, array_type=array_type, sample_types=tuple(sample_types), reports=MappingProxyType(reports), digest=digest)
+
+class VolumeTier(_Record):
+    """Percent off per-sample report fees once the estimated volume reaches `min_volume`."""
+    __slots__ = ('key', 'min_volume', 'discount_pct', 'label')
+
+    def __init__(self, min_volume, discount_pct):
+        label = f"{min_volume:,}+ samples: {discount_pct}% off" if discount_pct else f"{min_volume:,}+ samples: list price"
+        self._init(key=min_volume, min_volume=min_volume, discount_pct=discount_pct, label=label)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate(config):
+    """Raise CatalogError listing every problem in a raw catalog config."""
+    problems = []
+
+    def check(ok, where, message):
+        if not ok:
+            problems.append(f"{where}: {message}")
+        return ok
+
+    def mapping(where, value):
+        if check(isinstance(value, dict) and value, where, "must be a non-empty object"):
+            for key in value:
+                check(_KEY.fullmatch(key), f"{where}.{key}", "keys may only use letters, digits, '_', '.' and '-'")
+            return value.items()
+        return ()
+
+    def name(where, entry):
+        return check(isinstance(entry, dict), where, "must be an object") and check(isinstance(entry.get('name'), str) and entry['name'].strip(), where, "needs a name")
+
+    if not check(isinstance(config, dict), "catalog", "must be a JSON object"):
+        raise CatalogError("; ".join(problems))
+    check(isinstance(config.get('version'), str) and config['version'].strip(), "version", "must be a non-empty string")
+    check(isinstance(config.get('company_info'), dict) and isinstance(config['company_info'].get('name'), str), "company_info", "needs a name")
+    for key, proc in mapping("processing_types", config.get('processing_types')):
+        where = f"processing_types.{key}"
+        if name(where, proc):
+            check(isinstance(proc.get('array_type'), str), where, "needs an array_type")
+            check(isinstance(proc.get('sample_types'), list) and proc['sample_types'] and all(isinstance(s, str) for s in proc['sample_types']), where, "sample_types must be a non-empty list of strings")
+            for choice, report in mapping(f"{where}.report_options", proc.get('report_options')):
+                if name(f"{where}.report_options.{choice}", report):
+                    check(_is_int(report.get('price')) and report['price'] >= 0, f"{where}.report_options.{choice}", "price must be a whole number of dollars")
+    for choice, report in mapping("report_only_options", config.get('report_only_options')):
+        if name(f"report_only_options.{choice}", report):
+            check(_is_int(report.get('price')) and report['price'] >= 0, f"report_only_options.{choice}", "price must be a whole number of dollars")
+    for category in ('operational_services', 'bioinformatic_services'):
+        for key, svc in mapping(category, config.get(category)):
+            where = f"{category}.{key}"
+            if name(where, svc):
+                price = svc.get('price')
+                if category == 'operational_services':
+                    check(price is None or (_is_int(price) and price >= 0), where, 'price must be dollars or null (included); "Custom" is only for bioinformatic services')
+                    if _is_int(price):
+                        check(isinstance(svc.get('unit'), str) and svc['unit'], where, "a priced operational service needs a unit")
+                else:
+                    check(price is None or price == "Custom" or (_is_int(price) and price >= 0), where, 'price must be dollars, null (included) or "Custom"')
+    delivery = config.get('data_delivery_options')
+    check(isinstance(delivery, list) and delivery and all(isinstance(d, str) for d in delivery), "data_delivery_options", "must be a non-empty list of strings")
+    tiers = config.get('volume_tiers', [])
+    if check(isinstance(tiers, list), "volume_tiers", "must be a list"):
+        for i, tier in enumerate(tiers):
+            check(isinstance(tier, dict) and _is_int(tier.get('min_volume')) and tier['min_volume'] >= 0 and _is_int(tier.get('discount_pct')) and 0 <= tier['discount_pct'] <= 100, f"volume_tiers[{i}]", "needs min_volume >= 0 and discount_pct 0-100")
+        mins = [t.get('min_volume') for t in tiers if isinstance(t, dict)]
+        check(len(mins) == len(set(mins)), "volume_tiers", "min_volume values must be unique")
+    if isinstance(config.get('operational_services'), dict) and isinstance(config.get('bioinformatic_services'), dict):
+        problems += rule_problems(config.get('rules', []), {**config['operational_services'], **config['bioinformatic_services']})
+    if problems:
+        raise CatalogError("; ".join(problems))
+
+class Catalog(_Record):
+    """Index over a validated catalog config. Mappings are read-only and keep the file's ordering."""
+    __slots__ = ('version', 'digest', 'config', 'terms', 'company_name', 'processing', 'report_only', 'operational', 'bioinformatic', 'data_delivery_options', 'volume_tiers', 'rules')
+
+    def __init__(self, config):
+        validate(config)
+        processing = {}
+        for key, proc in config['processing_types'].items():
+            reports = {k: Service(k, 'report', r['name'], r['price'], digest=_digest(r)) for k, r in proc['report_options'].items()}
+            processing[key] = ProcessingType(key, proc['name'], proc['array_type'], proc['sample_types'], reports, digest=_digest(proc))
+        self._init(
+            version=config['version'],
+            digest=_digest({k: v for k, v in config.items() if k != 'version'}),
+            config=MappingProxyType(config),
+            terms=_digest([config['company_info'], config['data_delivery_options'], config.get('volume_tiers', [])]),
+            company_name=config['company_info']['name'],
+            processing=MappingProxyType(processing),
+            report_only=MappingProxyType({k: Service(k, 'report', r['name'], r['price'], digest=_digest(r)) for k, r in config['report_only_options'].items()}),
+            operational=MappingProxyType({k: Service(k, 'operational', s['name'], s.get('price'), s.get('unit'), s.get('included', False), digest=_digest(s)) for k, s in config['operational_services'].items()}),
+            bioinformatic=MappingProxyType({k: Service(k, 'bioinformatic', s['name'], s.get('price'), digest=_digest(s)) for k, s in config['bioinformatic_services'].items()}),
+            data_delivery_options=tuple(config['data_delivery_options']),
+            volume_tiers=tuple(sorted((VolumeTier(t['min_volume'], t['discount_pct']) for t in config.get('volume_tiers', ())), key=lambda t: t.min_volume)),
+        )
+        object.__setattr__(self, 'rules', RuleSet(config.get('rules', ()), {**self.operational, **self.bioinformatic}))
+
+    def __repr__(self):
+        return f"Catalog({self.version!r}, {len(self.processing)} processing types, {len(self.operational) + len(self.bioinformatic)} services)"
+
+    def reports(self, track, processing_type=None):
+        """Report packages offered for a track (and processing type on the processing track)."""
+        if track == 'processing':
+            return self.processing[processing_type].reports
+        return self.report_only
+
+    def fingerprint(self, data):
+        """Digests of the records a SOW for `data` is built from; equal data and fingerprints render identically."""
+        bio = tuple(self.bioinformatic[k].digest if k in self.bioinformatic else None for k in data.get('bioinformatic_services') or ())
+        if data.get('track') == 'processing':
+            proc = self.processing.get(data.get('processing_type'))
+            ops = tuple(self.operational[k].digest if k in self.operational else None for k in data.get('operational_services') or ())
+            return (self.terms, proc.digest if proc else None, ops, bio)
+        report = self.report_only.get(data.get('report_choice'))
+        return (self.terms, report.digest if report else None, (), bio)
+
+def load_catalog(path=None):
+    """Read, validate and compile a catalog file; raises CatalogError."""
+    path = path or catalog_path()
+    try:
+        with open(path, encoding='utf-8') as fh:
+            config = json.load(fh)
+    except (OSError, ValueError) as exc:
+        raise CatalogError(f"{path}: {exc}") from None
+    try:
+        return Catalog(config)
+    except CatalogError as exc:
+        raise CatalogError(f"{path}: {exc}") from None
+
+_lock = threading.Lock()
+_local = threading.local()
+_current = None
+
+def get_catalog():
+    """The catalog pinned on this thread by use_catalog(), else the current version (loaded on first use)."""
+    global _current
+    catalog = getattr(_local, 'catalog', None) or _current
+    if catalog is None:
+        with _lock:
+            if _current is None:
+                _current = load_catalog()
+            catalog = _current
+    return catalog
+
+def set_catalog(catalog):
+    """Swap in `catalog` for every thread not inside use_catalog(); returns the previous version."""
+    global _current
+    with _lock:
+        previous, _current = _current, catalog
+    return previous
+
+@contextmanager
+def use_catalog(catalog=None):
+    """Pin `catalog` (default: the one in effect) on this thread, so one render reads one version throughout."""
+    previous = getattr(_local, 'catalog', None)
+    _local.catalog = catalog or previous or get_catalog()
+    try:
+        yield _local.catalog
+    finally:
+        _local.catalog = previous
+
+def reload_catalog(path=None):
+    """Compile the catalog file and swap it in if its content changed; returns (catalog, swapped)."""
+    catalog, current = load_catalog(path), get_catalog()
+    if catalog.digest == current.digest:
+        return current, False
+    if catalog.version == current.version:
+        raise CatalogError(f"{path or catalog_path()}: content changed but version is still {catalog.version!r}")
+    set_catalog(catalog)
+    return catalog, True
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+class CatalogWatcher:
+    """Polls the catalog file every `interval` seconds and swaps in each new valid version."""
+
+    def __init__(self, path=None, interval=2.0):
+        self.path = path or catalog_path()
+        self.interval = interval
+        self.swaps = 0
+        self.error = None
+        self.checked = None
+        self._stamp = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="sow-catalog-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling and wait for the watch thread to exit."""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def check(self):
+        """Reload if the file changed since the last check; returns True when a new version was swapped in."""
+        stamp = _stamp(self.path)
+        self.checked = time.time()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            catalog, swapped = reload_catalog(self.path)
+        except CatalogError as exc:
+            self.error = str(exc)
+            print(f"catalog not reloaded: {exc}", file=sys.stderr)
+            return False
+        self.error = None
+        if swapped:
+            self.swaps += 1
+            print(f"catalog {catalog.version} loaded from {self.path}", file=sys.stderr)
+        return swapped
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self.check()
+            self._stopped.wait(self.interval)
+
+@lru_cache(maxsize=None)
+def get_watcher():
+    """The process-wide catalog watcher (SOW_CATALOG_INTERVAL seconds, default 2; 0 disables it)."""
+    interval = float(os.environ.get('SOW_CATALOG_INTERVAL', 2.0))
+    return CatalogWatcher(interval=interval) if interval > 0 else None
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Validate a pricing catalog file.")
+    parser.add_argument('path', nargs='?', default=catalog_path(), help="catalog JSON file (default: SOW_CATALOG or catalog.json)")
+    path = parser.parse_args(argv).path
+    try:
+        catalog = load_catalog(path)
+    except CatalogError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    reports = sum(len(p.reports) for p in catalog.processing.values()) + len(catalog.report_only)
+    print(f"{path}: version {catalog.version} ({catalog.digest}), {len(catalog.processing)} processing types, {reports} report packages, {len(catalog.operational) + len(catalog.bioinformatic)} services, {len(catalog.volume_tiers)} volume tiers, {len(catalog.rules)} rules")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+TruDiagnostic SOW Generator - SOW comparison
+
+Usage: python sow_diff.py OLD NEW [-o redline.docx] [--store sows.db]
+       python sow_diff.py --audit [--store sows.db]
+
+OLD and NEW are stored SOW ids or JSON files of wizard `data`. SOWs are
+compared through their data and the section blocks they render to, never the
+.docx XML: changed fields, services added or removed, Exhibit B fee rows whose
+price changed, and per-section line changes. Sections whose declared inputs
+(Section.deps) are equal are skipped without being built.
+
+redline_bytes() writes the new SOW with the differences as Word tracked
+changes. audit_prices() flags every stored SOW whose fee rows differ from the
+current catalog in a single pass over the store, without rendering.
+"""
+
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from sow_catalog import get_catalog, use_catalog
+from sow_document import SECTIONS, PageBreak, Paragraph, Table, fee_rows
+from sow_template import BODY_WIDTH, blocks_xml, get_template, paragraph_props, row_xml, run_xml, table_head_xml, table_row_xml
+
+AUTHOR = "SOW Generator"
+FIELDS = (('partner_name', "Partner"), ('effective_date', "Effective date"), ('track', "Track"), ('processing_type', "Processing"), ('sample_type', "Sample type"), ('report_name', "Report package"), ('report_price', "Report price"), ('estimated_volume', "Estimated volume"), ('portal_access', "Portal access"), ('data_delivery', "Data delivery"))
+
+class Change:
+    __slots__ = ('kind', 'section', 'label', 'old', 'new')
+
+    def __init__(self, kind, section, label, old=None, new=None):
+        self.kind = kind
+        self.section = section
+        self.label = label
+        self.old = old
+        self.new = new
+
+    def __str__(self):
+        if self.kind == 'added':
+            return f"+ {self.label}" + (f": {self.new}" if self.new is not None else "")
+        if self.kind == 'removed':
+            return f"- {self.label}" + (f": {self.old}" if self.old is not None else "")
+        return f"~ {self.label}: {self.old} -> {self.new}"
+
+    def as_dict(self):
+        return {k: _plain(getattr(self, k)) for k in self.__slots__}
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def _services(data):
+    catalog, names = get_catalog(), {}
+    for key in data.get('operational_services') or ():
+        names[key] = catalog.operational[key].name if key in catalog.operational else key
+    for key in data.get('bioinformatic_services') or ():
+        names[key] = catalog.bioinformatic[key].name if key in catalog.bioinformatic else key
+    return names
+
+def diff_data(old, new):
+    """Field changes plus services added and removed."""
+    changes = [Change('field', None, label, old.get(key), new.get(key)) for key, label in FIELDS if old.get(key) != new.get(key)]
+    before, after = _services(old), _services(new)
+    changes += [Change('added', 'services', after[k]) for k in after if k not in before]
+    changes += [Change('removed', 'services', before[k]) for k in before if k not in after]
+    return changes
+
+def diff_fees(old_rows, new_rows):
+    """Exhibit B rows, matched by service name: price or unit changes, rows added and rows removed."""
+    before = {row[0]: row for row in old_rows}
+    after = {row[0]: row for row in new_rows}
+    changes = []
+    for name, row in after.items():
+        if name not in before:
+            changes.append(Change('added', 'exhibit_b', name, None, f"{row[2]} ({row[1]})"))
+        elif before[name][1:] != row[1:]:
+            changes.append(Change('price', 'exhibit_b', name, f"{before[name][2]} ({before[name][1]})", f"{row[2]} ({row[1]})"))
+    changes += [Change('removed', 'exhibit_b', name, f"{row[2]} ({row[1]})") for name, row in before.items() if name not in after]
+    return changes
+
+def _text(block):
+    return ''.join(r.text for r in block.runs)
+
+def _lines(blocks):
+    lines = []
+    for block in blocks:
+        if isinstance(block, Table):
+            lines.extend(' | '.join(row) for row in block.rows)
+        elif isinstance(block, Paragraph) and _text(block).strip():
+            lines.append(_text(block))
+    return lines
+
+def changed_sections(old, new):
+    """Sections whose declared inputs differ; only these can render differently."""
+    return [s for s in SECTIONS if not s.static and s.key(old) != s.key(new)]
+
+def diff_sections(old, new):
+    """{section name: [(tag, old lines, new lines)]} for sections whose text changed."""
+    out = {}
+    for section in changed_sections(old, new):
+        a, b = _lines(section.build(old)), _lines(section.build(new))
+        ops = [(tag, a[i1:i2], b[j1:j2]) for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes() if tag != 'equal']
+        if ops:
+            out[section.name] = ops
+    return out
+
+class SowDiff:
+    __slots__ = ('fields', 'fees', 'sections')
+
+    def __init__(self, fields, fees, sections):
+        self.fields = fields
+        self.fees = fees
+        self.sections = sections
+
+    @property
+    def changed(self):
+        return bool(self.fields or self.fees or self.sections)
+
+    def summary(self):
+        """Human-readable lines: data changes, fee changes, then section line changes."""
+        out = [str(c) for c in self.fields + self.fees]
+        for name, ops in self.sections.items():
+            out.append(f"[{name}]")
+            for tag, a, b in ops:
+                out += [f"  - {line}" for line in a] + [f"  + {line}" for line in b]
+        return out
+
+    def as_dict(self):
+        return {'fields': [c.as_dict() for c in self.fields], 'fees': [c.as_dict() for c in self.fees], 'sections': {name: [{'op': tag, 'old': a, 'new': b} for tag, a, b in ops] for name, ops in self.sections.items()}}
+
+def diff_sows(old, new, old_fees=None):
+    """Compare two SOW data dicts. `old_fees` overrides the old fee rows (e.g. a stored price snapshot)."""
+    return SowDiff(diff_data(old, new), diff_fees(old_fees if old_fees is not None else fee_rows(old), fee_rows(new)), diff_sections(old, new))
+
+def _signature(block):
+    if isinstance(block, Table):
+        return ('t', block.style, tuple(map(tuple, block.rows)))
+    if isinstance(block, Paragraph):
+        return ('p', block.style, block.center, block.indent, tuple((r.text, r.bold, r.size) for r in block.runs))
+    return ('br',)
+
+def _tokens(block):
+    return [(token, r.bold, r.size) for r in block.runs for token in re.findall(r'\s+|\S+', r.text)]
+
+class _Redline:
+    """Renders block-level differences as WordprocessingML tracked changes."""
+
+    def __init__(self, when=None):
+        self.next_id = 0
+        self.date = (when or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _attrs(self):
+        self.next_id += 1
+        return f'w:id="{self.next_id}" w:author="{AUTHOR}" w:date="{self.date}"'
+
+    def mark(self, kind):
+        return f'<w:{kind} {self._attrs()}/>'
+
+    def runs(self, tokens, kind=None):
+        """Group (text, bold, size) tokens into runs; kind 'ins' or 'del' wraps them as a tracked change."""
+        groups = []
+        for text, bold, size in tokens:
+            if groups and groups[-1][1:] == (bold, size):
+                groups[-1][0] += text
+            else:
+                groups.append([text, bold, size])
+        xml = ''.join(run_xml(text, bold, size, 'w:delText' if kind == 'del' else 'w:t') for text, bold, size in groups)
+        return f'<w:{kind} {self._attrs()}>{xml}</w:{kind}>' if kind and xml else xml
+
+    def paragraph(self, block, kind):
+        props = paragraph_props(block) + f'<w:rPr>{self.mark(kind)}</w:rPr>'
+        return f'<w:p><w:pPr>{props}</w:pPr>{self.runs(_tokens(block), kind)}</w:p>'
+
+    def paragraph_diff(self, old, new):
+        a, b = _tokens(old), _tokens(new)
+        body = []
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, [t[0] for t in a], [t[0] for t in b], autojunk=False).get_opcodes():
+            if tag == 'equal':
+                body.append(self.runs(b[j1:j2]))
+            else:
+                body.append(self.runs(a[i1:i2], 'del') + self.runs(b[j1:j2], 'ins'))
+        props = paragraph_props(new)
+        return '<w:p>' + (f'<w:pPr>{props}</w:pPr>' if props else '') + ''.join(body) + '</w:p>'
+
+    def _row(self, values, width, kind, bold):
+        return row_xml([self.runs([(v, bold, None)], kind) for v in values], width, self.mark(kind))
+
+    def table(self, block, kind):
+        width = BODY_WIDTH // block.columns
+        rows = block.rows
+        return table_head_xml(block) + ''.join(self._row(values, width, kind, block.bold(i, len(rows))) for i, values in enumerate(rows)) + '</w:tbl>'
+
+    def table_diff(self, old, new):
+        if old.columns != new.columns:
+            return self.table(old, 'del') + self.table(new, 'ins')
+        # A StreamTable builds its rows on every access; take them once.
+        old_rows, new_rows = old.rows, new.rows
+        width = BODY_WIDTH // new.columns
+        out = [table_head_xml(new)]
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, list(map(tuple, old_rows)), list(map(tuple, new_rows)), autojunk=False).get_opcodes():
+            if tag == 'equal':
+                out += [table_row_xml(new_rows[j], width, new.bold(j, len(new_rows))) for j in range(j1, j2)]
+                continue
+            pairs = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+            for k in range(pairs):
+                bold = new.bold(j1 + k, len(new_rows))
+                cells = [run_xml(b, bold) if a == b else self.runs([(a, bold, None)], 'del') + self.runs([(b, bold, None)], 'ins') for a, b in zip(old_rows[i1 + k], new_rows[j1 + k])]
+                out.append(row_xml(cells, width))
+            out += [self._row(old_rows[i], width, 'del', old.bold(i, len(old_rows))) for i in range(i1 + pairs, i2)]
+            out += [self._row(new_rows[j], width, 'ins', new.bold(j, len(new_rows))) for j in range(j1 + pairs, j2)]
+        return ''.join(out) + '</w:tbl>'
+
+    def block(self, block, kind):
+        if isinstance(block, PageBreak):
+            return '' if kind == 'del' else '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+        if isinstance(block, Table):
+            return self.table(block, kind)
+        return self.paragraph(block, kind)
+
+    def blocks(self, old, new):
+        out = []
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, [_signature(b) for b in old], [_signature(b) for b in new], autojunk=False).get_opcodes():
+            if tag == 'equal':
+                out.append(blocks_xml(new[j1:j2]))
+                continue
+            a, b = old[i1:i2], new[j1:j2]
+            while a and b and type(a[0]) is type(b[0]) and not isinstance(a[0], PageBreak):
+                if isinstance(a[0], Table):
+                    out.append(self.table_diff(a.pop(0), b.pop(0)))
+                elif SequenceMatcher(None, _text(a[0]), _text(b[0])).quick_ratio() >= 0.5:
+                    out.append(self.paragraph_diff(a.pop(0), b.pop(0)))
+                else:
+                    break
+            out += [self.block(x, 'del') for x in a] + [self.block(x, 'ins') for x in b]
+        return ''.join(out)
+
+def redline_bytes(old, new, template=None, when=None):
+    """The new SOW as a .docx in which every difference from `old` is a tracked insertion or deletion."""
+    template = template or get_template()
+    redline = _Redline(when)
+    with use_catalog():
+        dirty = {s.name for s in changed_sections(old, new)}
+        chunks = [template.head] + [redline.blocks(s.build(old), s.build(new)) if s.name in dirty else template.section_xml(s, new) for s in SECTIONS] + [template.tail]
+    return b''.join(template.iter_package(iter(chunks)))
+
+def current_fee_rows(data):
+    """fee_rows(data) with the report priced from the current catalog."""
+    report = get_catalog().reports(data['track'], data.get('processing_type')).get(data.get('report_choice'))
+    if report is None:
+        raise KeyError(data.get('report_choice'))
+    return fee_rows({**data, 'report_name': report.name, 'report_price': report.price})
+
+def audit_prices(store):
+    """Yield (StoredSow, changes) for every stored SOW whose fee rows differ from the current catalog."""
+    for sow, data, prices in store.records():
+        try:
+            current = current_fee_rows(data)
+        except KeyError as exc:
+            yield sow, [Change('removed', 'exhibit_b', f"{exc.args[0]} (no longer in the catalog)")]
+            continue
+        changes = diff_fees(prices if prices is not None else fee_rows(data), current)
+        if changes:
+            yield sow, changes
+
+def _load(ref, store):
+    if ref.isdigit():
+        data = store.data(int(ref))
+        if data is None:
+            raise SystemExit(f"no stored SOW with id {ref}")
+        return data
+    from sow_batch import normalize_row
+    with open(ref, encoding='utf-8') as fh:
+        return normalize_row(json.load(fh))
+
+def main(argv=None):
+    from sow_store import SowStore
+    parser = argparse.ArgumentParser(description="Compare SOWs, write a redline, or audit stored SOWs against the current catalog.")
+    parser.add_argument('old', nargs='?', help="stored SOW id or JSON data file")
+    parser.add_argument('new', nargs='?', help="stored SOW id or JSON data file")
+    parser.add_argument('-o', '--output', help="write a redlined .docx here")
+    parser.add_argument('--store', default='sows.db', help="SOW store (default: sows.db)")
+    parser.add_argument('--audit', action='store_true', help="list stored SOWs whose prices differ from the current catalog")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of text")
+    args = parser.parse_args(argv)
+    store = SowStore(args.store)
+    if args.audit:
+        flagged = list(audit_prices(store))
+        if args.json:
+            print(json.dumps([{'id': sow.id, 'partner_name': sow.partner_name, 'changes': [c.as_dict() for c in changes]} for sow, changes in flagged], indent=2))
+        else:
+            for sow, changes in flagged:
+                print(f"#{sow.id} {sow.partner_name} ({sow.catalog_version})")
+                for change in changes:
+                    print(f"    {change}")
+            print(f"{len(flagged)} of {store.stats()['sows']} stored SOWs differ from the current catalog")
+        return 1 if flagged else 0
+    if not (args.old and args.new):
+        parser.error("give OLD and NEW, or --audit")
+    old, new = _load(args.old, store), _load(args.new, store)
+    result = diff_sows(old, new)
+    print(json.dumps(result.as_dict(), indent=2) if args.json else '\n'.join(result.summary()) or "No differences.")
+    if args.output:
+        with open(args.output, 'wb') as fh:
+            fh.write(redline_bytes(old, new))
+    return 1 if result.changed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""
+TruDiagnostic SOW Generator - Document builder
+"""
+
+import hashlib
+import re
+import unicodedata
+from sow_catalog import get_catalog, use_catalog
+from sow_metrics import get_metrics, variant_labels
+
+class Run:
+    __slots__ = ('text', 'bold', 'size')
+
+    def __init__(self, text, bold=False, size=None):
+        self.text = text
+        self.bold = bold
+        self.size = size
+
+class Paragraph:
+    __slots__ = ('runs', 'style', 'center', 'indent')
+
+    def __init__(self, *runs, style=None, center=False, indent=None):
+        self.runs = tuple(r if isinstance(r, Run) else Run(r) for r in runs)
+        self.style = style
+        self.center = center
+        self.indent = indent
+
+class Table:
+    __slots__ = ('rows', 'style', 'bold_header', 'bold_footer')
+
+    def __init__(self, rows, style=None, bold_header=True, bold_footer=0):
+        self.rows = rows
+        self.style = style
+        self.bold_header = bold_header
+        self.bold_footer = bold_footer
+
+    @property
+    def columns(self):
+        return len(self.rows[0])
+
+    def bold(self, index, count):
+        """Whether row `index` of `count` is a bold header or footer row."""
+        return self.bold_header and index == 0 or index >= count - self.bold_footer
+
+class StreamTable(Table):
+    """A Table whose body rows come from `body()`, a zero-argument callable returning a fresh iterator.
+
+    The template and python-docx writers stream the body in chunks, so a table
+    of thousands of site rows is never held as one list; `rows` materializes
+    header + body + footer (bold) for renderers that lay out the whole table.
+    """
+    __slots__ = ('header', 'body', 'footer')
+
+    def __init__(self, header, body, footer=(), style=None):
+        self.header = header
+        self.body = body
+        self.footer = list(footer)
+        self.style = style
+        self.bold_header = True
+        self.bold_footer = len(self.footer)
+
+    @property
+    def rows(self):
+        return [self.header, *self.body(), *self.footer]
+
+    @property
+    def columns(self):
+        return len(self.header)
+
+class PageBreak:
+    __slots__ = ()
+
+class Section:
+    """A named slice of the SOW. `deps` lists the data keys its blocks are built from; `catalog` marks sections that also read catalog records.
+
+    `streams` names data keys that, when set, make the section emit a StreamTable;
+    renderers then stream it instead of caching it.
+    """
+    __slots__ = ('name', 'deps', 'build', 'catalog', 'streams')
+
+    def __init__(self, name, deps, build, catalog=False, streams=()):
+        self.name = name
+        self.deps = deps
+        self.build = build
+        self.catalog = catalog
+        self.streams = streams
+
+    def streamed(self, data):
+        return any(data.get(k) for k in self.streams)
+
+    @property
+    def static(self):
+        return not self.deps
+
+    def key(self, data):
+        """Hashable snapshot of the data (and catalog records) this section depends on."""
+        values = tuple(_frozen(data.get(k)) for k in self.deps)
+        return values + (get_catalog().fingerprint(data),) if self.catalog else values
+
+def _frozen(value):
+    if isinstance(value, list):
+        return tuple(_frozen(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, _frozen(v)) for k, v in value.items())
+    return value
+
+def _heading(text):
+    return Paragraph(Run(text, bold=True, size=14), center=True)
+
+def _bullets(items, indent=None):
+    return [Paragraph(item, style='List Bullet', indent=indent) for item in items]
+
+def _title_blocks(data):
+    return [_heading("STATEMENT OF WORK"), Paragraph()]
+
+def _intro_blocks(data):
+    effective_date = data['effective_date'].strftime('%B %d, %Y') if data['effective_date'] else "[Effective Date]"
+    return [Paragraph(f'This Statement of Work (this "SOW") is entered into as of {effective_date} ', f'(the "Effective Date") by and between Tru Diagnostic, Inc ("Company") and ', f'{data["partner_name"]} ("Partner"). This SOW is issued under and made part of the ', 'Master Services Agreement (the "Agreement") between the Parties.')]
+
+def _purpose_blocks(data):
+    return [
+        Paragraph("The specific Services to be provided, together with applicable fees, timelines, and other deal-specific details, are identified in Exhibit A (Services Engaged). Company shall have no obligation to perform any Service not expressly designated in Exhibit A."),
+        Paragraph(Run("1. Purpose. ", bold=True), "The purpose of this SOW is to define the scope of services that Company may provide to Partner, establish responsibilities of each Party, and set forth the commercial and operational framework under which the services will be delivered."),
+        Paragraph(Run("2. Term. ", bold=True), "This SOW will commence on the Effective Date and remain in effect until terminated in accordance with the MSA or this SOW."),
+        Paragraph(Run("3. Services Offered. ", bold=True), 'Company offers the following categories of services. "Services" means the specific services selected by Partner and set forth in Exhibit A (Services Engaged).'),
+    ]
+
+def _services_blocks(data):
+    blocks = []
+    section_num = 1
+    if data['track'] == 'processing' and data['operational_services']:
+        blocks.append(Paragraph(Run(f"3.{section_num} Operational Services. ", bold=True), "If identified in Exhibit A, the Company shall provide operational services as described in Appendix 1."))
+        section_num += 1
+    if data['track'] == 'processing':
+        blocks.append(Paragraph(Run(f"3.{section_num} Laboratory Processing Services. ", bold=True), "If identified in Exhibit A, the Company shall provide the following services:"))
+        lab_services = ["Sample Receipt & Accessioning – Intake, verification, and LIMS entry of biological samples.", "Quality Control (QC) – Comprehensive assessment of DNA quality, quantity, and integrity prior to analysis.", "DNA Extraction & Quantification – Extraction from approved sample types with concentration/purity normalization."]
+        if data['processing_type'] == 'epigenetic':
+            lab_services.append("Epigenetic Processing – DNA methylation analysis using Array Manufacturer or Company-developed arrays.")
+        else:
+            lab_services.append("Genetic Processing – SNP and CNV detection using Array Manufacturer or custom genotyping arrays.")
+        lab_services.append("Sample & Data Storage – Secure retention of residual materials and associated data.")
+        blocks += _bullets(lab_services)
+        section_num += 1
+    blocks.append(Paragraph(Run(f"3.{section_num} Bioinformatic Services. ", bold=True), "If identified in Exhibit A, the Company shall provide the following services:"))
+    bio_services = ["Data Processing – Conversion of raw array output into normalized and quality-controlled data sets.", "Algorithmic Analysis – Application of Company's proprietary algorithms.", "QC Reporting – Documentation of batch- and sample-level QC outputs."]
+    if data['bioinformatic_services']:
+        if any('irb' in svc for svc in data['bioinformatic_services']):
+            bio_services.append("IRB Submission – Coordination of ethics review activities as specified in Exhibit A.")
+        if 'publication_drafting' in data['bioinformatic_services']:
+            bio_services.append("Publication Drafting – Manuscript preparation for peer-reviewed journals.")
+        if 'publication_submission' in data['bioinformatic_services']:
+            bio_services.append("Publication Submission – Journal submission support and coordination.")
+        if 'interventional_trial' in data['bioinformatic_services']:
+            bio_services.append("Interventional Trial Analysis – Statistical analysis of interventional study designs.")
+        if 'algorithm_creation' in data['bioinformatic_services']:
+            bio_services.append("Custom Algorithm Development – Development of tailored computational models.")
+        if 'algorithm_validation' in data['bioinformatic_services']:
+            bio_services.append("Algorithm Validation – Independent performance evaluation of algorithms.")
+    blocks += _bullets(bio_services)
+    section_num += 1
+    blocks.append(Paragraph(Run(f"3.{section_num} Reporting Services. ", bold=True), "If identified in Exhibit A, the Company shall provide the following services:"))
+    report_services = [f"Data Delivery – Secure transmission of data ({', '.join(data['data_delivery'])})."]
+    if data['portal_access']:
+        report_services.append("Technology Integration – Portal access and customized data delivery formats.")
+    report_services.append("Data Security – Encryption, HIPAA compliance, and adherence to Company's technical safeguards.")
+    blocks += _bullets(report_services)
+    return blocks
+
+def _dependencies_blocks(data):
+    if data['track'] == 'processing':
+        text = "Partner acknowledges that certain services require timely provision of samples, manifests, metadata, and other inputs by Partner."
+    else:
+        text = "Partner acknowledges that Report Only services require timely provision of properly formatted .idat files and associated metadata."
+    return [Paragraph(Run("4. Dependencies. ", bold=True), text), Paragraph(Run("5. Fees and Payment. ", bold=True), "Partner shall pay fees as set forth in Exhibit B.")]
+
+def _responsibilities_blocks(data):
+    blocks = [Paragraph(Run("6. Responsibilities.", bold=True)), Paragraph("Company Responsibilities:", style='List Bullet')]
+    blocks += _bullets(["Perform services in accordance with validated SOPs and applicable regulations.", "Maintain regulatory certifications (e.g., CLIA) where required.", "Provide timely communication regarding QC failures, delays, or issues."], indent=0.5)
+    blocks.append(Paragraph("Partner Responsibilities:", style='List Bullet'))
+    if data['track'] == 'processing':
+        partner_resp = ["Ensure proper collection, de-identification, packaging, and shipping of samples.", "Retain all necessary patient consents and authorizations.", "Provide accurate manifests and metadata with each shipment."]
+    else:
+        partner_resp = ["Ensure proper formatting and quality of uploaded .idat files.", "Retain all necessary patient consents and authorizations.", "Provide accurate metadata files with each data submission."]
+    blocks += _bullets(partner_resp, indent=0.5)
+    return blocks
+
+def _general_terms_blocks(data):
+    blocks = []
+    for num, (title, text) in enumerate([("Deliverables", "Deliverables may include raw and processed data files, QC reports, dashboards, or other outputs depending on services selected."), ("Confidentiality", "All Confidential Information exchanged will be handled in accordance with the MSA."), ("Intellectual Property", "Company retains ownership of its IP, methodologies, and algorithms. Partner retains ownership of samples and patient data."), ("Compliance", "Both Parties will comply with applicable laws including HIPAA, GDPR (if applicable), and FDA/CLIA/CAP requirements."), ("Termination", "This SOW may be terminated as provided in the MSA. Confidentiality and IP obligations survive termination."), ("Miscellaneous", "All other terms are governed by the MSA. This SOW may only be amended by written agreement.")], 7):
+        blocks.append(Paragraph(Run(f"{num}. {title}. ", bold=True), text))
+    blocks += [Paragraph(), Paragraph("IN WITNESS WHEREOF, the Parties have executed this Agreement as of the Effective Date."), Paragraph()]
+    return blocks
+
+def _signature_blocks(data):
+    rows = [["TRU DIAGNOSTIC, INC.", data['partner_name'].upper()]]
+    rows += [[label, label] for label in ["Signature: ________________", "Name: ________________", "Title: ________________", "Date: ________________"]]
+    return [Table(rows)]
+
+def _exhibit_a_blocks(data):
+    catalog = get_catalog()
+    rows = [["Category", "Service", "Details"]]
+    if data['track'] == 'processing':
+        for op_key in data.get('operational_services', []):
+            op = catalog.operational[op_key]
+            rows.append(["Operational", f"[X] {op.name}", op.detail_text])
+        proc = catalog.processing[data['processing_type']]
+        rows.append(["Lab Processing", f"[X] {proc.name}", f"Sample: {data.get('sample_type', 'N/A')}, Array: {proc.array_type}"])
+    rows.append(["Bioinformatics", "[X] Standard Bioinformatics", "Included"])
+    for bio_key in data.get('bioinformatic_services', []):
+        bio = catalog.bioinformatic[bio_key]
+        rows.append(["", f"[X] {bio.name}", bio.detail_text])
+    rows.append(["Reporting", f"[X] {data.get('report_name', 'Reports')}", f"${data.get('report_price', 0)}/sample"])
+    if data.get('portal_access'):
+        rows.append(["", "[X] Portal Access", "TruDiagnostic Provider Portal"])
+    blocks = [PageBreak(), _heading("EXHIBIT A - SERVICES ENGAGED"), Paragraph(), Paragraph(f'Services engaged by {data["partner_name"]}:'), Paragraph(), Table(rows, style='Table Grid')]
+    sites = data.get('sites')
+    if sites:
+        total = sum(site['volume'] for site in sites)
+        body = lambda: ([site['name'], f"{site['volume']:,}"] for site in sites)
+        blocks += [Paragraph(), Paragraph(f"Sites covered by this SOW ({len(sites):,}):"), Paragraph(), StreamTable(["Site", "Estimated Samples"], body, [["Total", f"{total:,}"]], style='Table Grid')]
+    return blocks
+
+def _appendix_blocks(data):
+    if not (data['track'] == 'processing' and data.get('operational_services')):
+        return []
+    blocks = [PageBreak(), _heading("APPENDIX 1 - SERVICE DESCRIPTIONS"), Paragraph()]
+    if 'kitting' in data['operational_services']:
+        blocks += [Paragraph(Run("Kitting Services", bold=True)), Paragraph("Custom Kitting Services, including design, assembly, and delivery of sample collection kits in accordance with specifications mutually agreed by the Parties.")]
+        blocks += _bullets(["Customized Kit Design - collaboration on packaging, branding, and labeling.", "Bill of Materials Documentation.", "Kit Identification - barcodes and Kit IDs.", "Quality Control Checks using statistical sampling.", "Kit Storage pending shipment."])
+        blocks.append(Paragraph())
+    if '3pl' in data['operational_services']:
+        blocks += [Paragraph(Run("Third-Party Logistics (3PL) Services", bold=True)), Paragraph("Warehousing, order receipt, and order fulfillment services as designated by Partner.")]
+        blocks += _bullets(["Warehousing & Inventory Management. Partner remains sole owner of inventory.", "Order Receipt & Fulfillment through mutually agreed systems.", "Shipment tendering to Partner's preferred carriers."])
+        blocks.append(Paragraph())
+    blocks += [Paragraph(Run("Laboratory Processing Services", bold=True)), Paragraph("Laboratory processing to enable generation of high-quality molecular data from Partner-provided samples.")]
+    lab_details = ["Sample Inspection and accession into LIMS within one (1) business day.", "Quality Control Checks including DNA concentration, purity ratios, and volume sufficiency.", "Reruns for Failed Analysis: One (1) rerun using residual sample material if initial analysis fails."]
+    if data['processing_type'] == 'epigenetic':
+        lab_details.extend(["DNA Extraction & Quantification from validated sample matrices.", "DNA Methylation Analysis using Illumina arrays with validated workflows."])
+    else:
+        lab_details.extend(["DNA Extraction & Normalization to array manufacturer specifications.", "Array-Based Genotyping using custom or commercial arrays."])
+    blocks += _bullets(lab_details)
+    return blocks
+
+def fee_rows(data):
+    """Exhibit B fee table rows (service, unit, price text), without the header."""
+    catalog = get_catalog()
+    rows = [[data.get('report_name', 'Report Services'), "Per Sample", f"${data.get('report_price', 0)}"]]
+    if data['track'] == 'processing':
+        for op_key in data.get('operational_services', []):
+            op = catalog.operational[op_key]
+            if op.billable:
+                rows.append([op.name, op.unit_label, op.fee_text])
+    for bio_key in data.get('bioinformatic_services', []):
+        bio = catalog.bioinformatic[bio_key]
+        rows.append([bio.name, bio.unit_label, bio.fee_text])
+    return rows
+
+def _exhibit_b_blocks(data):
+    rows = [["Service", "Unit", "Price (USD)"]] + fee_rows(data)
+    blocks = [PageBreak(), _heading("EXHIBIT B - PRICING AND PAYMENT TERMS"), Paragraph(), Paragraph("All fees are exclusive of applicable taxes, which shall be borne by Partner."), Paragraph(), Paragraph(Run("1. Service Fees", bold=True)), Paragraph(), Table(rows, style='Table Grid'), Paragraph()]
+    if data.get('sites'):
+        return blocks + _site_pricing_blocks(data)
+    if data.get('estimated_volume', 0) > 0:
+        from sow_quote import format_money, quote_data
+        quote = quote_data(data)
+        blocks += [Paragraph(Run("Estimated Volume: ", bold=True), f"{quote.volume:,} samples"), Paragraph(Run("Estimated Base Total: ", bold=True), format_money(quote.report))]
+        if quote.kits:
+            blocks.append(Paragraph(Run("Estimated Kit Fees: ", bold=True), format_money(quote.kits)))
+        if quote.flat:
+            blocks.append(Paragraph(Run("Flat Fees: ", bold=True), format_money(quote.flat)))
+        if quote.discount:
+            blocks.append(Paragraph(Run(f"Volume Discount ({quote.discount_pct}% on reports): ", bold=True), format_money(-quote.discount)))
+        total = format_money(quote.total) + (" plus services to be determined" if quote.tbd else "")
+        blocks += [Paragraph(Run("Estimated Total: ", bold=True), total), Paragraph()]
+    return blocks
+
+def _site_pricing_blocks(data):
+    """Exhibit B pricing for a multi-site SOW: a subtotal per site, then the deal totals and grand total."""
+    from sow_quote import format_money, quote_data, site_quotes
+    quote = quote_data(data)
+    header = ["Site", "Samples", "Reports"] + (["Kits"] if quote.kits else []) + ([f"Discount ({quote.discount_pct}%)"] if quote.discount else []) + ["Subtotal"]
+
+    def row(name, volume, report, kits, discount, total):
+        return [name, f"{volume:,}", format_money(report)] + ([format_money(kits)] if quote.kits else []) + ([format_money(-discount)] if quote.discount else []) + [format_money(total)]
+
+    def body():
+        for site, lines in site_quotes(data):
+            yield row(site['name'], *lines)
+    blank = [""] * (len(header) - 2)
+    footer = [row("Total", quote.volume, quote.report, quote.kits, quote.discount, quote.total - quote.flat)]
+    if quote.flat:
+        footer.append(["Flat Fees", *blank, format_money(quote.flat)])
+    footer.append(["Grand Total", *blank, format_money(quote.total)])
+    blocks = [Paragraph(Run("Estimated Pricing by Site", bold=True)), Paragraph(), StreamTable(header, body, footer, style='Table Grid')]
+    if quote.tbd:
+        blocks.append(Paragraph(f"The Grand Total excludes services to be determined: {', '.join(quote.tbd)}."))
+    return blocks + [Paragraph()]
+
+def _payment_terms_blocks(data):
+    blocks = [Paragraph(Run("2. Payment Terms", bold=True))]
+    blocks += _bullets(["Payment Terms: Net 30 days from invoice date.", "Invoicing: Upon completion of Services or monthly for ongoing Services.", "Late Payments: Past due amounts may accrue interest as specified in the Agreement.", "Taxes: All fees are exclusive of applicable taxes."])
+    blocks += [Paragraph(), Paragraph(Run("3. Delinquency Policy", bold=True)), Paragraph("Account Delinquent (1-30 Days): Lab processing restricted for samples linked to unpaid invoices."), Paragraph("Account Suspended (31+ Days): All lab processing blocked until balance resolved.")]
+    return blocks
+
+SECTIONS = (
+    Section('title', (), _title_blocks),
+    Section('intro', ('effective_date', 'partner_name'), _intro_blocks),
+    Section('purpose', (), _purpose_blocks),
+    Section('services', ('track', 'processing_type', 'operational_services', 'bioinformatic_services', 'data_delivery', 'portal_access'), _services_blocks),
+    Section('dependencies', ('track',), _dependencies_blocks),
+    Section('responsibilities', ('track',), _responsibilities_blocks),
+    Section('general_terms', (), _general_terms_blocks),
+    Section('signatures', ('partner_name',), _signature_blocks),
+    Section('exhibit_a', ('partner_name', 'track', 'operational_services', 'processing_type', 'sample_type', 'bioinformatic_services', 'report_name', 'report_price', 'portal_access', 'sites'), _exhibit_a_blocks, catalog=True, streams=('sites',)),
+    Section('appendix', ('track', 'operational_services', 'processing_type'), _appendix_blocks),
+    Section('exhibit_b', ('track', 'report_name', 'report_price', 'operational_services', 'bioinformatic_services', 'estimated_volume', 'sites'), _exhibit_b_blocks, catalog=True, streams=('sites',)),
+    Section('payment_terms', (), _payment_terms_blocks),
+)
+
+def build_sections(data):
+    """Return the SOW as an ordered list of (Section, blocks)."""
+    return [(section, section.build(data)) for section in SECTIONS]
+
+def _add_block(doc, block):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches, Pt
+    if isinstance(block, PageBreak):
+        doc.add_page_break()
+    elif isinstance(block, StreamTable):
+        # Cell-by-cell object-model edits get slower as the table grows; append the
+        # template's row XML a chunk at a time instead, so the build stays linear.
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls
+        from sow_template import stream_rows_xml
+        table = doc.add_table(rows=0, cols=block.columns)
+        if block.style:
+            table.style = block.style
+        for chunk in stream_rows_xml(block):
+            table._tbl.extend(parse_xml(f'<w:tbl {nsdecls("w")}>{chunk}</w:tbl>'))
+    elif isinstance(block, Table):
+        rows = block.rows
+        table = doc.add_table(rows=len(rows), cols=block.columns)
+        if block.style:
+            table.style = block.style
+        for index, (cells, values) in enumerate(zip(table.rows, rows)):
+            bold = block.bold(index, len(rows))
+            for cell, value in zip(cells.cells, values):
+                cell.text = value
+                if bold:
+                    cell.paragraphs[0].runs[0].bold = True
+    else:
+        p = doc.add_paragraph(style=block.style)
+        if block.center:
+            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        if block.indent:
+            p.paragraph_format.left_indent = Inches(block.indent)
+        for r in block.runs:
+            run = p.add_run(r.text)
+            if r.bold:
+                run.bold = True
+            if r.size:
+                run.font.size = Pt(r.size)
+
+def new_document():
+    """Empty python-docx Document with the SOW's Normal style (python-docx is imported here, not at module load)."""
+    from docx import Document
+    from docx.shared import Pt
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Arial'
+    style.font.size = Pt(11)
+    return doc
+
+def generate_sow_document(data):
+    doc = new_document()
+    trace = get_metrics().document('python-docx', data)
+    with use_catalog():
+        for section in SECTIONS:
+            with trace.section(section.name):
+                for block in section.build(data):
+                    _add_block(doc, block)
+    trace.finish(save=False)
+    return doc
+
+def save_document(doc, target, data):
+    """doc.save(target), timed as sow_save_seconds for the python-docx renderer."""
+    with get_metrics().span('sow_save_seconds', renderer='python-docx', **variant_labels(data)):
+        doc.save(target)
+
+def document_text(data):
+    """Plain text of the SOW, one line per paragraph or table row (for search and diffs)."""
+    lines = []
+    with use_catalog():
+        sections = build_sections(data)
+    for _, blocks in sections:
+        for block in blocks:
+            if isinstance(block, Table):
+                lines.extend(' | '.join(row) for row in block.rows)
+            elif isinstance(block, Paragraph):
+                lines.append(''.join(r.text for r in block.runs))
+    return '\n'.join(lines)
+
+MIME_TYPES = {'docx': "application/vnd.openxmlformats-officedocument.wordprocessingml.document", 'pdf': "application/pdf", 'zip': "application/zip"}
+
+_RESERVED_STEMS = frozenset(['CON', 'PRN', 'AUX', 'NUL', *(f'COM{i}' for i in range(1, 10)), *(f'LPT{i}' for i in range(1, 10))])
+
+def filename_stem(name, max_length=60):
+    """ASCII letters and digits of `name` joined by '_', cut at a word boundary; safe in any filesystem and Content-Disposition header.
+
+    Accents are transliterated (Müller -> Muller). A name with no ASCII letters
+    or digits left gets a stable hash instead, so different names never share
+    the empty stem.
+    """
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode('ascii')
+    stem = ''
+    for word in re.findall(r'[A-Za-z0-9]+', ascii_name):
+        if len(stem) + len(word) + 1 > max_length and stem:
+            break
+        stem = f"{stem}_{word}" if stem else word[:max_length]
+    if not stem:
+        return f"Partner_{hashlib.sha1((name or '').encode('utf-8')).hexdigest()[:8]}"
+    return f"{stem}_" if stem.upper() in _RESERVED_STEMS else stem
+
+def sow_filename(partner_name, when, ext="docx"):
+    return f"SOW_{filename_stem(partner_name)}_{when.strftime('%Y%m%d')}.{ext}"
@@ -0,0 +1,178 @@
+"""
+TruDiagnostic SOW Generator - Background generation jobs
+
+JobQueue runs document builds on a bounded pool of worker threads so the
+Streamlit script thread only submits and polls. Jobs are queued per owner
+(one owner per browser session) and workers take from owners round-robin,
+so one session queuing many builds cannot starve the others. When the queue
+is full, submit() raises QueueFull instead of queueing without bound.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+_current = threading.local()
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    __slots__ = ('id', 'owner', 'label', 'fn', 'args', 'kwargs', 'status', 'progress', 'message', 'result', 'error', 'submitted', 'started', 'finished')
+
+    def __init__(self, owner, label, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.label = label
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting for a worker"
+        self.result = self.error = None
+        self.submitted = time.time()
+        self.started = self.finished = None
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def as_dict(self):
+        return {'id': self.id, 'owner': self.owner, 'label': self.label, 'status': self.status, 'progress': self.progress, 'message': self.message, 'error': self.error, 'submitted': self.submitted, 'started': self.started, 'finished': self.finished}
+
+def report_progress(fraction, message=None):
+    """Called from inside a job function to update its progress; a no-op outside a job."""
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        job.progress = max(0.0, min(1.0, fraction))
+        if message:
+            job.message = message
+
+class JobQueue:
+    def __init__(self, workers=4, max_pending=64, per_owner=8, retain_seconds=900):
+        self.max_pending = max_pending
+        self.per_owner = per_owner
+        self.retain_seconds = retain_seconds
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()
+        self._jobs = {}
+        self._pending = 0
+        self._running = 0
+        self._closed = False
+        self.counts = {'submitted': 0, 'rejected': 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+        self._threads = [threading.Thread(target=self._work, name=f"sow-job-{i}", daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, owner, fn, *args, label=None, **kwargs):
+        job = Job(owner, label or getattr(fn, '__name__', 'job'), fn, args, kwargs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("job queue is shut down")
+            queue = self._queues.get(owner)
+            if self._pending >= self.max_pending or (queue and len(queue) >= self.per_owner):
+                self.counts['rejected'] += 1
+                raise QueueFull(f"{self._pending} jobs pending; try again shortly")
+            self._prune()
+            self._queues.setdefault(owner, deque()).append(job)
+            self._jobs[job.id] = job
+            self._pending += 1
+            self.counts['submitted'] += 1
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """Number of jobs a worker will take before this one (round-robin order), or None."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return None
+            mine = self._queues[job.owner].index(job)
+            ahead, before_owner = 0, True
+            for owner, queue in self._queues.items():
+                if owner == job.owner:
+                    before_owner = False
+                    ahead += mine
+                else:
+                    ahead += min(len(queue), mine + 1 if before_owner else mine)
+            return ahead
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            queue = self._queues[job.owner]
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.owner]
+            self._pending -= 1
+            self._finish(job, CANCELLED)
+            return True
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status, job.result, job.error = status, result, error
+        job.finished = time.time()
+        job.fn = job.args = job.kwargs = None
+        if status == DONE:
+            job.progress, job.message = 1.0, "Finished"
+        self.counts[status] += 1
+
+    def _prune(self):
+        cutoff = time.time() - self.retain_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _take(self):
+        owner, queue = self._queues.popitem(last=False)
+        job = queue.popleft()
+        if queue:
+            self._queues[owner] = queue
+        self._pending -= 1
+        self._running += 1
+        job.status, job.started, job.message = RUNNING, time.time(), "Running"
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._queues:
+                    return
+                job = self._take()
+            _current.job = job
+            status, result, error = DONE, None, None
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except BaseException as exc:
+                # SystemExit or KeyboardInterrupt from a job fails that job only; the worker thread keeps serving.
+                status, error = FAILED, f"{type(exc).__name__}: {exc}"
+            _current.job = None
+            with self._cond:
+                self._running -= 1
+                self._finish(job, status, result, error)
+
+    def stats(self):
+        with self._cond:
+            return {'workers': len(self._threads), 'queued': self._pending, 'running': self._running, 'owners_waiting': len(self._queues), 'max_pending': self.max_pending, 'per_owner': self.per_owner, **self.counts}
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+@lru_cache(maxsize=None)
+def get_queue():
+    return JobQueue(workers=int(os.environ.get('SOW_JOB_WORKERS', 4)), max_pending=int(os.environ.get('SOW_JOB_QUEUE', 64)))
@@ -0,0 +1,281 @@
+"""
+TruDiagnostic SOW Generator - Hot-path instrumentation
+
+Metrics keeps a bounded window of recent observations per series (name +
+labels) and reports count, sum and p50/p95/p99 as Prometheus text or JSON.
+Document renders are traced per section through `document()`. A trace times
+each section and the package save, and it can also record tracemalloc peaks.
+
+Configuration (environment):
+
+- SOW_METRICS_SAMPLE: fraction of documents and reruns timed (default 1.0).
+- SOW_METRICS_ALLOC: fraction of sampled documents that also trace allocations (default 0).
+- SOW_METRICS_PORT: serve /metrics (Prometheus) and /metrics.json on this local port.
+- SOW_METRICS_FILE: rewrite this .prom or .json file every SOW_METRICS_INTERVAL seconds (default 30).
+
+The port and file exporters are started by export_metrics(), which only the
+entry points (app, service, batch CLI) call, never pool workers: they would
+all try to bind the same port.
+
+tracemalloc is process-wide, so allocation peaks of documents rendered
+concurrently on other threads are included in each other's numbers.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUANTILES = (0.5, 0.95, 0.99)
+HELP = {
+    'sow_section_seconds': "Time to build and render one SOW section.",
+    'sow_section_alloc_bytes': "Peak bytes allocated while rendering one SOW section (tracemalloc).",
+    'sow_save_seconds': "Time to encode the rendered document package.",
+    'sow_render_seconds': "End-to-end time to produce one document.",
+    'sow_rerun_seconds': "Streamlit script rerun time by wizard step.",
+    'sow_request_seconds': "HTTP service request time by endpoint.",
+}
+
+def variant_labels(data):
+    return {'track': data.get('track') or 'processing', 'processing': data.get('processing_type') or 'none'}
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _label_text(labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels)
+
+class _Series:
+    __slots__ = ('count', 'total', 'window')
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=window)
+
+class _NullTrace:
+    sampled = False
+
+    def section(self, name):
+        return _NULL_SPAN
+
+    def timed(self, name, chunks):
+        return chunks
+
+    def finish(self, save=True):
+        pass
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+NULL_TRACE = _NullTrace()
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics, self.name, self.labels = metrics, name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class _Trace:
+    """Per-document timer; `section(name)` spans are summed and, with save=True, the remainder is reported as save time."""
+    sampled = True
+
+    def __init__(self, metrics, renderer, data, allocations):
+        self.metrics = metrics
+        self.labels = {'renderer': renderer, **variant_labels(data)}
+        self.allocations = allocations
+        self.in_sections = 0.0
+        self.start = time.perf_counter()
+        # Tracing slows every allocation in the process; only the trace that turned it on turns it off.
+        self.started_tracing = allocations and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def section(self, name):
+        return _SectionSpan(self, name)
+
+    def timed(self, name, chunks):
+        """Yield a lazily built section's chunks, timing only their production (not the consumer's deflate and I/O)."""
+        chunks, elapsed = iter(chunks), 0.0
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            elapsed += time.perf_counter() - start
+            if chunk is None:
+                break
+            yield chunk
+        self.in_sections += elapsed
+        self.metrics.observe('sow_section_seconds', elapsed, section=name, **self.labels)
+
+    def finish(self, save=True):
+        total = time.perf_counter() - self.start
+        if self.started_tracing:
+            tracemalloc.stop()
+        self.metrics.observe('sow_render_seconds', total, **self.labels)
+        if save:
+            self.metrics.observe('sow_save_seconds', max(0.0, total - self.in_sections), **self.labels)
+
+class _SectionSpan:
+    __slots__ = ('trace', 'name', 'start', 'base')
+
+    def __init__(self, trace, name):
+        self.trace, self.name = trace, name
+
+    def __enter__(self):
+        if self.trace.allocations:
+            tracemalloc.reset_peak()
+            self.base = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        trace = self.trace
+        trace.in_sections += elapsed
+        trace.metrics.observe('sow_section_seconds', elapsed, section=self.name, **trace.labels)
+        if trace.allocations:
+            trace.metrics.observe('sow_section_alloc_bytes', max(0, tracemalloc.get_traced_memory()[1] - self.base), section=self.name, **trace.labels)
+        return False
+
+class Metrics:
+    def __init__(self, sample_rate=1.0, alloc_rate=0.0, window=2048):
+        self.sample_rate = sample_rate
+        self.alloc_rate = alloc_rate
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.window)
+            series.count += 1
+            series.total += value
+            series.window.append(value)
+
+    def span(self, name, **labels):
+        """Context manager timing a block into `name`; a no-op when not sampled."""
+        return _Span(self, name, labels) if self.sampled() else _NULL_SPAN
+
+    def document(self, renderer, data):
+        """Start a per-section trace of one document render, or NULL_TRACE when not sampled."""
+        if not self.sampled():
+            return NULL_TRACE
+        return _Trace(self, renderer, data, self.alloc_rate > 0 and random.random() < self.alloc_rate)
+
+    def summary(self):
+        """One dict per series: name, labels, count, sum and the QUANTILES over the recent window."""
+        with self._lock:
+            items = [(name, labels, s.count, s.total, sorted(s.window)) for (name, labels), s in self._series.items()]
+        out = []
+        for name, labels, count, total, ordered in sorted(items):
+            row = {'name': name, 'labels': dict(labels), 'count': count, 'sum': total}
+            for q in QUANTILES:
+                row[f'p{int(q * 100)}'] = _quantile(ordered, q)
+            out.append(row)
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def prometheus(self):
+        lines, seen = [], set()
+        for row in self.summary():
+            name, labels = row['name'], sorted(row['labels'].items())
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} summary")
+            for q in QUANTILES:
+                lines.append(f"{name}{{{_label_text(labels + [('quantile', q)])}}} {row[f'p{int(q * 100)}']:.6g}")
+            suffix = f"{{{_label_text(labels)}}}" if labels else ''
+            lines.append(f"{name}_count{suffix} {row['count']}")
+            lines.append(f"{name}_sum{suffix} {row['sum']:.6g}")
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        return json.dumps({'generated': time.time(), 'sample_rate': self.sample_rate, 'alloc_rate': self.alloc_rate, 'series': self.summary()}, indent=2)
+
+    def write(self, path):
+        """Export to `path` atomically; .json gets JSON, anything else Prometheus text."""
+        payload = self.to_json() if path.endswith('.json') else self.prometheus()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(payload)
+        os.replace(tmp, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics and /metrics.json from a daemon thread; returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, kind = metrics.prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, kind = metrics.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', kind)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="sow-metrics-http", daemon=True).start()
+        return server
+
+    def export_every(self, path, interval):
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.write(path)
+        threading.Thread(target=loop, name="sow-metrics-export", daemon=True).start()
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    return Metrics(sample_rate=float(os.environ.get('SOW_METRICS_SAMPLE', 1.0)), alloc_rate=float(os.environ.get('SOW_METRICS_ALLOC', 0.0)))
+
+@lru_cache(maxsize=None)
+def export_metrics():
+    """Start the SOW_METRICS_PORT and SOW_METRICS_FILE exporters for this process, once; returns the HTTP server or None."""
+    metrics, server = get_metrics(), None
+    if os.environ.get('SOW_METRICS_PORT'):
+        try:
+            server = metrics.serve(int(os.environ['SOW_METRICS_PORT']))
+        except OSError as exc:
+            print(f"metrics: cannot serve on port {os.environ['SOW_METRICS_PORT']}: {exc}", file=sys.stderr)
+    if os.environ.get('SOW_METRICS_FILE'):
+        metrics.export_every(os.environ['SOW_METRICS_FILE'], float(os.environ.get('SOW_METRICS_INTERVAL', 30)))
+    return server
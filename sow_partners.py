@@ -0,0 +1,233 @@
+"""
+TruDiagnostic SOW Generator - Partner directory
+
+Usage: python sow_partners.py --import partners.csv [--store sows.db]
+       python sow_partners.py "acme helth"                (ranked suggestions)
+
+Known partner legal names live in the SOW store (`partners`), one row per
+normalized name, and are imported in bulk from CSV with a header row naming
+a `partner_name`, `legal_name` or `name` column. The app's ?admin=1 page
+offers the import only when SOW_ADMIN_TOKEN is set and the session has
+entered it.
+
+Step 1 suggests directory names as the partner name is typed, so a typo is
+caught before it reaches a signed contract or a filename. Suggestions come
+from a trigram index built once per directory revision: every name's match
+key (case, accents, punctuation and legal suffixes like "Inc." removed) is
+split into padded trigrams, kept as NumPy posting arrays. A lookup counts
+the trigrams each name shares with the query in one np.bincount and ranks by
+Dice similarity, with a bonus for names the query is a prefix of, so both
+"acme helth" and "acme he" find "Acme Health Labs, Inc." in about a
+millisecond on tens of thousands of names.
+"""
+
+import argparse
+import csv
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+import numpy as np
+from sow_document import filename_stem
+
+NAME_COLUMNS = ('partner_name', 'legal_name', 'name')
+LEGAL_SUFFIXES = frozenset(['inc', 'incorporated', 'llc', 'llp', 'lp', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company', 'plc', 'pc', 'pllc', 'gmbh', 'ag', 'sa', 'srl', 'bv', 'nv', 'pty', 'kk', 'oy', 'ab'])
+
+def clean_name(name):
+    """A name as it should be written into a SOW: Unicode-normalized, single-spaced, trimmed."""
+    return ' '.join(unicodedata.normalize('NFKC', name or '').split()).strip(' ,;')
+
+def name_key(name):
+    """Directory identity: case, accents and punctuation removed ("Acme Labs, Inc." == "ACME LABS INC")."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    return ' '.join(re.findall(r'[^\W_]+', ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()))
+
+def _strip_suffixes(key):
+    words = key.split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+def match_key(name):
+    """name_key without trailing legal suffixes, which would otherwise dominate short names' trigrams."""
+    return _strip_suffixes(name_key(name))
+
+def trigrams(key):
+    """Padded trigrams of each word ("  a", " ac", "acm", "cme", "me "), as in pg_trgm."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class Partner:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __repr__(self):
+        return f"Partner({self.id}, {self.name!r})"
+
+    @property
+    def filename(self):
+        return filename_stem(self.name)
+
+class PartnerIndex:
+    """Immutable trigram index over (id, name) rows."""
+
+    def __init__(self, rows):
+        start = time.perf_counter()
+        self.partners = [Partner(pid, name) for pid, name in rows]
+        self.full_keys = [name_key(p.name) for p in self.partners]
+        self.keys = [_strip_suffixes(key) for key in self.full_keys]
+        postings = {}
+        sizes = np.zeros(len(self.partners), dtype=np.int32)
+        for row, key in enumerate(self.keys):
+            grams = trigrams(key)
+            sizes[row] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+        self.vocab = {gram: term for term, gram in enumerate(postings)}
+        lengths = np.fromiter((len(rows) for rows in postings.values()), dtype=np.int64, count=len(postings))
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.postings = np.fromiter((row for rows in postings.values() for row in rows), dtype=np.int32, count=int(self.offsets[-1]))
+        self.sizes = sizes
+        order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.sorted_keys = [self.keys[row] for row in order]
+        self.sorted_rows = order
+        self.build_seconds = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.partners)
+
+    def _prefixed(self, key, limit):
+        """Rows whose match key starts with `key`, shortest first."""
+        rows = []
+        for i in range(bisect_left(self.sorted_keys, key), len(self.sorted_keys)):
+            if not self.sorted_keys[i].startswith(key) or len(rows) >= limit * 4:
+                break
+            rows.append(self.sorted_rows[i])
+        return rows
+
+    def suggest(self, text, limit=5, min_score=0.35):
+        """Up to `limit` (Partner, score) pairs for `text`, best first; score 1.0 is the same name."""
+        key = match_key(text)
+        if not key or not self.partners:
+            return []
+        scores = {}
+        grams = trigrams(key)
+        terms = [self.vocab[g] for g in grams if g in self.vocab]
+        if terms:
+            hits = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in terms])
+            shared = np.bincount(hits, minlength=len(self.partners))
+            dice = 2.0 * shared / (len(grams) + self.sizes)
+            candidates = np.flatnonzero(dice >= min_score)
+            if len(candidates) > limit * 4:
+                candidates = candidates[np.argpartition(dice[candidates], -limit * 4)[-limit * 4:]]
+            scores = {int(row): float(dice[row]) for row in candidates}
+        for row in self._prefixed(key, limit):
+            scores[row] = max(scores.get(row, 0.0), 0.6 + 0.4 * len(key) / len(self.keys[row]))
+        full = trigrams(name_key(text))
+
+        def rank(item):
+            # Names that differ only by legal suffix tie on the match key; the full key (suffix included) breaks the tie.
+            theirs = trigrams(self.full_keys[item[0]])
+            return (-item[1], -len(full & theirs) / len(full | theirs), len(self.partners[item[0]].name))
+        ranked = sorted(scores.items(), key=rank)
+        return [(self.partners[row], round(score, 3)) for row, score in ranked[:limit]]
+
+def read_names(fh):
+    """Cleaned names from a CSV file object's first NAME_COLUMNS column; ValueError when the header has none of them."""
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [h.strip().lower() for h in header]
+    column = next((columns.index(c) for c in NAME_COLUMNS if c in columns), None)
+    if column is None:
+        raise ValueError(f"the header row needs a {', '.join(NAME_COLUMNS[:-1])} or {NAME_COLUMNS[-1]} column (found: {', '.join(header) or 'nothing'})")
+    for row in reader:
+        if len(row) > column:
+            yield clean_name(row[column])
+
+class PartnerDirectory:
+    """The store's partners behind a PartnerIndex that is rebuilt whenever partners are added."""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._index = PartnerIndex(())
+        self._revision = None
+
+    def index(self):
+        revision = self.store.partner_revision()
+        if revision != self._revision:
+            with self._lock:
+                if revision != self._revision:
+                    self._index = PartnerIndex(self.store.partners())
+                    self._revision = revision
+        return self._index
+
+    def suggest(self, text, limit=5):
+        return self.index().suggest(text, limit)
+
+    def exact(self, text):
+        """The directory partner whose name is `text` up to case, accents and punctuation, or None."""
+        key = name_key(text)
+        return next((partner for partner, score in self.suggest(text, 1) if name_key(partner.name) == key), None)
+
+    def import_names(self, names):
+        """Add names (cleaned, blanks skipped, duplicates by name_key ignored); returns (added, read)."""
+        rows = [(name_key(name), name) for name in names if name_key(name)]
+        return self.store.add_partners(rows), len(rows)
+
+    def import_csv(self, fh):
+        return self.import_names(read_names(fh))
+
+    def stats(self):
+        index = self.index()
+        return {'partners': len(index), 'trigrams': len(index.vocab), 'build_seconds': index.build_seconds}
+
+@lru_cache(maxsize=None)
+def get_directory():
+    """The process-wide directory over get_store(), or None when the store is disabled."""
+    from sow_store import get_store
+    store = get_store()
+    return PartnerDirectory(store) if store is not None else None
+
+def main(argv=None):
+    from sow_store import SowStore
+    parser = argparse.ArgumentParser(description="Import partner legal names or look one up.")
+    parser.add_argument('query', nargs='?', help="name to look up")
+    parser.add_argument('--import', dest='csv', metavar='CSV', help="add the names in this CSV file to the directory")
+    parser.add_argument('--store', default='sows.db', help="SOW store (default: sows.db)")
+    parser.add_argument('-n', '--limit', type=int, default=5, help="suggestions to show (default: 5)")
+    args = parser.parse_args(argv)
+    if not (args.csv or args.query):
+        parser.error("give a QUERY or --import CSV")
+    directory = PartnerDirectory(SowStore(args.store))
+    if args.csv:
+        try:
+            with open(args.csv, newline='', encoding='utf-8-sig') as fh:
+                added, read = directory.import_csv(fh)
+        except (OSError, ValueError, csv.Error) as exc:
+            print(f"{args.csv}: {exc}", file=sys.stderr)
+            return 1
+        print(f"{args.csv}: {read:,} names read, {added:,} new, {read - added:,} already in the directory")
+    if args.query:
+        index = directory.index()
+        start = time.perf_counter()
+        suggestions = index.suggest(args.query, args.limit)
+        elapsed = time.perf_counter() - start
+        for partner, score in suggestions:
+            print(f"{score:5.2f}  {partner.name}  ({partner.filename})")
+        print(f"{len(suggestions)} of {len(index):,} partners in {elapsed * 1000:.2f} ms (index built in {index.build_seconds:.2f} s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
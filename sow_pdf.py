@@ -0,0 +1,251 @@
+"""
+TruDiagnostic SOW Generator - PDF renderer
+
+Lays out the same section blocks generate_sow_document renders (see
+sow_document.SECTIONS) and writes a PDF directly: the standard
+Helvetica fonts (no embedding), greedy word wrap from the AFM widths below,
+one Flate-compressed content stream per page. No word processor or
+third-party library is involved, so it works offline and costs a few ms.
+
+Those fonts only cover WinAnsi (cp1252) text. A name in another script is
+refused with PdfTextError rather than printed as "????" in a contract; the
+.docx renders any name.
+"""
+
+import zlib
+from functools import lru_cache
+from sow_catalog import use_catalog
+from sow_document import SECTIONS, PageBreak, Table
+from sow_metrics import get_metrics
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN_X, MARGIN_TOP, MARGIN_BOTTOM = 90, 72, 72
+BODY_WIDTH = PAGE_WIDTH - 2 * MARGIN_X
+FONT_SIZE = 11
+LEADING = 1.25
+PARAGRAPH_GAP = 6
+BULLET_INDENT = 18
+CELL_PAD = 4
+
+# Advance widths (1/1000 em) for ' ' .. '~' from the Adobe Helvetica AFMs.
+_REGULAR = [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278] + [556] * 10 + [278, 278, 584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+_BOLD = [278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278] + [556] * 10 + [333, 333, 584, 584, 584, 611, 975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556, 333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611, 611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584]
+_EXTRA = {'–': (556, 556), '—': (1000, 1000), '‘': (222, 278), '’': (222, 278), '“': (333, 500), '”': (333, 500), '•': (350, 350)}
+WIDTHS = ({chr(32 + i): w for i, w in enumerate(_REGULAR)}, {chr(32 + i): w for i, w in enumerate(_BOLD)})
+for _ch, (_regular, _bold) in _EXTRA.items():
+    WIDTHS[0][_ch], WIDTHS[1][_ch] = _regular, _bold
+
+@lru_cache(maxsize=4096)
+def _em_width(text, bold):
+    widths = WIDTHS[bold]
+    return sum(widths.get(ch, 556) for ch in text)
+
+def text_width(text, bold=False, size=FONT_SIZE):
+    return _em_width(text, bold) * size / 1000
+
+class PdfTextError(ValueError):
+    """Text the PDF's standard fonts cannot show."""
+
+def unsupported_chars(text):
+    """The characters of `text` outside WinAnsi (cp1252), in order of first use; '' when it can all be shown."""
+    try:
+        text.encode('cp1252')
+        return ''
+    except UnicodeEncodeError:
+        return ''.join(dict.fromkeys(ch for ch in text if not _winansi(ch)))
+
+def _winansi(ch):
+    try:
+        ch.encode('cp1252')
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def check_pdf_text(data):
+    """Raise PdfTextError naming the first field of `data` the PDF cannot show (partner, report, sample type, sites)."""
+    fields = [(key, data.get(key)) for key in ('partner_name', 'report_name', 'sample_type')]
+    fields += [(f"site {site['name']!r}", site['name']) for site in data.get('sites') or ()]
+    for field, text in fields:
+        if text and unsupported_chars(text):
+            raise PdfTextError(f"{field}: the PDF fonts cannot show {unsupported_chars(text)!r} in {text!r}; generate the .docx or write the name in Latin characters")
+
+def _pdf_string(text):
+    try:
+        raw = text.encode('cp1252')
+    except UnicodeEncodeError:
+        raise PdfTextError(f"the PDF fonts cannot show {unsupported_chars(text)!r} in {text!r}") from None
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def _merge(line):
+    """Join adjacent words that share a font so each line is a few text operators."""
+    out = []
+    for text, bold, size, x in line:
+        if out and out[-1][1:3] == (bold, size):
+            out[-1] = (out[-1][0] + text,) + out[-1][1:]
+        else:
+            out.append((text, bold, size, x))
+    return out
+
+def _split_word(word, bold, size, width):
+    """A word wider than `width` cut into pieces that each fit (at least one character per piece)."""
+    pieces, piece = [], ''
+    for ch in word:
+        if piece and text_width(piece + ch, bold, size) > width:
+            pieces.append(piece)
+            piece = ch
+        else:
+            piece += ch
+    return pieces + [piece]
+
+def _wrap(runs, width):
+    """Greedy word wrap of (text, bold, size) runs; returns lines of [(text, bold, size, x_offset)].
+
+    A word wider than the whole line is hard-broken, so nothing runs past a table cell.
+    """
+    lines, line, x = [], [], 0.0
+    for text, bold, size in runs:
+        for i, word in enumerate(text.split(' ')):
+            token = word if i == 0 else ' ' + word
+            w = text_width(token, bold, size)
+            if line and x + w > width and word:
+                lines.append(_merge(line))
+                token, line, x = word, [], 0.0
+                w = text_width(token, bold, size)
+            if not line and w > width:
+                *full, token = _split_word(token, bold, size, width)
+                lines.extend([(piece, bold, size, 0.0)] for piece in full)
+                w = text_width(token, bold, size)
+            if token:
+                line.append((token, bold, size, x))
+                x += w
+    if line or not lines:
+        lines.append(_merge(line))
+    return lines
+
+class _Layout:
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+        self.y = PAGE_HEIGHT - MARGIN_TOP
+
+    def ensure(self, height):
+        if self.y - height < MARGIN_BOTTOM and self.y < PAGE_HEIGHT - MARGIN_TOP:
+            self.new_page()
+
+    def text(self, x, y, text, bold, size):
+        self.ops.append(b'BT /F%d %g Tf %.2f %.2f Td %s Tj ET' % (2 if bold else 1, size, x, y, _pdf_string(text)))
+
+    def rule(self, x1, y1, x2, y2):
+        self.ops.append(b'%.2f %.2f m %.2f %.2f l S' % (x1, y1, x2, y2))
+
+    def paragraph(self, block):
+        runs = [(r.text, r.bold, r.size or FONT_SIZE) for r in block.runs]
+        size = max((r[2] for r in runs), default=FONT_SIZE)
+        height = size * LEADING
+        if not runs:
+            self.ensure(height)
+            self.y -= height
+            return
+        left = MARGIN_X + (block.indent or 0) * 72
+        if block.style == 'List Bullet':
+            left += BULLET_INDENT
+        lines = _wrap(runs, MARGIN_X + BODY_WIDTH - left)
+        for n, line in enumerate(lines):
+            self.ensure(height)
+            self.y -= height
+            if n == 0 and block.style == 'List Bullet':
+                self.text(left - 11, self.y + 2, '•', False, size)
+            offset = 0.0
+            if block.center and line:
+                last = line[-1]
+                offset = (MARGIN_X + BODY_WIDTH - left - (last[3] + text_width(last[0], last[1], last[2]))) / 2
+            for text, bold, run_size, x in line:
+                self.text(left + offset + x, self.y + 2, text, bold, run_size)
+        self.y -= PARAGRAPH_GAP
+
+    def table(self, block):
+        rows = block.rows
+        cols = block.columns
+        col_width = BODY_WIDTH / cols
+        grid = block.style == 'Table Grid'
+        for r, values in enumerate(rows):
+            bold = block.bold(r, len(rows))
+            cells = [_wrap([(v, bold, FONT_SIZE)], col_width - 2 * CELL_PAD) for v in values]
+            height = max(len(c) for c in cells) * FONT_SIZE * LEADING + 2 * CELL_PAD
+            self.ensure(height)
+            top = self.y
+            for c, lines in enumerate(cells):
+                y = top - CELL_PAD
+                for line in lines:
+                    y -= FONT_SIZE * LEADING
+                    for text, b, size, x in line:
+                        self.text(MARGIN_X + c * col_width + CELL_PAD + x, y + 2, text, b, size)
+            self.y = top - height
+            if grid:
+                self.rule(MARGIN_X, top, MARGIN_X + BODY_WIDTH, top)
+                self.rule(MARGIN_X, self.y, MARGIN_X + BODY_WIDTH, self.y)
+                for c in range(cols + 1):
+                    self.rule(MARGIN_X + c * col_width, top, MARGIN_X + c * col_width, self.y)
+        self.y -= PARAGRAPH_GAP
+
+    def block(self, block):
+        if isinstance(block, PageBreak):
+            self.new_page()
+        elif isinstance(block, Table):
+            self.table(block)
+        else:
+            self.paragraph(block)
+
+def _page_number(n, total):
+    label = f"Page {n} of {total}"
+    x = (PAGE_WIDTH - text_width(label, size=8)) / 2
+    return b'BT /F1 8 Tf %.2f %.2f Td %s Tj ET' % (x, MARGIN_BOTTOM / 2, _pdf_string(label))
+
+def _write_pdf(pages, title):
+    total = len(pages)
+    font_ids, pages_id = (3, 4), 2
+    objects = {1: b'<< /Type /Catalog /Pages 2 0 R >>', font_ids[0]: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>', font_ids[1]: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>', 5: b'<< /Title ' + _pdf_string(title) + b' /Producer (TruDiagnostic SOW Generator) >>'}
+    kids = []
+    for n, ops in enumerate(pages, 1):
+        page_id, content_id = 4 + 2 * n, 5 + 2 * n
+        stream = zlib.compress(b'0.5 w\n' + b'\n'.join(ops + [_page_number(n, total)]))
+        objects[content_id] = b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream)
+        objects[page_id] = b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+        kids.append(b'%d 0 R' % page_id)
+    objects[pages_id] = b'<< /Type /Pages /Kids [' + b' '.join(kids) + b'] /Count %d >>' % total
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b'%d 0 obj\n%s\nendobj\n' % (obj_id, objects[obj_id])
+    xref = len(out)
+    size = max(objects) + 1
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for obj_id in range(1, size):
+        out += b'%010d 00000 n \n' % offsets[obj_id] if obj_id in offsets else b'0000000000 65535 f \n'
+    out += b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref)
+    return bytes(out)
+
+def render_pdf(blocks, title="Statement of Work"):
+    """Lay out blocks and return the PDF file as bytes."""
+    layout = _Layout()
+    for block in blocks:
+        layout.block(block)
+    return _write_pdf(layout.pages, title)
+
+def render_sow_pdf(data):
+    check_pdf_text(data)
+    trace = get_metrics().document('pdf', data)
+    layout = _Layout()
+    with use_catalog():
+        for section in SECTIONS:
+            with trace.section(section.name):
+                for block in section.build(data):
+                    layout.block(block)
+    payload = _write_pdf(layout.pages, f"Statement of Work - {data['partner_name']}")
+    trace.finish()
+    return payload
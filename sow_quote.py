@@ -0,0 +1,163 @@
+"""
+TruDiagnostic SOW Generator - Deal quoting
+
+Totals are computed from catalog prices with NumPy so a whole grid of
+what-if scenarios (volume x report package x operational add-ons x
+bioinformatic add-ons x discount) is priced in one vectorized pass. All money
+is int64 cents:
+
+- report:   report price x volume
+- kits:     per-kit operational fees x volume (one kit per sample)
+- flat:     fixed-price bioinformatic add-ons
+- discount: volume-tier (or negotiated) percent off the report line
+- total:    report + kits + flat - discount
+
+"Custom"-priced add-ons have no amount; they are counted in `tbd`.
+
+A multi-site SOW (`sites`, a list of {"name", "volume"}) is quoted at the sum
+of its site volumes. site_quotes() prices each site at that deal's volume
+tier, SITE_CHUNK sites per vectorized pass. Every report line is a whole
+number of dollars, so each discount is exact and the site subtotals plus the
+flat fees add up to quote_data(data).total to the cent.
+"""
+
+import itertools
+import numpy as np
+from sow_catalog import get_catalog
+
+LINES = ('report', 'kits', 'flat', 'discount', 'total')
+AUTO = -1
+SITE_CHUNK = 1024
+
+def format_money(cents):
+    cents = int(cents)
+    sign = '-' if cents < 0 else ''
+    dollars, rest = divmod(abs(cents), 100)
+    return f"{sign}${dollars:,}" if not rest else f"{sign}${dollars:,}.{rest:02d}"
+
+def tier_discount(volume, catalog=None):
+    """Volume-tier discount percent for each volume (vectorized)."""
+    catalog = catalog or get_catalog()
+    volume = np.asarray(volume, dtype=np.int64)
+    if not catalog.volume_tiers:
+        return np.zeros_like(volume)
+    mins = np.array([t.min_volume for t in catalog.volume_tiers], dtype=np.int64)
+    pcts = np.array([0] + [t.discount_pct for t in catalog.volume_tiers], dtype=np.int64)
+    return pcts[np.searchsorted(mins, volume, side='right')]
+
+def price_lines(volume, report_price, kit_price, flat_fee, discount_pct=AUTO, catalog=None):
+    """Price broadcastable arrays of scenarios; returns a dict of int64 cent arrays keyed by LINES.
+
+    `discount_pct` of AUTO (-1) applies the catalog's volume tier for that volume.
+    """
+    catalog = catalog or get_catalog()
+    volume = np.asarray(volume, dtype=np.int64)
+    discount_pct = np.asarray(discount_pct, dtype=np.int64)
+    discount_pct = np.where(discount_pct == AUTO, tier_discount(volume, catalog), discount_pct)
+    report = np.asarray(report_price, dtype=np.int64) * 100 * volume
+    kits = np.asarray(kit_price, dtype=np.int64) * 100 * volume
+    flat = np.asarray(flat_fee, dtype=np.int64) * 100
+    discount = (report * discount_pct + 50) // 100
+    report, kits, flat, discount, discount_pct = np.broadcast_arrays(report, kits, flat, discount, discount_pct)
+    return {'report': report, 'kits': kits, 'flat': flat, 'discount': discount, 'total': report + kits + flat - discount, 'discount_pct': discount_pct}
+
+def _kit_price(keys, catalog):
+    return sum(catalog.operational[k].price or 0 for k in keys)
+
+def _flat_fee(keys, catalog):
+    return sum(catalog.bioinformatic[k].price or 0 for k in keys)
+
+def _tbd(keys, catalog):
+    return [catalog.bioinformatic[k].name for k in keys if catalog.bioinformatic[k].custom]
+
+class Quote:
+    """Priced single deal; money fields are int cents."""
+    __slots__ = ('volume', 'discount_pct', 'report', 'kits', 'flat', 'discount', 'total', 'tbd')
+
+    def __init__(self, volume, lines, tbd):
+        self.volume = volume
+        self.discount_pct = int(lines['discount_pct'])
+        for name in LINES:
+            setattr(self, name, int(lines[name]))
+        self.tbd = tbd
+
+def deal_volume(data):
+    """Estimated samples for the SOW: the sum over its sites when it has any."""
+    sites = data.get('sites')
+    return sum(site['volume'] for site in sites) if sites else data.get('estimated_volume', 0)
+
+def quote_data(data, catalog=None):
+    """Quote one SOW `data` dict at its estimated volume."""
+    catalog = catalog or get_catalog()
+    ops = data.get('operational_services', []) if data['track'] == 'processing' else []
+    bio = data.get('bioinformatic_services', [])
+    volume = deal_volume(data)
+    lines = price_lines(volume, data.get('report_price', 0), _kit_price(ops, catalog), _flat_fee(bio, catalog), AUTO, catalog)
+    return Quote(volume, lines, _tbd(bio, catalog))
+
+def site_quotes(data, chunk=SITE_CHUNK, catalog=None):
+    """Yield (site, (volume, report, kits, discount, subtotal)) for each of data['sites'], money in int cents.
+
+    Sites share the deal's volume-tier discount; flat fees are per deal and in no site's subtotal.
+    """
+    catalog = catalog or get_catalog()
+    sites = data.get('sites') or []
+    ops = data.get('operational_services', []) if data['track'] == 'processing' else []
+    report_price, kit_price = data.get('report_price', 0), _kit_price(ops, catalog)
+    discount_pct = tier_discount(deal_volume(data), catalog)
+    for start in range(0, len(sites), chunk):
+        batch = sites[start:start + chunk]
+        volume = np.fromiter((site['volume'] for site in batch), dtype=np.int64, count=len(batch))
+        lines = price_lines(volume, report_price, kit_price, 0, discount_pct, catalog)
+        yield from zip(batch, zip(volume.tolist(), lines['report'].tolist(), lines['kits'].tolist(), lines['discount'].tolist(), lines['total'].tolist()))
+
+def _subsets(keys):
+    return [combo for n in range(len(keys) + 1) for combo in itertools.combinations(keys, n)]
+
+class Sweep:
+    """Priced scenario grid. Scenario i has axis coordinates np.unravel_index(i, shape)."""
+    __slots__ = ('volumes', 'reports', 'operational', 'bioinformatic', 'discounts', 'shape', 'lines', 'tbd')
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def coords(self, index):
+        return np.unravel_index(index, self.shape)
+
+    def scenario(self, index):
+        v, r, o, b, d = (int(i) for i in self.coords(index))
+        row = {'volume': int(self.volumes[v]), 'report_choice': self.reports[r], 'operational_services': self.operational[o], 'bioinformatic_services': self.bioinformatic[b], 'discount_override': None if self.discounts[d] == AUTO else int(self.discounts[d]), 'discount_pct': int(self.lines['discount_pct'][index]), 'tbd': int(self.tbd[index])}
+        row.update({name: int(self.lines[name][index]) for name in LINES})
+        return row
+
+    def cheapest(self, n=10):
+        order = np.argsort(self.lines['total'], kind='stable')[:n]
+        return [self.scenario(i) for i in order]
+
+def sweep(track, processing_type=None, volumes=(100, 500, 1000, 5000, 10000), reports=None, operational=None, bioinformatic=None, discounts=(AUTO,), catalog=None):
+    """Price every combination of the given axes.
+
+    `reports` are report package keys (default: every package for the track),
+    `operational` and `bioinformatic` are lists of add-on combinations (default:
+    every subset of the catalog's add-ons), `discounts` are percents or AUTO.
+    """
+    catalog = catalog or get_catalog()
+    result = Sweep()
+    report_options = catalog.reports(track, processing_type)
+    result.volumes = np.asarray(volumes, dtype=np.int64)
+    result.reports = list(reports or report_options)
+    if track != 'processing':
+        result.operational = [()]
+    else:
+        result.operational = [tuple(c) for c in operational] if operational is not None else _subsets([k for k, s in catalog.operational.items() if s.billable])
+    result.bioinformatic = [tuple(c) for c in bioinformatic] if bioinformatic is not None else _subsets(list(catalog.bioinformatic))
+    result.discounts = np.asarray(discounts, dtype=np.int64)
+    result.shape = (len(result.volumes), len(result.reports), len(result.operational), len(result.bioinformatic), len(result.discounts))
+    report_price = np.array([report_options[k].price for k in result.reports], dtype=np.int64)
+    kit_price = np.array([_kit_price(c, catalog) for c in result.operational], dtype=np.int64)
+    flat_fee = np.array([_flat_fee(c, catalog) for c in result.bioinformatic], dtype=np.int64)
+    tbd = np.array([len(_tbd(c, catalog)) for c in result.bioinformatic], dtype=np.int64)
+    lines = price_lines(result.volumes[:, None, None, None, None], report_price[None, :, None, None, None], kit_price[None, None, :, None, None], flat_fee[None, None, None, :, None], result.discounts[None, None, None, None, :], catalog)
+    result.lines = {name: np.ascontiguousarray(values).ravel() for name, values in lines.items()}
+    result.tbd = np.broadcast_to(tbd[None, None, None, :, None], result.shape).ravel()
+    return result
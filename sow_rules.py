@@ -0,0 +1,169 @@
+"""
+TruDiagnostic SOW Generator - Business rules
+
+Rules live in the catalog file under "rules" and are checked before a SOW is
+built: in the wizard on every rerun, and per row in the batch and HTTP paths,
+so a bad row is rejected before it costs a render. Each rule is declarative:
+
+    {"id": "irb_single_tier", "level": "error",
+     "when": {"at_least": 2, "of": ["irb_tier1", "irb_tier2"]},
+     "message": "Choose one IRB tier, not both ({services})."}
+
+Every `when` condition must hold for the rule to fire:
+
+- "selected": [keys]            every listed service is selected
+- "not_selected": [keys]        none of the listed services is selected
+- "at_least": n, "of": [keys]   n or more of the listed services are selected
+- "custom_priced": true         a selected service has a custom price, which
+                                renders as "[To be determined]"
+- "field": name, with "below", "above" or "equals": value
+
+An "error" blocks generation; a "warning" is shown but does not. In a
+message, {services} names the selected services the rule looks at and
+{missing} the not_selected ones.
+
+Rules are compiled with the catalog into a predicate table, one row of
+integer bitmasks over the catalog's service keys per rule. check() builds the
+data's selection mask once and tests each row with a few integer operations,
+so checking a SOW against every rule takes microseconds.
+"""
+
+ERROR, WARNING = 'error', 'warning'
+LEVELS = (ERROR, WARNING)
+CONDITIONS = frozenset(['selected', 'not_selected', 'at_least', 'of', 'custom_priced', 'field', 'below', 'above', 'equals'])
+FIELD_OPS = ('below', 'above', 'equals')
+
+class Issue:
+    __slots__ = ('rule', 'level', 'message')
+
+    def __init__(self, rule, level, message):
+        self.rule = rule
+        self.level = level
+        self.message = message
+
+    def __repr__(self):
+        return f"Issue({self.rule!r}, {self.level!r})"
+
+    def __str__(self):
+        return self.message
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+def rule_problems(rules, services):
+    """Problems in a raw "rules" list, as validate() reports them; `services` are the catalog's service keys."""
+    if not isinstance(rules, list):
+        return ["rules: must be a list"]
+    problems, seen = [], set()
+
+    def keys(where, value):
+        if not (isinstance(value, list) and value and all(isinstance(k, str) for k in value)):
+            problems.append(f"{where}: must be a non-empty list of service keys")
+            return
+        unknown = [k for k in value if k not in services]
+        if unknown:
+            problems.append(f"{where}: unknown service(s) {', '.join(unknown)}")
+
+    for i, rule in enumerate(rules):
+        where = f"rules[{i}]"
+        if not isinstance(rule, dict):
+            problems.append(f"{where}: must be an object")
+            continue
+        rule_id = rule.get('id')
+        if not isinstance(rule_id, str) or not rule_id or rule_id in seen:
+            problems.append(f"{where}: needs a unique id")
+        seen.add(rule_id)
+        where = f"rules.{rule_id}" if isinstance(rule_id, str) and rule_id else where
+        if rule.get('level') not in LEVELS:
+            problems.append(f"{where}: level must be {' or '.join(LEVELS)}")
+        message = rule.get('message')
+        if not isinstance(message, str) or not message:
+            problems.append(f"{where}: needs a message")
+        else:
+            try:
+                message.format(services='', missing='')
+            except (KeyError, IndexError, ValueError):
+                problems.append(f"{where}: message may only use {{services}} and {{missing}}")
+        when = rule.get('when')
+        if not isinstance(when, dict) or not when:
+            problems.append(f"{where}: needs a non-empty 'when' object")
+            continue
+        extra = set(when) - CONDITIONS
+        if extra:
+            problems.append(f"{where}: unknown condition(s) {', '.join(sorted(extra))}")
+        for name in ('selected', 'not_selected', 'of'):
+            if name in when:
+                keys(f"{where}.{name}", when[name])
+        if ('at_least' in when) != ('of' in when) or 'at_least' in when and not (isinstance(when['at_least'], int) and when['at_least'] >= 1):
+            problems.append(f"{where}: 'at_least' needs a count >= 1 and an 'of' list")
+        if 'custom_priced' in when and when['custom_priced'] is not True:
+            problems.append(f"{where}: 'custom_priced' can only be true")
+        ops = [op for op in FIELD_OPS if op in when]
+        if ('field' in when) != bool(ops) or len(ops) > 1 or 'field' in when and not isinstance(when['field'], str):
+            problems.append(f"{where}: 'field' needs a name and exactly one of {', '.join(FIELD_OPS)}")
+        elif ops and ops[0] != 'equals' and not isinstance(when[ops[0]], (int, float)):
+            problems.append(f"{where}: '{ops[0]}' needs a number")
+    return problems
+
+class _Row:
+    """One compiled rule: bitmasks over the service index plus an optional field test."""
+    __slots__ = ('rule', 'level', 'message', 'all', 'none', 'count', 'count_min', 'custom', 'field', 'op', 'value', 'names')
+
+    def __init__(self, rule, bit, custom_mask):
+        when = rule['when']
+        mask = lambda keys: sum(bit[k] for k in set(keys))
+        self.rule = rule['id']
+        self.level = rule['level']
+        self.message = rule['message']
+        self.all = mask(when.get('selected', ()))
+        self.none = mask(when.get('not_selected', ()))
+        self.count = mask(when.get('of', ()))
+        self.count_min = when.get('at_least', 0)
+        self.custom = custom_mask if when.get('custom_priced') else 0
+        self.field = when.get('field')
+        self.op = next((op for op in FIELD_OPS if op in when), None)
+        self.value = when.get(self.op)
+        self.names = self.all | self.count | self.custom
+
+class RuleSet:
+    """The catalog's rules compiled against its services; check(data) returns the Issues that apply."""
+
+    def __init__(self, rules, services):
+        self.services = tuple(services.values())
+        self.bit = {svc.key: 1 << i for i, svc in enumerate(self.services)}
+        custom_mask = sum(self.bit[svc.key] for svc in self.services if svc.custom)
+        self.rows = tuple(_Row(rule, self.bit, custom_mask) for rule in rules)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _names(self, mask):
+        return ', '.join(svc.name for i, svc in enumerate(self.services) if mask >> i & 1)
+
+    def check(self, data):
+        bit = self.bit
+        selected = 0
+        for key in data.get('operational_services') or ():
+            selected |= bit.get(key, 0)
+        for key in data.get('bioinformatic_services') or ():
+            selected |= bit.get(key, 0)
+        issues = []
+        for row in self.rows:
+            if selected & row.all != row.all or selected & row.none:
+                continue
+            if row.count_min and (selected & row.count).bit_count() < row.count_min:
+                continue
+            if row.custom and not selected & row.custom:
+                continue
+            if row.field is not None:
+                value = data.get(row.field)
+                if row.op == 'equals':
+                    if value != row.value:
+                        continue
+                elif value is None or (value >= row.value if row.op == 'below' else value <= row.value):
+                    continue
+            issues.append(Issue(row.rule, row.level, row.message.format(services=self._names(selected & row.names), missing=self._names(row.none))))
+        return issues
+
+    def errors(self, data):
+        return [issue for issue in self.check(data) if issue.level == ERROR]
@@ -0,0 +1,292 @@
+"""
+TruDiagnostic SOW Generator - HTTP rendering service
+
+Usage: python sow_service.py [--host 127.0.0.1] [--port 8700] [-j WORKERS] [--keep-alive SECONDS]
+
+A small ASGI (Starlette + uvicorn) API for tools that need SOWs without the
+wizard:
+
+- POST /sow           JSON `data` (the dict the wizard builds in step 5) -> .docx
+                      (?format=pdf for a PDF)
+- POST /sow/batch     JSON list of `data` -> ZIP of documents plus results.json
+- GET  /health        worker, cache and admission counters
+- GET  /metrics       Prometheus text (sow_request_seconds and the render metrics)
+
+Documents are rendered in a pool of worker processes started and warmed when
+the service starts, each holding a compiled SowTemplate, so no request pays
+for imports or the template build. Rendered bytes go through the shared
+document cache and into the SOW archive (SOW_STORE; empty to disable).
+The catalog file is watched while the service runs (SOW_CATALOG_INTERVAL),
+and workers reload it when a request carries a new catalog digest.
+
+Data is checked against the catalog rules first: a document that breaks an
+error-level rule is answered 422 (or fails its batch entry) without being
+rendered, and warnings are listed in results.json or the X-SOW-Warnings
+header.
+
+Callers identify themselves with an X-Tenant header. Each tenant may have
+`per_tenant` requests in flight (429 beyond that) and the service as a whole
+`max_pending` (503), so one integration flooding the service cannot starve
+the others.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from sow_batch import FORMATS, _unique_name, normalize_row, render_one
+from sow_cache import cache_key, get_cache
+from sow_catalog import get_catalog, get_watcher
+from sow_document import MIME_TYPES, sow_filename
+from sow_metrics import export_metrics, get_metrics
+from sow_pdf import check_pdf_text
+from sow_rules import ERROR
+from sow_store import get_store
+from sow_template import get_template
+
+BATCH_MAX = 500
+
+class RequestError(Exception):
+    """An error answered with `status` and a JSON {"error": message} body."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers
+
+class Admission:
+    """In-flight request limits per tenant and overall; acquire() raises RequestError (503/429) instead of queueing."""
+
+    def __init__(self, per_tenant=16, max_pending=256):
+        self.per_tenant = per_tenant
+        self.max_pending = max_pending
+        self.in_flight = {}
+        self.total = 0
+        self.rejected = 0
+
+    def acquire(self, tenant):
+        if self.total >= self.max_pending:
+            self.rejected += 1
+            raise RequestError(503, f"{self.total} requests in flight; try again shortly", {'Retry-After': '1'})
+        if self.in_flight.get(tenant, 0) >= self.per_tenant:
+            self.rejected += 1
+            raise RequestError(429, f"tenant {tenant!r} already has {self.per_tenant} requests in flight", {'Retry-After': '1'})
+        self.in_flight[tenant] = self.in_flight.get(tenant, 0) + 1
+        self.total += 1
+
+    def release(self, tenant):
+        self.total -= 1
+        if self.in_flight[tenant] == 1:
+            del self.in_flight[tenant]
+        else:
+            self.in_flight[tenant] -= 1
+
+    def stats(self):
+        return {'in_flight': self.total, 'tenants': len(self.in_flight), 'per_tenant': self.per_tenant, 'max_pending': self.max_pending, 'rejected': self.rejected}
+
+def _warm(_):
+    """Worker warm-up render; the pause keeps each warm-up task on its own newly started process."""
+    get_template().render_bytes(normalize_row({'partner_name': "Warm-up"}))
+    time.sleep(0.05)
+    return os.getpid()
+
+class Renderer:
+    """Process pool of warm renderers behind the shared document cache."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+
+    async def start(self):
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('forkserver'), initializer=get_template)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm, i) for i in range(self.workers)))
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def render(self, data, kind='docx'):
+        """(payload, error, rendered) for one document; cache hits never leave the event loop."""
+        cache = get_cache()
+        key = cache_key(data, kind)
+        payload = cache.get(key)
+        if payload is not None:
+            return payload, None, False
+        _, payload, _, error = await asyncio.get_running_loop().run_in_executor(self.pool, render_one, 0, data, kind, get_catalog().digest)
+        if payload is not None:
+            cache.put(key, payload)
+        return payload, error, True
+
+def _error(status, message, headers=None):
+    return JSONResponse({'error': message}, status_code=status, headers=headers)
+
+def _archive(items):
+    store = get_store()
+    if store is not None:
+        for data, payload, kind in items:
+            store.save(data, payload, kind)
+
+def create_app(workers=None, per_tenant=16, max_pending=256, batch_max=BATCH_MAX):
+    renderer = Renderer(workers)
+    admission = Admission(per_tenant, max_pending)
+    metrics = get_metrics()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        export_metrics()
+        watcher = get_watcher()
+        await renderer.start()
+        try:
+            yield
+        finally:
+            renderer.stop()
+            if watcher is not None:
+                watcher.stop()
+
+    async def read_json(request):
+        try:
+            return json.loads(await request.body())
+        except ValueError as exc:
+            raise RequestError(400, f"invalid JSON: {exc}") from None
+
+    def admitted(endpoint):
+        """Wrap a handler with admission control, error mapping and request timing."""
+        def wrap(handler):
+            async def endpoint_fn(request):
+                start = time.perf_counter()
+                tenant = request.headers.get('x-tenant', 'default')
+                try:
+                    admission.acquire(tenant)
+                except RequestError as exc:
+                    return _error(exc.status, str(exc), exc.headers)
+                try:
+                    return await handler(request)
+                except RequestError as exc:
+                    return _error(exc.status, str(exc), exc.headers)
+                finally:
+                    admission.release(tenant)
+                    metrics.observe('sow_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+            return endpoint_fn
+        return wrap
+
+    def kind_of(request):
+        kind = request.query_params.get('format', 'docx')
+        if kind not in FORMATS:
+            raise RequestError(400, f"format must be one of {', '.join(FORMATS)}")
+        return kind
+
+    @admitted('sow')
+    async def sow(request):
+        kind = kind_of(request)
+        raw = await read_json(request)
+        if not isinstance(raw, dict):
+            return _error(400, "expected a JSON object of SOW data")
+        try:
+            data = normalize_row(raw)
+            if kind == 'pdf':
+                check_pdf_text(data)
+        except (ValueError, TypeError) as exc:
+            return _error(422, str(exc))
+        issues = get_catalog().rules.check(data)
+        if any(issue.level == ERROR for issue in issues):
+            return JSONResponse({'error': "; ".join(issue.message for issue in issues if issue.level == ERROR), 'issues': [issue.as_dict() for issue in issues]}, status_code=422)
+        payload, error, rendered = await renderer.render(data, kind)
+        if payload is None:
+            return _error(500, error)
+        filename = sow_filename(data['partner_name'], datetime.now(), kind)
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        if issues:
+            headers['X-SOW-Warnings'] = ' | '.join(issue.message for issue in issues).encode('ascii', 'replace').decode('ascii')
+        return Response(payload, media_type=MIME_TYPES[kind], headers=headers, background=BackgroundTask(_archive, [(data, payload, kind)]) if rendered else None)
+
+    @admitted('batch')
+    async def batch(request):
+        kind = kind_of(request)
+        raw = await read_json(request)
+        if isinstance(raw, dict):
+            raw = raw.get('items')
+        if not isinstance(raw, list):
+            return _error(400, "expected a JSON list of SOW data (or {\"items\": [...]})")
+        if len(raw) > batch_max:
+            return _error(413, f"at most {batch_max} documents per batch")
+        when, taken, results, archived = datetime.now(), set(), [None] * len(raw), []
+        limit = asyncio.Semaphore(renderer.workers * 2)
+
+        async def one(index, row):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object of SOW data")
+                data = normalize_row(row)
+                if kind == 'pdf':
+                    check_pdf_text(data)
+            except (ValueError, TypeError) as exc:
+                results[index] = ({'index': index, 'error': str(exc)}, None)
+                return
+            issues = get_catalog().rules.check(data)
+            errors = [issue.message for issue in issues if issue.level == ERROR]
+            if errors:
+                results[index] = ({'index': index, 'partner_name': data['partner_name'], 'error': "; ".join(errors)}, None)
+                return
+            warnings = {'warnings': [issue.message for issue in issues]} if issues else {}
+            async with limit:
+                payload, error, rendered = await renderer.render(data, kind)
+            if payload is None:
+                results[index] = ({'index': index, 'partner_name': data['partner_name'], 'error': error}, None)
+                return
+            if rendered:
+                archived.append((data, payload, kind))
+            results[index] = ({'index': index, 'partner_name': data['partner_name'], 'size': len(payload), **warnings}, payload)
+
+        await asyncio.gather(*(one(i, row) for i, row in enumerate(raw)))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+            for entry, payload in results:
+                if payload is not None:
+                    entry['filename'] = _unique_name(sow_filename(entry['partner_name'], when, kind), taken)
+                    archive.writestr(entry['filename'], payload)
+            archive.writestr('results.json', json.dumps([entry for entry, _ in results], indent=2))
+        failed = sum(1 for _, payload in results if payload is None)
+        return Response(buffer.getvalue(), media_type=MIME_TYPES['zip'], headers={'Content-Disposition': f'attachment; filename="SOW_batch_{when:%Y%m%d_%H%M%S}.zip"', 'X-SOW-Failed': str(failed)}, background=BackgroundTask(_archive, archived) if archived else None)
+
+    async def health(request):
+        return JSONResponse({'status': 'ok', 'workers': renderer.workers, 'admission': admission.stats(), 'cache': get_cache().stats()})
+
+    async def prometheus(request):
+        return PlainTextResponse(metrics.prometheus(), media_type='text/plain; version=0.0.4')
+
+    return Starlette(routes=[
+        Route('/sow', sow, methods=['POST']),
+        Route('/sow/batch', batch, methods=['POST']),
+        Route('/health', health),
+        Route('/metrics', prometheus),
+    ], lifespan=lifespan)
+
+def main(argv=None):
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve SOW generation over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="bind address (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8700, help="port (default: 8700)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="render worker processes (default: CPU count)")
+    parser.add_argument('--per-tenant', type=int, default=16, help="in-flight requests allowed per X-Tenant (default: 16)")
+    parser.add_argument('--max-pending', type=int, default=256, help="in-flight requests allowed overall (default: 256)")
+    parser.add_argument('--keep-alive', type=int, default=30, help="idle keep-alive timeout in seconds (default: 30)")
+    args = parser.parse_args(argv)
+    app = create_app(args.workers, args.per_tenant, args.max_pending)
+    uvicorn.run(app, host=args.host, port=args.port, timeout_keep_alive=args.keep_alive, access_log=False, log_level='warning')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
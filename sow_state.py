@@ -0,0 +1,144 @@
+"""
+TruDiagnostic SOW Generator - Wizard state
+
+WizardState holds everything the wizard has collected in one slotted object,
+so a session keeps a single small value instead of a dozen loose keys, and
+`data()` builds the dict generate_sow_document expects. `encode()` packs the
+state into a versioned, URL-safe token that the app keeps in the `s` query
+parameter: refreshing the page, restarting the server or sending the link to
+a colleague resumes the same draft. SowStore.save_draft() keeps a token under
+a short id for `?draft=` links.
+
+Token layout (version 1), before URL-safe base64 without padding:
+
+    B  version
+    B  step (1-5)
+    B  flags: 1 report-only track, 2 portal access, 4 body is zlib-compressed
+    H  effective date as days since 2000-01-01, 0xFFFF when unset
+    I  estimated volume
+    .. UTF-8 body: partner name, processing type, sample type, report choice,
+       operational services, bioinformatic services and data delivery,
+       separated by 0x1F; list items are separated by 0x1E
+
+Catalog choices are stored by key, not position, so links survive catalog
+additions and reordering. Keys the current catalog no longer offers are
+dropped on decode and the step falls back to the first one left incomplete.
+"""
+
+import base64
+import binascii
+import struct
+import zlib
+from datetime import date, timedelta
+from sow_catalog import get_catalog
+
+VERSION = 1
+STEPS = 5
+_HEAD = struct.Struct('>BBBHI')
+_EPOCH = date(2000, 1, 1)
+_NO_DATE = 0xFFFF
+_REPORT_ONLY, _PORTAL, _ZLIB = 1, 2, 4
+_FIELD, _ITEM = '\x1f', '\x1e'
+
+class WizardState:
+    __slots__ = ('step', 'partner_name', 'effective_date', 'track', 'processing_type', 'sample_type', 'report_choice', 'operational_services', 'bioinformatic_services', 'data_delivery', 'portal_access', 'estimated_volume')
+
+    def __init__(self, step=1, partner_name='', effective_date=None, track='processing', processing_type=None, sample_type=None, report_choice=None, operational_services=(), bioinformatic_services=(), data_delivery=("PDF Reports",), portal_access=False, estimated_volume=0):
+        self.step = step
+        self.partner_name = partner_name
+        self.effective_date = effective_date
+        self.track = track
+        self.processing_type = processing_type
+        self.sample_type = sample_type
+        self.report_choice = report_choice
+        self.operational_services = tuple(operational_services)
+        self.bioinformatic_services = tuple(bioinformatic_services)
+        self.data_delivery = tuple(data_delivery)
+        self.portal_access = portal_access
+        self.estimated_volume = estimated_volume
+
+    def __eq__(self, other):
+        return type(other) is WizardState and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self):
+        return f"WizardState(step={self.step}, partner_name={self.partner_name!r}, track={self.track!r}, report_choice={self.report_choice!r})"
+
+    def update(self, **fields):
+        """Set fields from a wizard step; list fields are stored as tuples."""
+        for name, value in fields.items():
+            setattr(self, name, tuple(value) if isinstance(value, list) else value)
+        return self
+
+    @property
+    def report(self):
+        """The selected report package from the current catalog, or None."""
+        catalog = get_catalog()
+        if self.track == 'processing' and self.processing_type not in catalog.processing:
+            return None
+        return catalog.reports(self.track, self.processing_type).get(self.report_choice)
+
+    def data(self):
+        report = self.report
+        return {'partner_name': self.partner_name, 'effective_date': self.effective_date, 'track': self.track, 'processing_type': self.processing_type, 'sample_type': self.sample_type, 'report_choice': self.report_choice, 'report_name': report.name if report else None, 'report_price': report.price if report else None, 'operational_services': list(self.operational_services), 'bioinformatic_services': list(self.bioinformatic_services), 'data_delivery': list(self.data_delivery), 'portal_access': self.portal_access, 'estimated_volume': self.estimated_volume}
+
+    def complete_step(self):
+        """The furthest step the collected inputs allow: details need a partner name, add-ons a report package."""
+        if not self.partner_name:
+            return 1
+        if self.report is None or (self.track == 'processing' and not self.sample_type):
+            return 3
+        return STEPS
+
+    def _clean(self):
+        catalog = get_catalog()
+        if self.track != 'processing':
+            self.processing_type = self.sample_type = None
+            self.operational_services = ()
+        elif self.processing_type not in catalog.processing:
+            self.processing_type = self.sample_type = None
+        elif self.sample_type not in catalog.processing[self.processing_type].sample_types:
+            self.sample_type = None
+        if self.report is None:
+            self.report_choice = None
+        self.operational_services = tuple(k for k in self.operational_services if k in catalog.operational)
+        self.bioinformatic_services = tuple(k for k in self.bioinformatic_services if k in catalog.bioinformatic)
+        self.data_delivery = tuple(k for k in self.data_delivery if k in catalog.data_delivery_options) or ("PDF Reports",)
+        self.step = max(1, min(self.step, self.complete_step()))
+        return self
+
+    def encode(self):
+        days = _NO_DATE if self.effective_date is None else (self.effective_date - _EPOCH).days
+        flags = (_REPORT_ONLY if self.track == 'report_only' else 0) | (_PORTAL if self.portal_access else 0)
+        body = _FIELD.join([self.partner_name or '', self.processing_type or '', self.sample_type or '', self.report_choice or ''] + [_ITEM.join(items) for items in (self.operational_services, self.bioinformatic_services, self.data_delivery)]).encode('utf-8')
+        packed = zlib.compress(body, 9)
+        if len(packed) < len(body):
+            body, flags = packed, flags | _ZLIB
+        raw = _HEAD.pack(VERSION, self.step, flags, days, min(max(self.estimated_volume or 0, 0), 0xFFFFFFFF)) + body
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+    @classmethod
+    def decode(cls, token):
+        """Inverse of encode(), validated against the current catalog; raises ValueError for a malformed token."""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            version, step, flags, days, volume = _HEAD.unpack_from(raw)
+            if version != VERSION:
+                raise ValueError(f"unsupported wizard state version {version}")
+            body = raw[_HEAD.size:]
+            fields = (zlib.decompress(body) if flags & _ZLIB else body).decode('utf-8').split(_FIELD)
+        except (binascii.Error, struct.error, zlib.error, UnicodeDecodeError) as exc:
+            raise ValueError("malformed wizard state") from exc
+        if len(fields) != 7:
+            raise ValueError("malformed wizard state: wrong field count")
+        name, processing_type, sample_type, report_choice, operational, bioinformatic, delivery = fields
+        return cls(
+            step=step, partner_name=name, effective_date=None if days == _NO_DATE else _EPOCH + timedelta(days=days),
+            track='report_only' if flags & _REPORT_ONLY else 'processing', processing_type=processing_type or None, sample_type=sample_type or None, report_choice=report_choice or None,
+            operational_services=[k for k in operational.split(_ITEM) if k], bioinformatic_services=[k for k in bioinformatic.split(_ITEM) if k], data_delivery=[k for k in delivery.split(_ITEM) if k],
+            portal_access=bool(flags & _PORTAL), estimated_volume=volume,
+        )._clean()
+
+    @classmethod
+    def from_data(cls, data, step=STEPS):
+        """State for an existing `data` dict, e.g. a stored SOW opened for editing."""
+        return cls(step=step, **{k: data.get(k) for k in cls.__slots__[1:] if data.get(k) is not None})._clean()
@@ -0,0 +1,293 @@
+"""
+TruDiagnostic SOW Generator - Persistent SOW store
+
+Every generated SOW is recorded in an embedded SQLite database (SOW_STORE,
+default sows.db). The record holds the wizard inputs, the catalog version it
+was priced against and the document bytes per format. Rows are indexed by
+partner, effective date, track/processing type and service, and an FTS5
+index covers the rendered text, so past agreements can be found and
+downloaded again without regenerating them.
+
+Each record also snapshots its Exhibit B fee rows (`prices`), so audits
+against the current catalog compare what the partner signed, not what the
+catalog says today.
+
+Unfinished wizard drafts (sow_state tokens) are kept under short random ids
+in `drafts`, so a `?draft=` link can be shared and resumed later.
+
+The partner directory (sow_partners) keeps one row per legal name in
+`partners`, unique on its normalized key, so re-importing a list only adds
+the names that are new.
+
+Documents are content-addressed by cache_key(data), so generating the same
+inputs twice adds formats to the existing record instead of a second row.
+File bytes are stored as zlib-compressed chunks in a content-addressed blob
+table; a .docx is split at its ZIP member boundaries, so the styles, theme
+and settings parts every SOW shares are stored once and each record only
+adds its own document.xml. Reassembly is a byte-exact concatenation.
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import zipfile
+import zlib
+from datetime import date
+from functools import lru_cache
+from io import BytesIO
+from sow_cache import cache_key, canonical_json
+from sow_catalog import get_catalog
+from sow_document import document_text, fee_rows
+
+SCHEMA_VERSION = 4
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sows (
+    id INTEGER PRIMARY KEY,
+    data_key TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    partner_name TEXT NOT NULL COLLATE NOCASE,
+    effective_date TEXT,
+    track TEXT NOT NULL,
+    processing_type TEXT,
+    report_name TEXT,
+    report_price INTEGER,
+    estimated_volume INTEGER,
+    catalog_version TEXT NOT NULL,
+    data TEXT NOT NULL,
+    prices TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_sows_partner ON sows (partner_name);
+CREATE INDEX IF NOT EXISTS ix_sows_effective ON sows (effective_date);
+CREATE INDEX IF NOT EXISTS ix_sows_variant ON sows (track, processing_type);
+CREATE TABLE IF NOT EXISTS sow_services (
+    service TEXT NOT NULL,
+    sow_id INTEGER NOT NULL REFERENCES sows (id),
+    PRIMARY KEY (service, sow_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sow_files (
+    sow_id INTEGER NOT NULL REFERENCES sows (id),
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunks TEXT NOT NULL,
+    PRIMARY KEY (sow_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS drafts (
+    id TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    partner_name TEXT NOT NULL,
+    state TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS partners (
+    id INTEGER PRIMARY KEY,
+    name_key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    added REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sow_text USING fts5 (partner_name, body, content='', prefix='2 3 4', detail=column);
+"""
+
+class StoredSow:
+    __slots__ = ('id', 'created', 'partner_name', 'effective_date', 'track', 'processing_type', 'report_name', 'report_price', 'estimated_volume', 'catalog_version', 'kinds')
+
+    def __init__(self, row, kinds=()):
+        for name, value in zip(self.__slots__, row):
+            setattr(self, name, value)
+        self.kinds = tuple(kinds)
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+_COLUMNS = ', '.join(f'sows.{c}' for c in StoredSow.__slots__[:-1])
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix (search-as-you-type)."""
+    words = [f'"{word}"' for word in re.findall(r'[^\W_]+', text)]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+def _chunks(payload):
+    """Split a ZIP file at member boundaries (the central directory is the last chunk); other files stay whole."""
+    try:
+        with zipfile.ZipFile(BytesIO(payload)) as archive:
+            bounds = sorted({0, archive.start_dir, *(info.header_offset for info in archive.infolist())})
+    except zipfile.BadZipFile:
+        return [payload]
+    return [payload[a:b] for a, b in zip(bounds, bounds[1:] + [len(payload)]) if b > a]
+
+def _load_data(text):
+    data = json.loads(text)
+    if data.get('effective_date'):
+        data['effective_date'] = date.fromisoformat(data['effective_date'])
+    return data
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+class SowStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.executescript(SCHEMA)
+            if 'prices' not in {row[1] for row in self._db.execute('PRAGMA table_info(sows)')}:
+                self._db.execute('ALTER TABLE sows ADD COLUMN prices TEXT')
+            self._db.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+
+    def save(self, data, payload, kind='docx', catalog_version=None):
+        """Record `payload` as the `kind` rendering of `data`; returns the SOW id."""
+        key = cache_key(data)
+        chunks = [(hashlib.sha256(chunk).hexdigest(), chunk) for chunk in _chunks(payload)]
+        digest = hashlib.sha256(payload).hexdigest()
+        with self._lock, self._db:
+            known = {h for (h,) in self._db.execute(f"SELECT sha256 FROM blobs WHERE sha256 IN ({','.join('?' * len(chunks))})", [h for h, _ in chunks])}
+            self._db.executemany('INSERT OR IGNORE INTO blobs (sha256, data) VALUES (?, ?)', [(h, zlib.compress(c, 6)) for h, c in dict(chunks).items() if h not in known])
+            row = self._db.execute('SELECT id FROM sows WHERE data_key = ?', (key,)).fetchone()
+            if row is None:
+                services = set(data.get('operational_services') or ()) | set(data.get('bioinformatic_services') or ())
+                cur = self._db.execute(
+                    'INSERT INTO sows (data_key, created, partner_name, effective_date, track, processing_type, report_name, report_price, estimated_volume, catalog_version, data, prices) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, time.time(), data['partner_name'], _iso(data.get('effective_date')), data['track'], data.get('processing_type'), data.get('report_name'), data.get('report_price'), data.get('estimated_volume'), catalog_version or get_catalog().version, canonical_json(data), json.dumps(fee_rows(data))))
+                sow_id = cur.lastrowid
+                self._db.executemany('INSERT INTO sow_services (service, sow_id) VALUES (?, ?)', [(s, sow_id) for s in sorted(services)])
+                self._db.execute('INSERT INTO sow_text (rowid, partner_name, body) VALUES (?, ?, ?)', (sow_id, data['partner_name'], document_text(data)))
+            else:
+                sow_id = row[0]
+            self._db.execute('INSERT OR REPLACE INTO sow_files (sow_id, kind, sha256, size, chunks) VALUES (?, ?, ?, ?, ?)', (sow_id, kind, digest, len(payload), ' '.join(h for h, _ in chunks)))
+        return sow_id
+
+    def get(self, sow_id):
+        with self._lock:
+            row = self._db.execute(f'SELECT {_COLUMNS} FROM sows WHERE sows.id = ?', (sow_id,)).fetchone()
+            kinds = [k for (k,) in self._db.execute('SELECT kind FROM sow_files WHERE sow_id = ? ORDER BY kind', (sow_id,))]
+        return StoredSow(row, kinds) if row else None
+
+    def data(self, sow_id):
+        """The wizard inputs the SOW was generated from."""
+        with self._lock:
+            row = self._db.execute('SELECT data FROM sows WHERE id = ?', (sow_id,)).fetchone()
+        return _load_data(row[0]) if row else None
+
+    def records(self, batch=1000):
+        """Yield (StoredSow, data, fee rows or None) for every SOW, oldest first, reading `batch` rows at a time."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(f'SELECT {_COLUMNS}, sows.data, sows.prices FROM sows WHERE sows.id > ? ORDER BY sows.id LIMIT ?', (last, batch)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield StoredSow(row[:-2]), _load_data(row[-2]), json.loads(row[-1]) if row[-1] else None
+            last = rows[-1][0]
+
+    def document(self, sow_id, kind='docx'):
+        with self._lock:
+            row = self._db.execute('SELECT chunks FROM sow_files WHERE sow_id = ? AND kind = ?', (sow_id, kind)).fetchone()
+            if row is None:
+                return None
+            hashes = row[0].split()
+            blobs = dict(self._db.execute(f"SELECT sha256, data FROM blobs WHERE sha256 IN ({','.join('?' * len(hashes))})", hashes))
+        return b''.join(zlib.decompress(blobs[h]) for h in hashes)
+
+    def search(self, text=None, partner=None, track=None, processing_type=None, service=None, effective_from=None, effective_to=None, limit=50):
+        """Newest-first SOWs matching every given filter. `text` is full-text over the rendered SOW; `partner` is a name prefix.
+
+        Text searches are driven from the FTS index in descending rowid order,
+        so they stop after `limit` matches instead of collecting every hit.
+        """
+        source, where, params = 'sows', [], []
+        if text and _fts_query(text):
+            source = 'sow_text JOIN sows ON sows.id = sow_text.rowid'
+            where.append('sow_text MATCH ?')
+            params.append(_fts_query(text))
+        if partner:
+            where.append("sows.partner_name LIKE ? ESCAPE '\\'")
+            params.append(re.sub(r'([%_\\])', r'\\\1', partner) + '%')
+        if track:
+            where.append('sows.track = ?')
+            params.append(track)
+        if processing_type:
+            where.append('sows.processing_type = ?')
+            params.append(processing_type)
+        if service:
+            where.append('sows.id IN (SELECT sow_id FROM sow_services WHERE service = ?)')
+            params.append(service)
+        if effective_from:
+            where.append('sows.effective_date >= ?')
+            params.append(_iso(effective_from))
+        if effective_to:
+            where.append('sows.effective_date <= ?')
+            params.append(_iso(effective_to))
+        order = 'sow_text.rowid' if source != 'sows' else 'sows.id'
+        sql = f"SELECT {_COLUMNS} FROM {source}{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit]).fetchall()
+            kinds = {}
+            if rows:
+                marks = ','.join('?' * len(rows))
+                for sow_id, kind in self._db.execute(f'SELECT sow_id, kind FROM sow_files WHERE sow_id IN ({marks}) ORDER BY kind', [r[0] for r in rows]):
+                    kinds.setdefault(sow_id, []).append(kind)
+        return [StoredSow(row, kinds.get(row[0], ())) for row in rows]
+
+    def save_draft(self, state, partner_name='', draft_id=None):
+        """Store an encoded WizardState; reuses `draft_id` when given, otherwise picks a new short id. Returns the id."""
+        draft_id = draft_id or secrets.token_urlsafe(6)
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO drafts (id, updated, partner_name, state) VALUES (?, ?, ?, ?)', (draft_id, time.time(), partner_name, state))
+        return draft_id
+
+    def draft(self, draft_id):
+        """The encoded WizardState saved under `draft_id`, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT state FROM drafts WHERE id = ?', (draft_id,)).fetchone()
+        return row[0] if row else None
+
+    def add_partners(self, rows):
+        """Insert (name_key, name) pairs, skipping keys already present; returns how many were added."""
+        now = time.time()
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany('INSERT OR IGNORE INTO partners (name_key, name, added) VALUES (?, ?, ?)', ((key, name, now) for key, name in rows))
+            return self._db.total_changes - before
+
+    def partners(self):
+        """Every directory entry as (id, name), in insertion order."""
+        with self._lock:
+            return self._db.execute('SELECT id, name FROM partners ORDER BY id').fetchall()
+
+    def partner_revision(self):
+        """Changes whenever partners are added (the newest id); cheap enough to check on every rerun."""
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(MAX(id), 0) FROM partners').fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            count, = self._db.execute('SELECT COUNT(*) FROM sows').fetchone()
+            files, raw = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sow_files').fetchone()
+            stored, = self._db.execute('SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blobs').fetchone()
+            drafts, = self._db.execute('SELECT COUNT(*) FROM drafts').fetchone()
+            partners, = self._db.execute('SELECT COUNT(*) FROM partners').fetchone()
+        return {'path': self.path, 'sows': count, 'files': files, 'stored_bytes': stored, 'raw_bytes': raw, 'drafts': drafts, 'partners': partners}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+@lru_cache(maxsize=None)
+def get_store():
+    """The process-wide store, or None when SOW_STORE is set to an empty string."""
+    path = os.environ.get('SOW_STORE', 'sows.db')
+    return SowStore(path) if path else None
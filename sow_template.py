@@ -0,0 +1,275 @@
+"""
+TruDiagnostic SOW Generator - Precompiled document template
+
+The python-docx path in sow_document rebuilds every paragraph through the
+object model on each call. SowTemplate instead compiles, once:
+
+- every package part except word/document.xml, already deflated,
+- the document.xml head and tail around the body,
+- the XML of every static section (title, purpose, general terms, ...).
+
+Per request only the dynamic sections are rendered to XML strings and the
+package is written with a minimal ZIP writer, so a document costs a few
+string joins and one deflate of the body. Rendered sections are also kept in
+a small LRU keyed on the data they depend on (Section.deps), so regenerating
+after a one-field edit only re-renders the sections that field feeds.
+
+Sections holding a StreamTable (the per-site tables of a multi-site SOW) are
+the exception: their rows are rendered ROW_CHUNK at a time straight into the
+deflating document part and never cached, so a SOW with thousands of sites
+builds in time linear in its rows with the body never held in memory.
+"""
+
+import re
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from sow_catalog import use_catalog
+from sow_document import SECTIONS, PageBreak, StreamTable, Table, new_document
+from sow_metrics import NULL_TRACE, get_metrics
+
+STYLE_IDS = {'List Bullet': 'ListBullet', 'Table Grid': 'TableGrid'}
+BODY_WIDTH = 8640
+DOCUMENT_PART = 'word/document.xml'
+FRAGMENT_ENTRIES = 2048
+ROW_CHUNK = 256
+
+_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+_SPECIAL = re.compile(r'(\t|\n)')
+_PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+_TABLE_LOOK = '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+
+def _text_xml(text, tag='w:t'):
+    out = []
+    for piece in _SPECIAL.split(text):
+        if piece == '\t':
+            out.append('<w:tab/>')
+        elif piece == '\n':
+            out.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if piece.strip() != piece else ''
+            out.append(f'<{tag}{space}>{piece.translate(_ESCAPES)}</{tag}>')
+    return ''.join(out)
+
+def run_xml(text, bold=False, size=None, tag='w:t'):
+    """One w:r; pass tag='w:delText' for text inside a tracked deletion."""
+    props = ('<w:b/>' if bold else '') + (f'<w:sz w:val="{size * 2}"/>' if size else '')
+    body = (f'<w:rPr>{props}</w:rPr>' if props else '') + _text_xml(text, tag)
+    return f'<w:r>{body}</w:r>' if body else '<w:r/>'
+
+def paragraph_props(block):
+    props = ''
+    if block.style:
+        props += f'<w:pStyle w:val="{STYLE_IDS[block.style]}"/>'
+    if block.indent:
+        props += f'<w:ind w:left="{int(block.indent * 1440)}"/>'
+    if block.center:
+        props += '<w:jc w:val="center"/>'
+    return props
+
+def _paragraph_xml(block):
+    props = paragraph_props(block)
+    body = (f'<w:pPr>{props}</w:pPr>' if props else '') + ''.join(run_xml(r.text, r.bold, r.size) for r in block.runs)
+    return f'<w:p>{body}</w:p>' if body else '<w:p/>'
+
+def table_head_xml(block):
+    width = BODY_WIDTH // block.columns
+    style = f'<w:tblStyle w:val="{STYLE_IDS[block.style]}"/>' if block.style else ''
+    grid = f'<w:gridCol w:w="{width}"/>' * block.columns
+    return f'<w:tbl><w:tblPr>{style}<w:tblW w:type="auto" w:w="0"/>{_TABLE_LOOK}</w:tblPr><w:tblGrid>{grid}</w:tblGrid>'
+
+def row_xml(cells, width, props=''):
+    """A w:tr from pre-rendered cell run XML; `props` is the content of w:trPr."""
+    cell = f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr><w:p>'
+    return '<w:tr>' + (f'<w:trPr>{props}</w:trPr>' if props else '') + ''.join(f'{cell}{runs}</w:p></w:tc>' for runs in cells) + '</w:tr>'
+
+def table_row_xml(values, width, bold=False):
+    return row_xml([run_xml(v, bold) for v in values], width)
+
+def _table_xml(block):
+    width = BODY_WIDTH // block.columns
+    rows = block.rows
+    return table_head_xml(block) + ''.join(table_row_xml(values, width, block.bold(i, len(rows))) for i, values in enumerate(rows)) + '</w:tbl>'
+
+def stream_rows_xml(block, rows_per_chunk=ROW_CHUNK):
+    """Yield a StreamTable's w:tr XML (header, body, bold footer) in strings of up to `rows_per_chunk` rows."""
+    width = BODY_WIDTH // block.columns
+    pending = [table_row_xml(block.header, width, bold=True)]
+    for values in block.body():
+        pending.append(table_row_xml(values, width))
+        if len(pending) >= rows_per_chunk:
+            yield ''.join(pending)
+            pending = []
+    yield ''.join(pending) + ''.join(table_row_xml(values, width, bold=True) for values in block.footer)
+
+def iter_blocks_xml(blocks):
+    """Yield body XML for section blocks: one string per block, a StreamTable in row chunks."""
+    for block in blocks:
+        if isinstance(block, PageBreak):
+            yield _PAGE_BREAK
+        elif isinstance(block, StreamTable):
+            yield table_head_xml(block)
+            yield from stream_rows_xml(block)
+            yield '</w:tbl>'
+        elif isinstance(block, Table):
+            yield _table_xml(block)
+        else:
+            yield _paragraph_xml(block)
+
+def blocks_xml(blocks):
+    """Render section blocks to WordprocessingML body XML (w: prefix)."""
+    return ''.join(iter_blocks_xml(blocks))
+
+class _ZipStream:
+    """Incremental ZIP encoder: each method yields the bytes it appends to the archive."""
+
+    def __init__(self, when=None):
+        self.offset = 0
+        self.central = []
+        t = time.localtime(when)
+        self.dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        self.dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _header(self, name, flags, crc, csize, usize):
+        return self._emit(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, flags, 8, self.dos_time, self.dos_date, crc, csize, usize, len(name), 0) + name)
+
+    def deflated(self, name, raw, crc, size):
+        name, offset = name.encode(), self.offset
+        yield self._header(name, 0, crc, len(raw), size)
+        yield self._emit(raw)
+        self.central.append((name, 0, crc, len(raw), size, offset))
+
+    def stream(self, name, chunks, level=6):
+        name, offset = name.encode(), self.offset
+        yield self._header(name, 0x08, 0, 0, 0)
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        crc = csize = usize = 0
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            crc = zlib.crc32(data, crc)
+            usize += len(data)
+            out = compressor.compress(data)
+            if out:
+                csize += len(out)
+                yield self._emit(out)
+        out = compressor.flush()
+        csize += len(out)
+        yield self._emit(out)
+        yield self._emit(struct.pack('<IIII', 0x08074b50, crc, csize, usize))
+        self.central.append((name, 0x08, crc, csize, usize, offset))
+
+    def finish(self):
+        start = self.offset
+        for name, flags, crc, csize, usize, offset in self.central:
+            yield self._emit(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, flags, 8, self.dos_time, self.dos_date, crc, csize, usize, len(name), 0, 0, 0, 0, 0, offset) + name)
+        yield self._emit(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.central), len(self.central), self.offset - start, start, 0))
+
+class SowTemplate:
+    """Compiled SOW package; `render_bytes(data)` matches generate_sow_document(data)."""
+
+    def __init__(self, fragment_entries=FRAGMENT_ENTRIES):
+        buffer = BytesIO()
+        new_document().save(buffer)
+        self.parts = []
+        with zipfile.ZipFile(buffer) as package:
+            for info in package.infolist():
+                blob = package.read(info.filename)
+                if info.filename == DOCUMENT_PART:
+                    xml = blob.decode('utf-8')
+                    body = xml.index('<w:body>') + len('<w:body>')
+                    self.head, self.tail = xml[:body], xml[xml.index('<w:sectPr'):]
+                    self.parts.append((DOCUMENT_PART, None, None, None))
+                else:
+                    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                    raw = compressor.compress(blob) + compressor.flush()
+                    self.parts.append((info.filename, raw, zlib.crc32(blob), len(blob)))
+        self.static = {s.name: blocks_xml(s.build({})) for s in SECTIONS if s.static}
+        self.fragment_entries = fragment_entries
+        self.fragments = OrderedDict()
+        self.fragment_hits = self.fragment_misses = 0
+        self._lock = threading.Lock()
+
+    def section_chunks(self, section, data):
+        """The section's body XML as a sequence of strings; streamed, and not cached, when Section.streamed(data)."""
+        if section.static:
+            return (self.static[section.name],)
+        if section.streamed(data):
+            return iter_blocks_xml(section.build(data))
+        key = (section.name, section.key(data))
+        with self._lock:
+            xml = self.fragments.get(key)
+            if xml is not None:
+                self.fragments.move_to_end(key)
+                self.fragment_hits += 1
+                return (xml,)
+            self.fragment_misses += 1
+        xml = blocks_xml(section.build(data))
+        with self._lock:
+            self.fragments[key] = xml
+            while len(self.fragments) > self.fragment_entries:
+                self.fragments.popitem(last=False)
+        return (xml,)
+
+    def section_xml(self, section, data):
+        return ''.join(self.section_chunks(section, data))
+
+    def fragment_stats(self):
+        with self._lock:
+            lookups = self.fragment_hits + self.fragment_misses
+            return {'entries': len(self.fragments), 'hits': self.fragment_hits, 'misses': self.fragment_misses, 'hit_rate': self.fragment_hits / lookups if lookups else 0.0}
+
+    def body_chunks(self, data, trace=NULL_TRACE):
+        yield self.head
+        for section in SECTIONS:
+            if section.streamed(data):
+                yield from trace.timed(section.name, self.section_chunks(section, data))
+                continue
+            with trace.section(section.name):
+                chunks = self.section_chunks(section, data)
+            yield from chunks
+        yield self.tail
+
+    def iter_bytes(self, data, trace=NULL_TRACE):
+        """Yield the .docx package as it is encoded; nothing is buffered."""
+        return self.iter_package(self.body_chunks(data, trace))
+
+    def iter_package(self, body_chunks):
+        """Yield a .docx package whose document.xml is the given chunks (head and tail included)."""
+        archive = _ZipStream()
+        for name, raw, crc, size in self.parts:
+            if raw is None:
+                yield from archive.stream(name, body_chunks)
+            else:
+                yield from archive.deflated(name, raw, crc, size)
+        yield from archive.finish()
+
+    def write(self, data, fh):
+        trace = get_metrics().document('template', data)
+        with use_catalog():
+            for piece in self.iter_bytes(data, trace):
+                fh.write(piece)
+        trace.finish()
+
+    def render_bytes(self, data):
+        trace = get_metrics().document('template', data)
+        with use_catalog():
+            payload = b''.join(self.iter_bytes(data, trace))
+        trace.finish()
+        return payload
+
+    def render(self, data):
+        from docx import Document
+        return Document(BytesIO(self.render_bytes(data)))
+
+@lru_cache(maxsize=None)
+def get_template():
+    return SowTemplate()